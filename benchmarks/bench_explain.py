@@ -0,0 +1,94 @@
+"""Latency and agreement of the explanations of the flyability model: full
+SHAP values (``GradientExplainer`` on the whole background, as served with
+``quality=full``) versus cheaper attributions, on archived cases. The
+agreement is the Spearman rank correlation of the attributions of all
+levels and variables with those of the full SHAP values; a second full run
+gives the agreement expected from the sampling noise of SHAP alone.
+
+The cases are the days of a training dataset (see ``startleiter/dataset.py``)
+if one is given, else the background samples.
+
+Usage: PYTHONPATH=. python benchmarks/bench_explain.py [n_cases] [dataset]
+"""
+
+import sys
+import time
+
+import numpy as np
+
+from startleiter import app
+from startleiter.dataset import TrainingDataset
+from startleiter.explainer import compute_shap, integrated_gradients
+
+
+def load_cases(n_cases, path=None):
+    if path is None:
+        return app.BACKGROUND[:n_cases].astype("float32")
+    data = TrainingDataset(path)
+    samples = data.samples("flyability")
+    rng = np.random.default_rng(0)
+    samples = samples[rng.choice(len(samples), n_cases, replace=False)]
+    return data.read(samples[:, 0], samples[:, 1], app.MOMENTS_FLYABILITY)
+
+
+def spearman(a, b):
+    ranks = [np.argsort(np.argsort(x.ravel())) for x in (a, b)]
+    return np.corrcoef(*ranks)[0, 1]
+
+
+def methods():
+    background = app.BACKGROUND
+    rng = np.random.default_rng(0)
+    small = background[rng.choice(len(background), 10, replace=False)]
+    return {
+        "shap (full)": lambda x: compute_shap(background, app.MODEL_FLYABILITY, x),
+        "shap 10 background, 20 samples": lambda x: compute_shap(
+            small, app.MODEL_FLYABILITY, x, nsamples=20
+        ),
+        "integrated gradients, mean baseline, 16 steps": lambda x: (
+            integrated_gradients(
+                background.mean(axis=0, keepdims=True),
+                app.MODEL_FLYABILITY,
+                x,
+                steps=16,
+            )
+        ),
+        **{
+            f"expected gradients, {n} background, {steps} steps": (
+                lambda x, n=n, steps=steps: integrated_gradients(
+                    background[:n], app.MODEL_FLYABILITY, x, steps=steps
+                )
+            )
+            for n, steps in ((10, 4), (50, 2), (100, 1), (100, 4))
+        },
+    }
+
+
+def main(n_cases=20, path=None):
+    cases = load_cases(n_cases, path)
+    with app.model_context():
+        # build the gradient ops before timing
+        for method in methods().values():
+            method(cases[:1])
+        reference = [
+            compute_shap(app.BACKGROUND, app.MODEL_FLYABILITY, x[None])[0]
+            for x in cases
+        ]
+        print(f"{len(cases)} cases\n")
+        print(f"{'method':<36} {'latency [ms]':>12} {'spearman':>9}")
+        for name, method in methods().items():
+            latencies, correlations = [], []
+            for x, ref in zip(cases, reference):
+                start = time.perf_counter()
+                attributions = method(x[None])[0]
+                latencies.append(time.perf_counter() - start)
+                correlations.append(spearman(attributions, ref))
+            print(
+                f"{name:<36} {1000 * np.median(latencies):>12.1f} "
+                f"{np.mean(correlations):>9.3f}"
+            )
+
+
+if __name__ == "__main__":
+    n_cases = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    main(n_cases, sys.argv[2] if len(sys.argv) > 2 else None)
@@ -0,0 +1,103 @@
+"""Query plans and timings of the flight/prediction queries with and without
+the indexes added by the schema migrations, on a synthetic SQLite database.
+
+Usage: PYTHONPATH=. python benchmarks/bench_indexes.py [n_flights]
+"""
+
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import numpy as np
+from sqlalchemy import create_engine, text
+
+from startleiter.migrations import migrate
+
+N_SITES = 7
+QUERIES = {
+    "last flight no.": (
+        "SELECT flno FROM flight WHERE site_id = :site ORDER BY flno DESC LIMIT 1",
+        {"site": 3},
+    ),
+    "flights of a site since date": (
+        "SELECT datetime, length_km FROM flight "
+        "WHERE site_id = :site AND datetime >= :start",
+        {"site": 3, "start": datetime(2022, 1, 1)},
+    ),
+    "predictions of a reftime": (
+        "SELECT * FROM prediction WHERE site_id = :site AND reftime = :reftime",
+        {"site": 3, "reftime": datetime(2022, 6, 1).date()},
+    ),
+}
+
+
+def populate(engine, n_flights):
+    rng = np.random.default_rng(42)
+    start = datetime(2010, 1, 1)
+    seconds = np.sort(rng.integers(0, 13 * 365 * 86400, n_flights))
+    sites = rng.integers(1, N_SITES + 1, n_flights)
+    with engine.begin() as con:
+        con.execute(
+            text(
+                "CREATE TABLE flight (id INTEGER PRIMARY KEY, source_id INTEGER, "
+                "site_id INTEGER, flid INTEGER, flno INTEGER, datetime TIMESTAMP, "
+                "length_km FLOAT)"
+            )
+        )
+        con.execute(
+            text(
+                "CREATE TABLE prediction (id INTEGER PRIMARY KEY, source_id INTEGER, "
+                "site_id INTEGER, reftime DATE, validtime DATE, leadtime_days INTEGER, "
+                "flying_probability FLOAT)"
+            )
+        )
+        con.exec_driver_sql(
+            "INSERT INTO flight (source_id, site_id, flid, flno, datetime, length_km) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            [
+                (1, int(site), i, i, start + timedelta(seconds=int(sec)), 10.0)
+                for i, (site, sec) in enumerate(zip(sites, seconds))
+            ],
+        )
+        days = [(start + timedelta(days=d)).date() for d in range(13 * 365)]
+        con.exec_driver_sql(
+            "INSERT INTO prediction (source_id, site_id, reftime, validtime, "
+            "leadtime_days, flying_probability) VALUES (?, ?, ?, ?, ?, ?)",
+            [
+                (1, site, day, day + timedelta(days=lt), lt, 0.5)
+                for day in days
+                for site in range(1, N_SITES + 1)
+                for lt in range(5)
+            ],
+        )
+
+
+def run_queries(engine, label, repeat=5):
+    print(f"\n== {label}")
+    with engine.connect() as con:
+        for name, (query, params) in QUERIES.items():
+            plan = con.execute(text("EXPLAIN QUERY PLAN " + query), params).fetchall()
+            t0 = time.perf_counter()
+            for _ in range(repeat):
+                con.execute(text(query), params).fetchall()
+            elapsed = (time.perf_counter() - t0) / repeat * 1000
+            print(f"{name:<30} {elapsed:9.2f} ms  {' / '.join(r[-1] for r in plan)}")
+
+
+def main(n_flights):
+    with tempfile.TemporaryDirectory() as tmpdir:
+        engine = create_engine(f"sqlite:///{Path(tmpdir) / 'bench.db'}")
+        t0 = time.perf_counter()
+        populate(engine, n_flights)
+        print(f"Populated {n_flights} flights in {time.perf_counter() - t0:.1f} s")
+        run_queries(engine, "without indexes")
+        t0 = time.perf_counter()
+        migrate(engine)
+        print(f"\nMigrated in {time.perf_counter() - t0:.1f} s")
+        run_queries(engine, "with indexes")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000)
@@ -0,0 +1,76 @@
+"""Timings of the listing page parsers: BeautifulSoup row by row with
+``preprocess_xcontest`` (previous implementation) versus the single lxml pass
+with the vectorized conversion, page by page and for saved pages converted in
+one chunk (``read_listing_dumps``). The pages are made of the rows of the test
+fixture.
+
+Usage: PYTHONPATH=. python benchmarks/bench_listing.py [n_pages] [rows_per_page]
+"""
+
+import re
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from bs4 import BeautifulSoup
+
+from startleiter import xcontest
+
+FIXTURE = Path(__file__).parents[1] / "tests" / "fixtures" / "xcontest" / "listing.html"
+
+
+def make_page(rows_per_page, page=0):
+    html = FIXTURE.read_text()
+    rows = re.findall(r"<tr id=.*?</tr>", html, flags=re.S)
+    body = "".join(
+        re.sub(r"FLID:\d+", f"FLID:{page * rows_per_page + i}", rows[i % len(rows)])
+        for i in range(rows_per_page)
+    )
+    return re.sub(r"(<tbody>).*(</tbody>)", rf"\1{body}\2", html, flags=re.S)
+
+
+def parse_bs4(page_source):
+    soup = BeautifulSoup(page_source, "html.parser")
+    rows = soup.find("table", attrs={"class": "flights"}).find("tbody")
+    flights = []
+    for row in rows.find_all("tr"):
+        summary = xcontest.flight_summary(row)
+        href = xcontest._flight_details_href(row)
+        flight = xcontest.preprocess_xcontest(summary + [None] * 7, 1, 1)
+        flights.append((flight, href))
+    return flights
+
+
+def parse_lxml(page_source):
+    listing = xcontest.convert_listing(xcontest.parse_listing_html(page_source))
+    return xcontest.listing_records(listing, 1, 1)
+
+
+def parse_lxml_chunk(paths):
+    listing = xcontest.read_listing_dumps(paths)
+    return xcontest.listing_records(listing, 1, 1)
+
+
+def timeit(func, pages):
+    start = time.perf_counter()
+    n = sum(len(func(page)) for page in pages)
+    return n, time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    n_pages = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    rows_per_page = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+    pages = [make_page(rows_per_page, page) for page in range(n_pages)]
+    print(f"{n_pages} pages of {rows_per_page} flights")
+    for name, func in [("beautifulsoup", parse_bs4), ("lxml", parse_lxml)]:
+        n, seconds = timeit(func, pages)
+        print(f"{name:<14} {seconds:7.2f} s  {n / seconds:9.0f} flights/s")
+    with tempfile.TemporaryDirectory() as tmpdir:
+        paths = [Path(tmpdir) / f"listing-{i}.html" for i in range(n_pages)]
+        for path, page in zip(paths, pages):
+            path.write_text(page)
+        start = time.perf_counter()
+        n = len(parse_lxml_chunk(paths))
+        seconds = time.perf_counter() - start
+        print(f"{'lxml (dumps)':<14} {seconds:7.2f} s  {n / seconds:9.0f} flights/s")
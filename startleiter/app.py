@@ -1,24 +1,41 @@
 import logging
-import pickle
+import threading
+import time as time_
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from datetime import datetime, timedelta
 from functools import lru_cache
 from io import BytesIO
+from pathlib import Path
 from typing import Literal, Optional
 
 import matplotlib.pyplot as plt
 import numpy as np
 import pandas as pd
+import requests
 import tensorflow as tf
 import xarray as xr
-from fastapi import FastAPI
+from fastapi import BackgroundTasks, FastAPI
+from starlette.concurrency import run_in_threadpool
 from starlette.responses import StreamingResponse, RedirectResponse
 
 from startleiter import config as CFG
-from startleiter import openmeteo, uwyo
-from startleiter.decorators import try_wait
-from startleiter.explainer import compute_shap
+from startleiter import (
+    calibration,
+    climatology,
+    grid,
+    hedging,
+    metrics,
+    openmeteo,
+    serving,
+    uwyo,
+)
+from startleiter.explainer import compute_shap, integrated_gradients
 from startleiter.plots import explainable_plot
-from startleiter.utils import to_wind_components
+from startleiter.resilience import CircuitOpenError, retry
+from startleiter.resultcache import ResultCache, artifacts_hash, persistent
+from startleiter.singleflight import coalesce
+from startleiter.utils import get_engine, to_wind_components
 
 LOGGER = logging.getLogger(__name__)
 app = FastAPI()
@@ -59,9 +76,13 @@ MODEL_FLYABILITY = tf.keras.models.load_model("models/flyability.h5")
 MODEL_MAX_ALT = tf.keras.models.load_model("models/fly_max_alt.h5")
 MODEL_MAX_DIST = tf.keras.models.load_model("models/fly_max_dist.h5")
 
-FLYABILITY_CALIBRATION_CURVE = pickle.load(
-    open("models/flyability_calibration_curve.pkl", "rb")
-)
+# models run in TF1 graph mode (see explainer.py), whose default graph and
+# session are thread-local: keep a reference to use them from worker threads
+MODEL_GRAPH = tf.compat.v1.get_default_graph()
+MODEL_SESSION = tf.compat.v1.keras.backend.get_session()
+_MODEL_LOCK = threading.RLock()
+
+FLYABILITY_CALIBRATION_CURVE = calibration.load("models/flyability_calibration_curve")
 
 MOMENTS_FLYABILITY = xr.load_dataset("models/flyability_moments.nc")
 MOMENTS_MAX_ALT = xr.load_dataset("models/fly_max_alt_moments.nc")
@@ -71,12 +92,46 @@ BACKGROUND = np.load("models/flyability_background.npy")
 
 FLY_PROB_THR = 0.2
 
+MODEL_HASH = artifacts_hash(*Path("models").glob("*"))
+RESULT_CACHE = (
+    ResultCache(CFG["result_cache"]["path"], CFG["result_cache"]["max_mb"] * 2**20)
+    if CFG["result_cache"]["enabled"]
+    else None
+)
+
+RETRY_DEADLINE = CFG["resilience"]["deadline"]
+
+HEDGING = CFG["hedging"]
+# source of the inputs when the radiosounding is late or missing
+FALLBACK_SOURCE = "DWD-ICON sounding +0 h"
+SOUNDING_ERRORS = (
+    IndexError,
+    CircuitOpenError,
+    TimeoutError,
+    requests.RequestException,
+)
+_EXECUTOR = ThreadPoolExecutor(max_workers=HEDGING["max_workers"])
+_PLOT_LOCK = threading.Lock()
+
+SERVING = CFG["serving"]
+
+EXPLANATION = CFG["explanation"]
+# fast: expected gradients over the background, full: SHAP values
+QUALITY = Literal["fast", "full"]
+
+GRID = CFG["grid"]
+
 
 @app.get("/", include_in_schema=False)
 async def basic_view():
     return RedirectResponse("/docs")
 
 
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    return metrics.snapshot()
+
+
 def parse_time(time: str, leadtime_days) -> tuple[datetime, int, datetime]:
     if time == "latest":
         time = datetime.utcnow()
@@ -93,6 +148,8 @@ def parse_time(time: str, leadtime_days) -> tuple[datetime, int, datetime]:
     else:
         time = pd.to_datetime(time)
     leadtime_days = leadtime_days or 0
+    # resolve to the data cycle, so that identical requests share the same key
+    time = time.replace(hour=0, minute=0, second=0, microsecond=0)
     if time.date() > datetime.utcnow().date():
         raise ValueError("Argument 'time' cannot be in the future!")
     if leadtime_days < 0:
@@ -103,13 +160,13 @@ def parse_time(time: str, leadtime_days) -> tuple[datetime, int, datetime]:
     return time, leadtime_days, validtime
 
 
-@try_wait(maxattempts=3)
+@retry(maxattempts=3, deadline=RETRY_DEADLINE, upstream="uwyo")
 def get_last_sounding(station, time):
     data = list(uwyo.scrape(station, time).items())[0]
     return data[0], data[1]["data"]
 
 
-@try_wait(maxattempts=3)
+@retry(maxattempts=3, deadline=RETRY_DEADLINE, upstream="openmeteo")
 def get_last_sounding_forecast(station, leadtime_hrs):
     leadtime = timedelta(hours=leadtime_hrs)
     lat = station["latitude"]
@@ -148,6 +205,19 @@ def extract_features(ds):
     return ds[["TEMP", "DWPD", "U", "V", "WOY"]].rename({"PRES": "level"})
 
 
+@contextmanager
+def model_context():
+    """Make the models usable from the current thread."""
+    with _MODEL_LOCK, MODEL_GRAPH.as_default():
+        tf.compat.v1.keras.backend.set_session(MODEL_SESSION)
+        yield
+
+
+def run_model(model, inputs: np.ndarray) -> np.ndarray:
+    with model_context():
+        return model.predict(inputs)
+
+
 def standardize(da, moments, inverse=False):
     """Standardize the input data with training mean and standard deviation."""
     if not inverse:
@@ -156,6 +226,34 @@ def standardize(da, moments, inverse=False):
         return da * moments.sigma + moments.mu
 
 
+def get_hedged_sounding(station: dict, time: datetime) -> tuple[datetime, xr.Dataset]:
+    """Race the observed sounding against the DWD-ICON analysis.
+
+    The UWYO radiosounding is requested first. If it has not arrived after
+    ``hedge_after`` seconds (or failed), the ICON +0 h sounding is requested in
+    parallel. The observation is used if it arrives within ``budget`` seconds,
+    the forecast otherwise.
+    """
+    t0 = time_.monotonic()
+    (validtime, sounding), source = hedging.hedge(
+        "sounding",
+        lambda: get_last_sounding(station["stid"], time),
+        lambda: get_last_sounding_forecast(station, leadtime_hrs=0),
+        _EXECUTOR,
+        HEDGING["hedge_after"],
+        HEDGING["budget"],
+        SOUNDING_ERRORS,
+    )
+    if source == "primary":
+        sounding.attrs["source"] = f"Radiosounding 00Z {station['long_name']}"
+        metrics.increment("sounding.source.observation")
+    else:
+        sounding.attrs["source"] = FALLBACK_SOURCE
+        metrics.increment("sounding.source.forecast")
+    metrics.increment("sounding.latency_seconds", time_.monotonic() - t0)
+    return validtime, sounding
+
+
 def get_sounding(station: str, time: datetime, leadtime_days: int) -> xr.Dataset:
     """Get the input data"""
     time = time.replace(hour=0, minute=0, second=0, microsecond=0)
@@ -166,13 +264,15 @@ def get_sounding(station: str, time: datetime, leadtime_days: int) -> xr.Dataset
             station, leadtime_hrs=int(leadtime_days) * 24
         )
         sounding.attrs["source"] = f"DWD-ICON sounding +{leadtime_days * 24:.0f} h"
+    elif HEDGING["enabled"]:
+        validtime, sounding = get_hedged_sounding(station, time)
     else:
         try:
             validtime, sounding = get_last_sounding(station["stid"], time)
-        except IndexError:
+        except SOUNDING_ERRORS:
             LOGGER.error("radiosounding not available, using forecast data")
             validtime, sounding = get_last_sounding_forecast(station, leadtime_hrs=0)
-            sounding.attrs["source"] = "DWD-ICON sounding +0 h"
+            sounding.attrs["source"] = FALLBACK_SOURCE
         else:
             sounding.attrs["source"] = f"Radiosounding 00Z {station['long_name']}"
     sounding.attrs["validtime"] = validtime
@@ -189,6 +289,8 @@ def get_surface(time: datetime, leadtime_days: int) -> xr.Dataset:
     return surface[["KLO-GVE", "KLO-LUG"]]
 
 
+@lru_cache(maxsize=12)
+@coalesce("get_inputs")
 def get_inputs(time, leadtime_days):
     features = get_sounding("Cameri", time, leadtime_days)
     surface = get_surface(time, leadtime_days)
@@ -213,95 +315,394 @@ def preprocess(features, site, moments):
     return xr.concat((inputs_features, inputs_embedding), "variable")
 
 
-@lru_cache(maxsize=42)
-def predict(site: str, time: datetime, leadtime_days: int):
-    """Predict flyability, max altitude and max distance."""
-
-    inputs = get_inputs(time, leadtime_days)
-
+def model_inputs(inputs: xr.DataArray, sites, moments) -> np.ndarray:
+    """Same as :func:`preprocess`, vectorized over sites and optional leading
+    dimensions of ``inputs`` (e.g. validtime).
+
+    Returns
+    -------
+    numpy.ndarray
+        Model inputs of shape (n_sites * n, n_levels, n_variables), site-major.
+    """
+    features = standardize(inputs, moments).fillna(FILL_NA_VALUE)
+    features = features.transpose(..., "level", "variable").values
+    features = features.reshape(-1, *features.shape[-2:])
+    batch = np.empty((len(sites), *features.shape[:-1], features.shape[-1] + 1))
+    batch[..., :-1] = features
+    batch[..., -1] = np.array([SITE_IDS[site] for site in sites])[:, None, None]
+    return batch.reshape(-1, *batch.shape[-2:])
+
+
+def run_models(features) -> tuple[np.ndarray, ...]:
+    """Run all models on a batch of samples.
+
+    Parameters
+    ----------
+    features: callable
+        Model inputs of the samples, given the moments of a model (see
+        :func:`model_inputs`).
+
+    Returns
+    -------
+    fly_prob, max_alt_gain, max_dist: numpy.ndarray
+        One value per sample.
+    """
     # flyability
-    features = preprocess(inputs, site, MOMENTS_FLYABILITY)
-    fly_prob = float(MODEL_FLYABILITY.predict(features.values[None, ..., 0])[0][0])
-    fly_prob = float(FLYABILITY_CALIBRATION_CURVE.predict([fly_prob]))
+    fly_prob = run_model(MODEL_FLYABILITY, features(MOMENTS_FLYABILITY))[:, 0]
+    fly_prob = FLYABILITY_CALIBRATION_CURVE.predict(fly_prob)
     if POSITIVE_LABEL == 0:
         fly_prob = 1 - fly_prob
 
     # max altitude and distance
-    if fly_prob < FLY_PROB_THR:
-        max_alt_gain = 0
-        max_dist = 0
-    else:
-        features = preprocess(inputs, site, MOMENTS_MAX_ALT)
-        max_alt_gain = ALT_BINS[
-            int(MODEL_MAX_ALT.predict(features.values[None, ..., 0])[0].argmax())
-        ]
-        features = preprocess(inputs, site, MOMENTS_MAX_DIST)
-        max_dist = DIST_BINS[
-            int(MODEL_MAX_DIST.predict(features.values[None, ..., 0])[0].argmax())
-        ]
+    max_alt_gain = np.zeros(fly_prob.size, dtype=int)
+    max_dist = np.zeros(fly_prob.size, dtype=int)
+    flyable = np.flatnonzero(fly_prob >= FLY_PROB_THR)
+    if flyable.size > 0:
+        output = run_model(MODEL_MAX_ALT, features(MOMENTS_MAX_ALT)[flyable])
+        max_alt_gain[flyable] = np.take(ALT_BINS, output.argmax(axis=1))
+        output = run_model(MODEL_MAX_DIST, features(MOMENTS_MAX_DIST)[flyable])
+        max_dist[flyable] = np.take(DIST_BINS, output.argmax(axis=1))
+    return fly_prob, max_alt_gain, max_dist
+
+
+def predict_inputs(inputs: xr.DataArray, sites) -> tuple[np.ndarray, ...]:
+    """Run all models on ``inputs`` for several sites in one batch.
+
+    Returns
+    -------
+    fly_prob, max_alt, max_dist: numpy.ndarray
+        Arrays of shape (n_sites, *leading dimensions of inputs).
+    """
+    shape = (len(sites), *inputs.shape[:-2])
+    fly_prob, max_alt_gain, max_dist = run_models(
+        lambda moments: model_inputs(inputs, sites, moments)
+    )
+    elevation = np.array([SITES[site]["elevation"] for site in sites])
+    max_alt = (max_alt_gain.reshape(shape).T + elevation).T // 100 * 100
+    return fly_prob.reshape(shape), max_alt, max_dist.reshape(shape)
+
+
+def run_points(inputs: xr.DataArray, site_ids: np.ndarray) -> tuple[np.ndarray, ...]:
+    """Run all models on the inputs of many points.
+
+    Parameters
+    ----------
+    inputs: xarray.DataArray
+        Inputs with dimensions (point, level, variable).
+    site_ids: numpy.ndarray
+        Site embedding of each point.
+
+    Returns
+    -------
+    fly_prob, max_alt_gain, max_dist: numpy.ndarray
+        One value per point.
+    """
+
+    def features(moments):
+        features = standardize(inputs, moments)
+        features = features.fillna(FILL_NA_VALUE).transpose(..., "level", "variable")
+        batch = np.empty((*features.shape[:-1], features.shape[-1] + 1))
+        batch[..., :-1] = features.values
+        batch[..., -1] = site_ids[:, None]
+        return batch
+
+    return run_models(features)
+
+
+def get_grid_inputs(lat, lon, time: datetime, leadtime_days: int):
+    """Inputs of many points, from the DWD-ICON soundings at the points and the
+    pressure differences of the surface stations.
+
+    Returns
+    -------
+    validtime: datetime
+    inputs: xarray.DataArray
+        Inputs with dimensions (point, level, variable).
+    elevation: numpy.ndarray
+        Elevation of the model grid cell of each point.
+    """
+    validtime, soundings = openmeteo.scrape_soundings(
+        lat,
+        lon,
+        timedelta(days=leadtime_days),
+        batch_size=GRID["batch_size"],
+        workers=GRID["workers"],
+    )
+    if validtime != time + timedelta(days=leadtime_days):
+        raise ValueError(
+            f"Soundings valid at {validtime:%Y-%m-%d}, not at the requested "
+            f"{time + timedelta(days=leadtime_days):%Y-%m-%d}"
+        )
+    elevation = soundings["elevation"].values
+    soundings.attrs["validtime"] = validtime
+    features = extract_features(soundings)
+    features = features.sel(level=slice(1000, PRESSURE_MIN_hPa))
+    surface = get_surface(time, leadtime_days)
+    surface = surface.pad(
+        date=(0, features.sizes["level"] - surface.sizes["date"]),
+        constant_values=np.nan,
+    )
+    surface = surface.rename({"date": "level"}).drop("level")
+    features = features.merge(surface)
+    inputs = features.to_array().transpose("point", "level", "variable")
+    return validtime, inputs.astype("float32"), elevation
+
+
+def predict_grid(lat, lon, time: datetime, leadtime_days: int) -> dict:
+    """Predict flyability, max altitude and max distance at many points, each
+    one embedded as the nearest trained site."""
+    validtime, inputs, elevation = get_grid_inputs(lat, lon, time, leadtime_days)
+    result = grid.predict_points(
+        run_points, inputs, lat, lon, elevation, SITES, SITE_IDS, GRID["chunk_size"]
+    )
+    return {"validtime": f"{validtime:%Y-%m-%d}", **result}
+
+
+def predict_batch(sites, time: datetime, leadtime_days: int) -> list[tuple]:
+    """Predict flyability, max altitude and max distance for several sites.
+
+    The inputs are fetched once and all sites go through the models in a
+    single batch.
+    """
+    inputs = get_inputs(time, leadtime_days)
+    fly_prob, max_alt, max_dist = predict_inputs(inputs, sites)
+    return [
+        (float(fly_prob[i]), int(max_alt[i]), int(max_dist[i]))
+        for i in range(len(sites))
+    ]
+
+
+def is_final(site: str, time: datetime, leadtime_days: int, *args) -> bool:
+    """Whether the results of a request are final, i.e. not computed from the
+    ICON analysis standing in for a late radiosounding, which will be replaced
+    once the observation is available."""
+    return get_inputs(time, leadtime_days).attrs["source"] != FALLBACK_SOURCE
 
-    max_alt = (max_alt_gain + SITES[site]["elevation"]) // 100 * 100
 
-    return fly_prob, max_alt, max_dist
+@lru_cache(maxsize=42)
+@coalesce("predict")
+def predict(site: str, time: datetime, leadtime_days: int):
+    """Predict flyability, max altitude and max distance."""
+    return predict_batch([site], time, leadtime_days)[0]
 
 
 @lru_cache(maxsize=21)
-def explain(site: str, time: datetime, leadtime_days: int):
-    fly_prob, max_alt, max_dist = predict(site, time, leadtime_days)
+@coalesce("shap_values")
+@persistent(RESULT_CACHE, "shap_values", MODEL_HASH, is_final)
+def compute_shap_values(
+    site: str, time: datetime, leadtime_days: int, quality: QUALITY = "full"
+) -> np.ndarray:
     inputs = get_inputs(time, leadtime_days)
     features = preprocess(inputs, site, MOMENTS_FLYABILITY)
-    shap_values = compute_shap(
-        BACKGROUND, MODEL_FLYABILITY, features.values[None, ..., 0]
-    )[0]
+    with model_context():
+        if quality == "fast":
+            shap_values = integrated_gradients(
+                BACKGROUND,
+                MODEL_FLYABILITY,
+                features.values[None, ..., 0],
+                steps=EXPLANATION["fast_steps"],
+            )[0]
+        else:
+            shap_values = compute_shap(
+                BACKGROUND,
+                MODEL_FLYABILITY,
+                features.values[None, ..., 0],
+                nsamples=EXPLANATION["full_nsamples"],
+            )[0]
     if POSITIVE_LABEL == 0:
         shap_values *= -1
-    fig = explainable_plot(
-        SITES[site],
-        time,
-        leadtime_days,
-        list(features.coords["variable"].values),
-        inputs,
-        shap_values,
-        fly_prob,
-        max_alt,
-        max_dist,
-        min_pressure_hPa=PRESSURE_MIN_hPa,
-    )
-    return fig
+    return shap_values
 
 
-@app.get("/site")
-@app.get("/cimetta")  # deprecated
-async def predict_site(
-    site: AVAILABLE_SITES = "Cimetta",
-    time: str = "latest",
-    leadtime_days: Optional[int] = None,
-):
-    time, leadtime_days, validtime = parse_time(time, leadtime_days)
+def explain(site: str, time: datetime, leadtime_days: int, quality: QUALITY = "full"):
     fly_prob, max_alt, max_dist = predict(site, time, leadtime_days)
+    inputs = get_inputs(time, leadtime_days)
+    features = preprocess(inputs, site, MOMENTS_FLYABILITY)
+    shap_values = compute_shap_values(site, time, leadtime_days, quality)
+    with _PLOT_LOCK:  # pyplot is not thread-safe
+        fig = explainable_plot(
+            SITES[site],
+            time,
+            leadtime_days,
+            list(features.coords["variable"].values),
+            inputs,
+            shap_values.copy(),
+            fly_prob,
+            max_alt,
+            max_dist,
+            min_pressure_hPa=PRESSURE_MIN_hPa,
+        )
+    return fig
+
 
+def _prediction_dict(site, time, leadtime_days, prediction) -> dict:
+    fly_prob, max_alt, max_dist = prediction
+    validtime = time + timedelta(days=leadtime_days)
     return {
         "site": site,
         "validtime": f"{validtime:%Y-%m-%d}",
         "flying_probability": fly_prob,
         "max_altitude_masl": max_alt,
         "max_distance_km": max_dist,
+        "source": get_inputs(time, leadtime_days).attrs["source"],
     }
 
 
+@coalesce("get_prediction")
+@persistent(RESULT_CACHE, "prediction", MODEL_HASH, is_final)
+def get_prediction(site: str, time: datetime, leadtime_days: int) -> dict:
+    prediction = predict(site, time, leadtime_days)
+    return _prediction_dict(site, time, leadtime_days, prediction)
+
+
+def get_predictions(sites, time: datetime, leadtime_days: int) -> list[dict]:
+    """Same as :func:`get_prediction`, for several sites in one batch."""
+    predictions = predict_batch(sites, time, leadtime_days)
+    return [
+        _prediction_dict(site, time, leadtime_days, prediction)
+        for site, prediction in zip(sites, predictions)
+    ]
+
+
+@lru_cache(maxsize=21)
+@coalesce("render_plot")
+@persistent(RESULT_CACHE, "plot", MODEL_HASH, is_final)
+def render_plot(
+    site: str, time: datetime, leadtime_days: int, quality: QUALITY = "full"
+) -> dict:
+    fig = explain(site, time, leadtime_days, quality)
+    image_file = BytesIO()
+    with _PLOT_LOCK:
+        fig.savefig(image_file)
+        plt.close(fig)
+    validtime = time + timedelta(days=leadtime_days)
+    return {
+        "image": image_file.getvalue(),
+        "validtime": f"{validtime:%Y-%m-%d}",
+        "source": get_inputs(time, leadtime_days).attrs["source"],
+    }
+
+
+LAST_PREDICTIONS = serving.LastGoodCache("predict", serving.max_staleness())
+LAST_PLOTS = serving.LastGoodCache("plot", serving.max_staleness())
+
+
+@app.get("/site")
+@app.get("/cimetta")  # deprecated
+async def predict_site(
+    background_tasks: BackgroundTasks,
+    site: AVAILABLE_SITES = "Cimetta",
+    time: str = "latest",
+    leadtime_days: Optional[int] = None,
+    stale_ok: Optional[bool] = None,
+):
+    """Predict flyability, max altitude and max distance.
+
+    With ``stale_ok``, the last good prediction of an earlier data cycle is
+    returned immediately (``stale: true``) while the new one is computed.
+    """
+    time, leadtime_days, _ = parse_time(time, leadtime_days)
+    if stale_ok is None:
+        stale_ok = SERVING["stale_while_revalidate"]
+    prediction, stale = await serving.serve(
+        LAST_PREDICTIONS,
+        (site, leadtime_days),
+        time,
+        get_prediction,
+        (site, time, leadtime_days),
+        stale_ok,
+        background_tasks,
+    )
+    return dict(prediction, stale=stale)
+
+
 @app.get("/site_plot")
 @app.get("/cimetta_plot")  # deprecated
 async def plot_site(
+    background_tasks: BackgroundTasks,
     site: AVAILABLE_SITES = "Cimetta",
     time: str = "latest",
     leadtime_days: Optional[int] = None,
+    stale_ok: Optional[bool] = None,
+    quality: QUALITY = "full",
 ):
+    """Plot of the prediction and its explanation.
+
+    With ``quality=fast``, the contributions of the inputs are approximated
+    by deterministic expected gradients in a single batch instead of sampled
+    SHAP values, for quick previews.
+    """
     time, leadtime_days, _ = parse_time(time, leadtime_days)
+    if stale_ok is None:
+        stale_ok = SERVING["stale_while_revalidate"]
+    plot, stale = await serving.serve(
+        LAST_PLOTS,
+        (site, leadtime_days, quality),
+        time,
+        render_plot,
+        (site, time, leadtime_days, quality),
+        stale_ok,
+        background_tasks,
+    )
+    headers = {
+        "X-Stale": str(stale).lower(),
+        "X-Validtime": plot["validtime"],
+        "X-Source": plot["source"],
+    }
+    return StreamingResponse(
+        BytesIO(plot["image"]),
+        media_type="image/png",
+        headers=headers,
+    )
 
-    fig = explain(site, time, leadtime_days)
 
-    image_file = BytesIO()
-    plt.savefig(image_file)
-    plt.close(fig)
-    image_file.seek(0)
-    return StreamingResponse(image_file, media_type="image/png")
+@app.get("/grid")
+async def predict_grid_points(
+    bbox: Optional[str] = None,
+    step: float = GRID["step"],
+    points: Optional[str] = None,
+    time: str = "latest",
+    leadtime_days: Optional[int] = None,
+    format: Literal["geojson", "array"] = "geojson",
+):
+    """Predict flyability, max altitude and max distance at many launch points.
+
+    The points are either given as ``points=lat,lon;lat,lon;...`` or laid on a
+    grid of ``step`` degrees covering ``bbox=lon_min,lat_min,lon_max,lat_max``.
+    Each point is embedded as the nearest trained site. The result is a GeoJSON
+    FeatureCollection, or with ``format=array`` one array per property.
+    """
+    time, leadtime_days, _ = parse_time(time, leadtime_days)
+    grid.check_cycle(time)
+    lat, lon = grid.request_points(bbox, step, points, GRID["max_points"])
+    result = await run_in_threadpool(predict_grid, lat, lon, time, leadtime_days)
+    if format == "array":
+        return {
+            name: value.tolist() if isinstance(value, np.ndarray) else value
+            for name, value in result.items()
+        }
+    validtime = result.pop("validtime")
+    lat, lon = result.pop("latitude"), result.pop("longitude")
+    return dict(grid.to_geojson(lat, lon, result), validtime=validtime)
+
+
+@lru_cache(maxsize=1)
+def database_engine():
+    return get_engine()
+
+
+@app.get("/climatology")
+async def get_site_climatology(site: AVAILABLE_SITES = "Cimetta", days: int = 90):
+    """Daily reference values of the monitoring reports (same-week means of the
+    past years, smoothed over 20 days) for the last ``days`` days."""
+    df = await run_in_threadpool(
+        climatology.query, database_engine(), SITE_IDS[site], days
+    )
+    df = df.astype(object).where(df.notna(), None)
+    return {
+        "site": site,
+        "climatology": [
+            {"date": f"{day:%Y-%m-%d}", **values}
+            for day, values in zip(df.index, df.to_dict("records"))
+        ],
+    }
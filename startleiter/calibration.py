@@ -0,0 +1,74 @@
+"""Calibration of the flyability probabilities as a monotone lookup table.
+
+The calibration curve was fitted as a scikit-learn isotonic regression and
+pickled, which ties loading it to the library version. Its knots are exported
+to a small ``.npz`` file (``x`` and ``y``, increasing) and the curve applied
+by linear interpolation, clipped to the first and last knots as the isotonic
+regression with ``out_of_bounds="clip"`` does, to arrays of any shape.
+
+Usage: python startleiter/calibration.py models/flyability_calibration_curve.pkl
+"""
+
+import argparse
+import logging
+import pickle
+from pathlib import Path
+from typing import NamedTuple
+
+import numpy as np
+
+LOGGER = logging.getLogger(__name__)
+
+# knots sampled from estimators without thresholds
+GRID_SIZE = 1001
+
+
+class Calibration(NamedTuple):
+    x: np.ndarray
+    y: np.ndarray
+
+    def predict(self, prob) -> np.ndarray:
+        """Calibrated probabilities, same shape as ``prob``."""
+        return np.interp(prob, self.x, self.y)
+
+
+def from_estimator(estimator) -> Calibration:
+    """Knots of a fitted calibration estimator with a ``predict`` method."""
+    if hasattr(estimator, "X_thresholds_"):
+        x, y = estimator.X_thresholds_, estimator.y_thresholds_
+    else:
+        x = np.linspace(0, 1, GRID_SIZE)
+        y = np.maximum.accumulate(np.asarray(estimator.predict(x)))
+    return Calibration(np.asarray(x, "f8"), np.asarray(y, "f8"))
+
+
+def save(calibration: Calibration, path) -> None:
+    np.savez(path, x=calibration.x, y=calibration.y)
+
+
+def load(path) -> Calibration:
+    """Load the knots of ``<path>.npz``, or those of the pickled estimator
+    ``<path>.pkl`` if they were not exported yet."""
+    path = Path(path)
+    if path.with_suffix(".npz").exists():
+        with np.load(path.with_suffix(".npz")) as knots:
+            return Calibration(knots["x"], knots["y"])
+    LOGGER.warning(f"No calibration table {path.with_suffix('.npz')}, unpickling")
+    with open(path.with_suffix(".pkl"), "rb") as f:
+        return from_estimator(pickle.load(f))
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        format="%(levelname)-4s [%(filename)s:%(lineno)d] %(message)s",
+        datefmt="%Y-%m-%d:%H:%M:%S",
+        level=logging.INFO,
+    )
+    parser = argparse.ArgumentParser(description="Export a calibration curve.")
+    parser.add_argument("pickle", help="pickled calibration estimator")
+    args = parser.parse_args()
+    path = Path(args.pickle)
+    with open(path, "rb") as f:
+        calibration = from_estimator(pickle.load(f))
+    save(calibration, path.with_suffix(".npz"))
+    LOGGER.info(f"Saved {len(calibration.x)} knots to {path.with_suffix('.npz')}")
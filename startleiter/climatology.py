@@ -0,0 +1,149 @@
+"""Climatology of the flights, the reference curves of the monitoring reports.
+
+For each day, the reference is the mean over the past ``N_YEARS`` years of
+the days of the same ISO week: number of flights (on flying days), maximum
+altitude, distance and airtime. The daily references are stored per site in
+the ``climatology`` table and only the new days (and the last
+``REVISE_DAYS`` days, whose flights may still get their details) are
+computed on update. Reading a window applies the centered 20 day smoothing.
+
+Usage: python startleiter/climatology.py
+"""
+
+import logging
+from datetime import date, timedelta
+from typing import Optional
+
+import pandas as pd
+from sqlalchemy import func, select
+
+from startleiter import features
+from startleiter.database import Climatology, Flight, FlightFeature
+
+LOGGER = logging.getLogger(__name__)
+
+VARIABLES = ["n_flights", "max_altitude_m", "length_km", "airtime_hours"]
+N_YEARS = 6
+SMOOTHING_DAYS = 20
+REVISE_DAYS = 7
+
+
+def daily_stats(con, site_id: int, start: Optional[date] = None) -> pd.DataFrame:
+    """Number of flights and mean metrics per flying day since ``start``."""
+    table = FlightFeature.__table__
+    query = (
+        select(
+            table.c.date,
+            func.count().label("n_flights"),
+            func.avg(table.c.max_altitude_m).label("max_altitude_m"),
+            func.avg(table.c.length_km).label("length_km"),
+            func.avg(table.c.airtime_hours).label("airtime_hours"),
+        )
+        .where(table.c.site_id == site_id)
+        .where(table.c.included)
+        .group_by(table.c.date)
+    )
+    if start is not None:
+        query = query.where(table.c.date >= start)
+    df = pd.read_sql(query, con)
+    df.index = pd.DatetimeIndex(pd.to_datetime(df.pop("date")), name="date")
+    return df[VARIABLES].astype("float64")
+
+
+def reference(daily: pd.DataFrame, start: date, end: date) -> pd.DataFrame:
+    """Same-week means over the ``N_YEARS`` years up to each day in [start, end]."""
+    days = pd.date_range(daily.index.min(), pd.Timestamp(end), freq="D", name="date")
+    daily = daily.reindex(days)
+    ref = daily.groupby(days.isocalendar().week.to_numpy())
+    ref = ref.rolling(f"{N_YEARS * 365}D").mean().reset_index(0, drop=True)
+    return ref.sort_index().loc[pd.Timestamp(start) :]
+
+
+def update(engine, site_id: int, today: Optional[date] = None) -> int:
+    """Compute the references of the days since the last update.
+
+    Returns
+    -------
+    int
+        Number of days computed.
+    """
+    today = today or date.today()
+    features.refresh(engine, site_id)
+    table = Climatology.__table__
+    with engine.begin() as con:
+        last = con.execute(
+            select(func.max(table.c.date)).where(table.c.site_id == site_id)
+        ).scalar()
+        start = today if last is None else min(last - timedelta(REVISE_DAYS), today)
+        daily = daily_stats(
+            con, site_id, None if last is None else start - timedelta(N_YEARS * 365)
+        )
+        if daily.empty:
+            return 0
+        if last is None:
+            start = daily.index.min().date()
+        ref = reference(daily, start, today)
+        rows = ref.astype(object).where(ref.notna(), None).assign(site_id=site_id)
+        rows = rows.reset_index().assign(date=ref.index.date).to_dict("records")
+        con.execute(
+            table.delete()
+            .where(table.c.site_id == site_id)
+            .where(table.c.date >= start)
+        )
+        con.execute(table.insert(), rows)
+    LOGGER.info(f"Site {site_id}: climatology of {len(rows)} days computed.")
+    return len(rows)
+
+
+def query(engine, site_id: int, days: int = 90, end: Optional[date] = None):
+    """Smoothed references of the ``days`` days up to ``end`` (included).
+
+    Returns
+    -------
+    pandas.DataFrame
+        Indexed by date, with the columns ``VARIABLES``.
+    """
+    end = pd.Timestamp(end or date.today())
+    start = end - pd.Timedelta(days=days)
+    table = Climatology.__table__
+    stmt = (
+        select(table.c.date, *[table.c[col] for col in VARIABLES])
+        .where(table.c.site_id == site_id)
+        .where(table.c.date > (start - pd.Timedelta(days=SMOOTHING_DAYS)).date())
+        .where(table.c.date <= end.date())
+        .order_by(table.c.date)
+    )
+    with engine.connect() as con:
+        df = pd.read_sql(stmt, con)
+    return smooth(df, start)
+
+
+def smooth(df: pd.DataFrame, start) -> pd.DataFrame:
+    """Centered smoothing of daily references read from the table, returned
+    for the days after ``start``."""
+    df = df.set_index(pd.DatetimeIndex(pd.to_datetime(df["date"]), name="date"))
+    df = df[VARIABLES].astype("float64")
+    df = df.rolling(f"{SMOOTHING_DAYS}D", center=True).mean()
+    return df.loc[pd.Timestamp(start) + pd.Timedelta(days=1) :]
+
+
+def get_climatology(engine, site_id: int, days: int = 90) -> pd.DataFrame:
+    """Climatology of the last ``days`` days of a site. Read-only: the table is
+    updated by the crawl, by this module's entry point and by the publish
+    snapshot."""
+    return query(engine, site_id, days)
+
+
+if __name__ == "__main__":
+    from startleiter.utils import get_engine
+
+    logging.basicConfig(
+        format="%(levelname)-4s [%(filename)s:%(lineno)d] %(message)s",
+        datefmt="%Y-%m-%d:%H:%M:%S",
+        level=logging.INFO,
+    )
+    engine = get_engine()
+    with engine.connect() as con:
+        site_ids = con.execute(select(Flight.site_id).distinct()).scalars().all()
+    for site_id in sorted(site_ids):
+        update(engine, site_id)
@@ -1,21 +1,28 @@
+import csv
+import io
 import logging
 import os
 
 import pandas as pd
-from sqlalchemy import create_engine
+from sqlalchemy import bindparam, create_engine, select, tuple_
 from sqlalchemy import (
+    Boolean,
     Column,
     Date,
     DateTime,
     Float,
     ForeignKey,
     Integer,
+    Index,
     Interval,
+    SmallInteger,
     String,
 )
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship, sessionmaker
 
+from startleiter.migrations import migrate
 
 LOGGER = logging.getLogger(__name__)
 
@@ -58,6 +65,11 @@ class Station(Base):
 
 class Flight(Base):
     __tablename__ = "flight"
+    __table_args__ = (
+        Index("flight_flid_key", "flid", unique=True),
+        Index("ix_flight_site_flno", "site_id", "flno"),
+        Index("ix_flight_site_datetime", "site_id", "datetime"),
+    )
     id = Column(Integer, primary_key=True)
     source_id = Column(Integer, ForeignKey("source.id"), nullable=False)
     site_id = Column(Integer, ForeignKey("site.id"), nullable=False)
@@ -82,6 +94,16 @@ class Flight(Base):
 
 class Prediction(Base):
     __tablename__ = "prediction"
+    __table_args__ = (
+        Index(
+            "prediction_site_reftime_key",
+            "site_id",
+            "reftime",
+            "leadtime_days",
+            unique=True,
+        ),
+        Index("ix_prediction_site_validtime", "site_id", "validtime"),
+    )
     id = Column(Integer, primary_key=True)
     source_id = Column(Integer, ForeignKey("source.id"), nullable=False)
     site_id = Column(Integer, ForeignKey("site.id"), nullable=False)
@@ -93,14 +115,148 @@ class Prediction(Base):
     max_distance_km = Column(Float)
 
 
+class Hindcast(Base):
+    """Predictions of the archived soundings (see hindcast.py), per version of
+    the models."""
+
+    __tablename__ = "hindcast"
+    __table_args__ = (
+        Index(
+            "hindcast_site_validtime_model_key",
+            "site_id",
+            "validtime",
+            "model_hash",
+            unique=True,
+        ),
+    )
+    id = Column(Integer, primary_key=True)
+    site_id = Column(Integer, ForeignKey("site.id"), nullable=False)
+    validtime = Column(Date, nullable=False)
+    # resultcache.artifacts_hash of the models
+    model_hash = Column(String(16), nullable=False)
+    flying_probability = Column(Float)
+    max_altitude_masl = Column(Float)
+    max_distance_km = Column(Float)
+
+
+class FlightFeature(Base):
+    """Flights with the derived columns of ``utils.prepare_flights``, kept up
+    to date by ``features.refresh``."""
+
+    __tablename__ = "flight_feature"
+    __table_args__ = (Index("ix_flight_feature_site_datetime", "site_id", "datetime"),)
+    id = Column(Integer, ForeignKey("flight.id"), primary_key=True)
+    site_id = Column(Integer, ForeignKey("site.id"), nullable=False)
+    # False for the flights filtered out by prepare_flights
+    included = Column(Boolean, nullable=False)
+    datetime = Column(DateTime(timezone=True))
+    date = Column(Date)
+    length_km = Column(Float)
+    max_altitude_m = Column(Integer)
+    airtime = Column(Interval)
+    airtime_hours = Column(Float)
+    glider_cat = Column(String(30))
+    occurrences_last_24h = Column(Integer)
+    # codes of features.DAYS, features.MONTHS and features.SEASONS
+    dayofweek = Column(SmallInteger)
+    month = Column(SmallInteger)
+    season = Column(SmallInteger)
+
+
+class Climatology(Base):
+    """Daily reference values of the flights of a site, see climatology.py."""
+
+    __tablename__ = "climatology"
+    __table_args__ = (
+        Index("climatology_site_date_key", "site_id", "date", unique=True),
+    )
+    id = Column(Integer, primary_key=True)
+    site_id = Column(Integer, ForeignKey("site.id"), nullable=False)
+    date = Column(Date, nullable=False)
+    n_flights = Column(Float)
+    max_altitude_m = Column(Float)
+    length_km = Column(Float)
+    airtime_hours = Column(Float)
+
+
+class CrawlCheckpoint(Base):
+    """Next listing offset to crawl, per site."""
+
+    __tablename__ = "crawl_checkpoint"
+    site_id = Column(Integer, ForeignKey("site.id"), primary_key=True)
+    listing_offset = Column(Integer, nullable=False)
+    updated_at = Column(DateTime(timezone=True))
+
+
+class CrawlFlight(Base):
+    """Flights whose details are pending, done or failed."""
+
+    __tablename__ = "crawl_flight"
+    __table_args__ = (
+        Index("crawl_flight_flid_key", "flid", unique=True),
+        Index("ix_crawl_flight_site_status", "site_id", "status"),
+    )
+    id = Column(Integer, primary_key=True)
+    site_id = Column(Integer, ForeignKey("site.id"), nullable=False)
+    flid = Column(Integer, nullable=False)
+    url = Column(String(200))
+    status = Column(String(10), nullable=False)
+    attempts = Column(Integer, nullable=False, default=0)
+    last_error = Column(String(200))
+    updated_at = Column(DateTime(timezone=True))
+
+
+class CrawlSchedule(Base):
+    """Backlog estimates and crawl budget of the last run, per site."""
+
+    __tablename__ = "crawl_schedule"
+    site_id = Column(Integer, ForeignKey("site.id"), primary_key=True)
+    caught_up_at = Column(DateTime(timezone=True))
+    flights_per_day = Column(Float)
+    backlog = Column(Float)
+    budget = Column(Integer)
+    eta_days = Column(Float)
+    updated_at = Column(DateTime(timezone=True))
+
+
+def unique_key(model: Base) -> tuple:
+    """Column names of the unique index of a model (used to upsert)."""
+    for index in model.__table__.indexes:
+        if index.unique:
+            return tuple(col.name for col in index.columns)
+    raise ValueError(f"{model.__tablename__} has no unique index")
+
+
+def _dedupe(entries, key):
+    """Drop entries with duplicated keys, the last one wins. Entries with a
+    NULL key column are all kept, as they never conflict with each other."""
+    unique, nulls = {}, []
+    for entry in entries:
+        values = tuple(entry[col] for col in key)
+        if any(value is None for value in values):
+            nulls.append(entry)
+        else:
+            unique[values] = entry
+    return list(unique.values()) + nulls
+
+
+def _batches(entries, batch_size):
+    for i in range(0, len(entries), batch_size):
+        yield entries[i : i + batch_size]
+
+
 class Database:
-    def __init__(self):
-        db_url = os.environ.get("DATABASE_URL")
+    def __init__(self, db_url=None):
+        db_url = db_url or os.environ.get("DATABASE_URL")
         db_url = db_url.replace("postgres://", "postgresql://")
         self.engine = create_engine(db_url, echo=False, pool_pre_ping=True)
         Session = sessionmaker(self.engine)
         self.session = Session()
-        Base.metadata.create_all(self.engine)
+        self._ids = {}
+
+    def migrate(self, target=None) -> int:
+        """Apply the pending schema migrations, see ``migrations.py``."""
+        return migrate(self.engine, target)
 
     def add(
         self, model: Base, entry: dict, preprocess_fn=None, preprocess_kwargs=None
@@ -108,6 +264,9 @@ class Database:
         if preprocess_fn is not None:
             preprocess_kwargs = preprocess_kwargs or {}
             entry = preprocess_fn(entry, **preprocess_kwargs)
+        cache_key = (model.__tablename__, entry["name"])
+        if cache_key in self._ids:
+            return self._ids[cache_key]
         obj = self.session.query(model).filter_by(name=entry["name"]).first()
         if obj is None:
             obj = model(**entry)
@@ -115,6 +274,7 @@ class Database:
             self.session.commit()
         else:
             LOGGER.debug(f"{model.__tablename__} {entry['name']} already exists.")
+        self._ids[cache_key] = obj.id
         return obj.id
 
     def add_all(
@@ -129,3 +289,176 @@ class Database:
             entries = [preprocess_fn(entry, **preprocess_kwargs) for entry in entries]
         self.session.add_all([model(**entry) for entry in entries if entry])
         self.session.commit()
+
+    def upsert(
+        self,
+        model: Base,
+        entries: list[dict],
+        update: bool = False,
+        batch_size: int = 500,
+        preprocess_fn=None,
+        preprocess_kwargs=None,
+    ) -> tuple[int, int]:
+        """Bulk insert entries, skipping or updating the existing ones.
+
+        Existing rows are identified by the unique index of the model
+        (e.g. ``flid`` for flights). All batches are written in one
+        transaction with ``INSERT ... ON CONFLICT DO NOTHING/UPDATE``.
+
+        Parameters
+        ----------
+        model: Base
+        entries: list of dict
+        update: bool, optional
+            If True, existing rows are updated with the new values,
+            otherwise they are left untouched.
+        batch_size: int, optional
+            Number of rows per INSERT statement.
+        preprocess_fn: callable, optional
+            Function applied to each entry, entries for which it returns
+            None are dropped.
+        preprocess_kwargs: dict, optional
+
+        Returns
+        -------
+        inserted, updated: int
+            Number of inserted and updated rows.
+        """
+        entries = self._prepare(entries, preprocess_fn, preprocess_kwargs)
+        key = unique_key(model)
+        table = model.__table__
+        insert = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}[
+            self.engine.dialect.name
+        ]
+        key_cols = tuple_(*[table.c[col] for col in key])
+        inserted = updated = 0
+        with self.engine.begin() as con:
+            for batch in _batches(entries, batch_size):
+                batch = _dedupe(batch, key)
+                keys = [tuple(e[c] for c in key) for e in batch]
+                keys = [k for k in keys if None not in k]
+                query = select(*[table.c[col] for col in key]).where(key_cols.in_(keys))
+                n_existing = len(con.execute(query).fetchall())
+                stmt = insert(table).values(batch)
+                if update:
+                    columns = set(batch[0]) - set(key) - {"id"}
+                    stmt = stmt.on_conflict_do_update(
+                        index_elements=key,
+                        set_={col: stmt.excluded[col] for col in columns},
+                    )
+                    updated += n_existing
+                else:
+                    stmt = stmt.on_conflict_do_nothing(index_elements=key)
+                con.execute(stmt)
+                inserted += len(batch) - n_existing
+        LOGGER.info(
+            f"{model.__tablename__}: {inserted} rows inserted, {updated} updated."
+        )
+        return inserted, updated
+
+    def update(self, model: Base, entries: list[dict]) -> int:
+        """Update existing rows, identified by the unique index of the model,
+        with the other values of the entries (all with the same keys).
+
+        Returns
+        -------
+        updated: int
+            Number of updated rows.
+        """
+        if not entries:
+            return 0
+        key = unique_key(model)
+        table = model.__table__
+        stmt = table.update()
+        for col in key:
+            stmt = stmt.where(table.c[col] == bindparam(f"key_{col}"))
+        columns = [col for col in entries[0] if col not in key]
+        stmt = stmt.values({col: bindparam(col) for col in columns})
+        params = [
+            {**{col: e[col] for col in columns}, **{f"key_{c}": e[c] for c in key}}
+            for e in entries
+        ]
+        with self.engine.begin() as con:
+            updated = con.execute(stmt, params).rowcount
+        LOGGER.info(f"{model.__tablename__}: {updated} rows updated.")
+        return updated
+
+    def bulk_load(
+        self,
+        model: Base,
+        entries: list[dict],
+        update: bool = False,
+        preprocess_fn=None,
+        preprocess_kwargs=None,
+    ) -> tuple[int, int]:
+        """Load large amounts of rows (e.g. backfills) with COPY.
+
+        On PostgreSQL the rows are streamed with ``COPY`` into a temporary
+        table and then merged into the target table with a single
+        ``INSERT ... SELECT ... ON CONFLICT``. On other backends this falls back
+        to :meth:`upsert`. Arguments and return values are as in :meth:`upsert`.
+        """
+        if self.engine.dialect.name != "postgresql":
+            return self.upsert(
+                model,
+                entries,
+                update=update,
+                preprocess_fn=preprocess_fn,
+                preprocess_kwargs=preprocess_kwargs,
+            )
+        entries = self._prepare(entries, preprocess_fn, preprocess_kwargs)
+        if not entries:
+            return 0, 0
+        key = unique_key(model)
+        # as in upsert: the last duplicate wins, entries with NULL keys are kept
+        entries = _dedupe(entries, key)
+        table = model.__tablename__
+        columns = [col for col in entries[0] if col != "id"]
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for entry in entries:
+            writer.writerow(
+                [r"\N" if entry[col] is None else entry[col] for col in columns]
+            )
+        buffer.seek(0)
+
+        cols = ", ".join(columns)
+        if update:
+            updates = ", ".join(
+                f"{col} = EXCLUDED.{col}" for col in columns if col not in key
+            )
+            on_conflict = f"DO UPDATE SET {updates}"
+        else:
+            on_conflict = "DO NOTHING"
+        con = self.engine.raw_connection()
+        try:
+            cursor = con.cursor()
+            cursor.execute(
+                f"CREATE TEMP TABLE tmp_{table} (LIKE {table} INCLUDING DEFAULTS) "
+                "ON COMMIT DROP"
+            )
+            cursor.copy_expert(
+                f"COPY tmp_{table} ({cols}) FROM STDIN WITH (FORMAT csv, NULL '\\N')",
+                buffer,
+            )
+            # xmax = 0 identifies newly inserted rows
+            cursor.execute(
+                f"INSERT INTO {table} ({cols}) SELECT {cols} FROM tmp_{table} "
+                f"ON CONFLICT ({', '.join(key)}) {on_conflict} "
+                "RETURNING (xmax = 0)"
+            )
+            flags = [row[0] for row in cursor.fetchall()]
+            con.commit()
+        finally:
+            con.close()
+        inserted = sum(flags)
+        updated = len(flags) - inserted
+        LOGGER.info(f"{table}: {inserted} rows inserted, {updated} updated.")
+        return inserted, updated
+
+    @staticmethod
+    def _prepare(entries, preprocess_fn, preprocess_kwargs):
+        if preprocess_fn is not None:
+            preprocess_kwargs = preprocess_kwargs or {}
+            entries = [preprocess_fn(entry, **preprocess_kwargs) for entry in entries]
+        return [entry for entry in entries if entry]
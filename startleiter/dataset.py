@@ -0,0 +1,428 @@
+"""Training datasets: the sounding archive joined with the flights.
+
+The archive is streamed chunk by chunk as in the hindcast
+(``hindcast.iter_inputs``): the inputs of each chunk, of shape
+(validtime, level, variable) with the same features as ``app.get_inputs``,
+are written to a shard, a float32 ``.npy`` file read back memory-mapped,
+along with the labels of every site on these days. The inputs are shared by
+the sites; the loader appends the model id of the site as the last variable,
+as ``app.model_inputs`` does. A dataset is a directory::
+
+    manifest.json           levels, variables, sites, bins and shards
+    <shard>.inputs.npy      float32 (validtime, level, variable)
+    <shard>.labels.npy      LABEL_DTYPE (validtime, site)
+    <shard>.validtime.npy   datetime64[D] (validtime,)
+
+Labels of a site on a day, from its included flights (see ``features``):
+
+- flyability: ``positive_label`` if anybody flew, the other label otherwise
+  and -1 outside the period covered by the flights of the site,
+- max_alt_class: class of the highest altitude gain above the site, where
+  class i covers [alt_bins[i], alt_bins[i + 1]) and the last one is open,
+- max_dist_class: class of the longest distance, with ``dist_bins``.
+
+Usage: python startleiter/dataset.py --output .cache/dataset [--start 2016-01-01]
+"""
+
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import shutil
+from datetime import date
+from pathlib import Path
+from typing import Optional, Sequence
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import func, select
+
+from startleiter import config as CFG
+from startleiter import features, hindcast
+from startleiter.database import FlightFeature
+
+LOGGER = logging.getLogger(__name__)
+
+LABEL_DTYPE = np.dtype(
+    [
+        ("flyability", "i1"),
+        ("max_alt_class", "i1"),
+        ("max_dist_class", "i1"),
+        ("n_flights", "i4"),
+        ("max_alt_gain_m", "f4"),
+        ("max_distance_km", "f4"),
+    ]
+)
+# label column of each model
+TARGETS = {
+    "flyability": "flyability",
+    "fly_max_alt": "max_alt_class",
+    "fly_max_dist": "max_dist_class",
+}
+
+
+def daily_labels(engine, site_ids: Sequence[int], start=None, end=None):
+    """Number of flights, highest altitude and longest distance of the
+    included flights per site and day, and the first and last day with a
+    flight (included or not) of each site.
+
+    Returns
+    -------
+    daily: pandas.DataFrame
+        Indexed by (site_id, date).
+    coverage: pandas.DataFrame
+        Indexed by site_id, with the columns first and last.
+    """
+    table = FlightFeature.__table__
+    query = (
+        select(
+            table.c.site_id,
+            table.c.date,
+            func.count().label("n_flights"),
+            func.max(table.c.max_altitude_m).label("max_altitude_m"),
+            func.max(table.c.length_km).label("max_distance_km"),
+        )
+        .where(table.c.site_id.in_(site_ids))
+        .where(table.c.included)
+        .group_by(table.c.site_id, table.c.date)
+    )
+    if start is not None:
+        query = query.where(table.c.date >= start)
+    if end is not None:
+        query = query.where(table.c.date <= end)
+    coverage = (
+        select(
+            table.c.site_id,
+            func.min(table.c.date).label("first"),
+            func.max(table.c.date).label("last"),
+        )
+        .where(table.c.site_id.in_(site_ids))
+        .group_by(table.c.site_id)
+    )
+    with engine.connect() as con:
+        daily = pd.read_sql(query, con)
+        coverage = pd.read_sql(coverage, con, index_col="site_id")
+    daily["date"] = pd.to_datetime(daily["date"])
+    coverage = coverage.apply(pd.to_datetime)
+    return daily.set_index(["site_id", "date"]).sort_index(), coverage
+
+
+def to_class(values: np.ndarray, bins: Sequence[float]) -> np.ndarray:
+    """Class of each value, -1 if missing."""
+    classes = np.digitize(values, bins[1:])
+    return np.where(np.isnan(values), -1, classes).astype("i1")
+
+
+def make_labels(
+    days: pd.DatetimeIndex,
+    daily: pd.DataFrame,
+    coverage: pd.DataFrame,
+    sites: Sequence[dict],
+    alt_bins: Sequence[float],
+    dist_bins: Sequence[float],
+    positive_label: int,
+) -> np.ndarray:
+    """Labels of shape (day, site) of ``LABEL_DTYPE``."""
+    labels = np.empty((len(days), len(sites)), dtype=LABEL_DTYPE)
+    for i, site in enumerate(sites):
+        site_id = site["site_id"]
+        if site_id in daily.index.get_level_values("site_id"):
+            stats = daily.loc[site_id].reindex(days)
+        else:
+            stats = pd.DataFrame(index=days, columns=daily.columns, dtype="float64")
+        n_flights = stats["n_flights"].fillna(0).to_numpy("i4")
+        gain = stats["max_altitude_m"].to_numpy("f4") - site["elevation"]
+        distance = stats["max_distance_km"].to_numpy("f4")
+        flyability = np.where(n_flights > 0, positive_label, 1 - positive_label)
+        if site_id in coverage.index:
+            first, last = coverage.loc[site_id, ["first", "last"]]
+            covered = (days >= first) & (days <= last)
+        else:
+            covered = np.zeros(len(days), dtype=bool)
+        labels[:, i]["flyability"] = np.where(covered, flyability, -1)
+        labels[:, i]["max_alt_class"] = to_class(gain, alt_bins)
+        labels[:, i]["max_dist_class"] = to_class(distance, dist_bins)
+        labels[:, i]["n_flights"] = n_flights
+        labels[:, i]["max_alt_gain_m"] = gain
+        labels[:, i]["max_distance_km"] = distance
+    return labels
+
+
+def _save(path: Path, array: np.ndarray) -> None:
+    tmp = path.with_suffix(".tmp")
+    out = np.lib.format.open_memmap(
+        tmp, mode="w+", dtype=array.dtype, shape=array.shape
+    )
+    out[...] = array
+    out.flush()
+    del out
+    os.replace(tmp, path)
+
+
+def build(
+    path,
+    engine,
+    sites: Sequence[dict],
+    source_id: int,
+    station_id: int,
+    *,
+    alt_bins: Sequence[float],
+    dist_bins: Sequence[float],
+    positive_label: int,
+    min_pressure: float,
+    fill_value: float,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    chunk_days: int = 1000,
+    workers: int = 1,
+    directory=None,
+) -> dict:
+    """Write the training dataset of the 00Z soundings between start and end.
+
+    Parameters
+    ----------
+    path: str or pathlib.Path
+        Directory of the dataset, replaced if it exists.
+    engine: sqlalchemy.engine.Engine
+    sites: sequence of dict
+        Sites with their name, ``site_id`` in the database, ``model_id``
+        (``app.SITE_IDS``) and elevation.
+    source_id, station_id: int
+        Ids of the archive files (see ``uwyo.save_sounding_data``).
+    alt_bins, dist_bins, positive_label, min_pressure, fill_value:
+        As ``ALT_BINS``, ``DIST_BINS``, ``POSITIVE_LABEL``,
+        ``PRESSURE_MIN_hPa`` and ``FILL_NA_VALUE`` of ``app``.
+    start, end: datetime.date, optional
+        First and last day (included).
+    chunk_days: int, optional
+        Approximate number of days per shard.
+    workers: int, optional
+        Number of processes loading the inputs.
+    directory: str or pathlib.Path, optional
+        Directory of the archive, by default the configured netcdf repo.
+
+    Returns
+    -------
+    dict
+        The manifest.
+    """
+    path = Path(path)
+    shutil.rmtree(path, ignore_errors=True)
+    path.mkdir(parents=True)
+    site_ids = [site["site_id"] for site in sites]
+    for site_id in site_ids:
+        features.refresh(engine, site_id)
+    daily, coverage = daily_labels(engine, site_ids, start, end)
+
+    files = hindcast.archive_files(source_id, station_id, start, end, directory)
+    chunks = hindcast.chunk_files(files, chunk_days)
+    LOGGER.info(f"Dataset of {len(files)} months in {len(chunks)} shards")
+    manifest = {
+        "sites": [
+            {key: site[key] for key in ("name", "site_id", "model_id", "elevation")}
+            for site in sites
+        ],
+        "alt_bins": list(alt_bins),
+        "dist_bins": list(dist_bins),
+        "positive_label": positive_label,
+        "fill_value": fill_value,
+        "shards": [],
+    }
+    start = pd.Timestamp(start) if start else None
+    end = pd.Timestamp(end) + pd.Timedelta(hours=23) if end else None
+    workers = max(1, min(workers, len(chunks)))
+    for inputs in hindcast.iter_inputs(chunks, start, end, min_pressure, workers):
+        if inputs is None:
+            continue
+        levels = inputs["level"].values.tolist()
+        variables = inputs["variable"].values.tolist()
+        if manifest.setdefault("levels", levels) != levels:
+            raise ValueError("The soundings of the archive have different levels")
+        if manifest.setdefault("variables", variables) != variables:
+            raise ValueError("The inputs of the archive have different variables")
+        days = pd.DatetimeIndex(inputs["validtime"].values).normalize()
+        labels = make_labels(
+            days, daily, coverage, sites, alt_bins, dist_bins, positive_label
+        )
+        name = f"{len(manifest['shards']):05d}"
+        _save(path / f"{name}.inputs.npy", inputs.values.astype("float32"))
+        _save(path / f"{name}.labels.npy", labels)
+        _save(path / f"{name}.validtime.npy", days.values.astype("datetime64[D]"))
+        manifest["shards"].append({"name": name, "size": len(days)})
+        LOGGER.info(f"Shard {name}: {len(days)} days from {days[0]:%Y-%m-%d}")
+    (path / "manifest.json").write_text(json.dumps(manifest, indent=2))
+    return manifest
+
+
+class TrainingDataset:
+    """Memory-mapped training dataset written by ``build``.
+
+    Parameters
+    ----------
+    path: str or pathlib.Path
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.manifest = json.loads((self.path / "manifest.json").read_text())
+        shards = [shard["name"] for shard in self.manifest["shards"]]
+        self.inputs = [
+            np.load(self.path / f"{name}.inputs.npy", mmap_mode="r") for name in shards
+        ]
+        # labels and validtimes are small, keep them in memory
+        self.labels = np.concatenate(
+            [np.load(self.path / f"{name}.labels.npy") for name in shards]
+        )
+        self.validtime = np.concatenate(
+            [np.load(self.path / f"{name}.validtime.npy") for name in shards]
+        )
+        self.offsets = np.cumsum([0] + [len(inputs) for inputs in self.inputs])
+        self.levels = self.manifest["levels"]
+        self.variables = self.manifest["variables"]
+        self.model_ids = np.array([site["model_id"] for site in self.manifest["sites"]])
+
+    def __len__(self) -> int:
+        return int(self.offsets[-1])
+
+    def samples(self, target: str) -> np.ndarray:
+        """Labeled (day, site) pairs of a model, an array of shape (n, 3) of
+        day index, site index and label.
+
+        The max altitude and distance models only learn from days with
+        flights.
+        """
+        label = self.labels[TARGETS[target]]
+        valid = label >= 0
+        if target != "flyability":
+            valid &= self.labels["n_flights"] > 0
+        days, sites = np.nonzero(valid)
+        return np.stack([days, sites, label[days, sites]], axis=1).astype("int64")
+
+    def _normalization(self, moments):
+        """Variable indices, mean and standard deviation of the model inputs."""
+        variables = list(moments["variable"].values)
+        index = [self.variables.index(variable) for variable in variables]
+        mu, sigma = moments["mu"], moments["sigma"]
+        if "level" in mu.dims:
+            mu = mu.sel(level=self.levels).transpose("level", "variable")
+            sigma = sigma.sel(level=self.levels).transpose("level", "variable")
+        return np.array(index), mu.values.astype("f4"), sigma.values.astype("f4")
+
+    def read(self, days: np.ndarray, sites: np.ndarray, moments) -> np.ndarray:
+        """Model inputs of (day, site) pairs, as ``app.model_inputs``: the
+        variables of ``moments`` standardized, missing values filled and the
+        site model id appended."""
+        index, mu, sigma = self._normalization(moments)
+        out = np.empty((len(days), len(self.levels), len(index) + 1), dtype="f4")
+        shard = np.searchsorted(self.offsets, days, side="right") - 1
+        for s in np.unique(shard):
+            select = np.flatnonzero(shard == s)
+            rows = days[select] - self.offsets[s]
+            order = np.argsort(rows)
+            # sorted reads of the memory map, then back in the requested order
+            data = self.inputs[s][rows[order]][..., index]
+            out[select[order], :, :-1] = data
+        out[..., :-1] = (out[..., :-1] - mu) / sigma
+        out[np.isnan(out)] = self.manifest["fill_value"]
+        out[..., -1] = self.model_ids[sites][:, None]
+        return out
+
+    def to_tf(
+        self,
+        target: str,
+        moments,
+        batch_size: int = 128,
+        shuffle: bool = True,
+        seed: Optional[int] = None,
+    ):
+        """``tf.data.Dataset`` of (inputs, labels) batches of a model, read
+        from the memory maps in a background thread and prefetched.
+
+        Parameters
+        ----------
+        target: str
+            Model name, one of ``TARGETS``.
+        moments: xarray.Dataset
+            Mean ``mu`` and standard deviation ``sigma`` of the model inputs
+            by variable (and optionally level), as in ``models/*_moments.nc``.
+        batch_size: int, optional
+        shuffle: bool, optional
+            Shuffle the samples at each epoch.
+        seed: int, optional
+        """
+        import tensorflow as tf
+
+        samples = self.samples(target)
+        n_variables = len(moments["variable"]) + 1
+
+        def fetch(batch):
+            return self.read(batch[:, 0], batch[:, 1], moments), batch[:, 2]
+
+        def load(batch):
+            inputs, labels = tf.numpy_function(fetch, [batch], (tf.float32, tf.int64))
+            inputs.set_shape([None, len(self.levels), n_variables])
+            labels.set_shape([None])
+            return inputs, labels
+
+        ds = tf.data.Dataset.from_tensor_slices(samples)
+        if shuffle:
+            ds = ds.shuffle(len(samples), seed=seed, reshuffle_each_iteration=True)
+        ds = ds.batch(batch_size).map(load, num_parallel_calls=tf.data.AUTOTUNE)
+        return ds.prefetch(tf.data.AUTOTUNE)
+
+
+def main(output, start, end, chunk_days, workers):
+    from startleiter import app
+    from startleiter.database import Database, Source, Station
+    from startleiter.prediction import get_site_ids
+
+    db = Database()
+    archive_source_id = db.add(Source, CFG["sources"]["uwyo"])
+    station = dict(CFG["stations"]["Cameri"], source_id=archive_source_id)
+    station_id = db.add(Station, station)
+    source_id = db.add(Source, CFG["sources"]["xcontest"])
+    site_ids = get_site_ids(db, CFG["sites"].items(), source_id)
+    sites = [
+        {
+            "name": name,
+            "site_id": site_id,
+            "model_id": app.SITE_IDS[name],
+            "elevation": CFG["sites"][name]["elevation"],
+        }
+        for name, site_id in site_ids.items()
+    ]
+    manifest = build(
+        output,
+        db.engine,
+        sites,
+        archive_source_id,
+        station_id,
+        alt_bins=app.ALT_BINS,
+        dist_bins=app.DIST_BINS,
+        positive_label=app.POSITIVE_LABEL,
+        min_pressure=app.PRESSURE_MIN_hPa,
+        fill_value=app.FILL_NA_VALUE,
+        start=start,
+        end=end,
+        chunk_days=chunk_days,
+        workers=workers,
+    )
+    n_days = sum(shard["size"] for shard in manifest["shards"])
+    LOGGER.info(f"Saved {n_days} days of {len(sites)} sites to {output}")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        format="%(levelname)-4s [%(filename)s:%(lineno)d] %(message)s",
+        datefmt="%Y-%m-%d:%H:%M:%S",
+        level=logging.INFO,
+    )
+    parser = argparse.ArgumentParser(description="Build the training dataset.")
+    parser.add_argument("--output", required=True, help="dataset directory")
+    parser.add_argument("--start", type=date.fromisoformat)
+    parser.add_argument("--end", type=date.fromisoformat)
+    parser.add_argument("--chunk-days", type=int, default=1000)
+    parser.add_argument("--workers", type=int, default=multiprocessing.cpu_count())
+    args = parser.parse_args()
+    main(args.output, args.start, args.end, args.chunk_days, args.workers)
@@ -0,0 +1,277 @@
+"""Materialized flight features.
+
+The ``flight_feature`` table holds, for every flight, the columns derived by
+``utils.prepare_flights``: the filters, date, airtime in hours, day of week,
+month, season and the number of flights in the preceding 24 hours. They are
+computed once, vectorized, when a flight is added or any of its source
+columns changes, and only the 24 hour counts of the neighbouring flights are
+updated. The features of deleted flights are dropped.
+
+The table is brought up to date by the writers (the crawl, the climatology
+update and the dataset builder) with :func:`refresh`, readers only read it.
+"""
+
+import logging
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import bindparam, or_, select
+
+from startleiter.database import Flight, FlightFeature
+
+LOGGER = logging.getLogger(__name__)
+
+DAYS = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
+MONTHS = [
+    "Jan",
+    "Feb",
+    "Mar",
+    "Apr",
+    "May",
+    "Jun",
+    "Jul",
+    "Aug",
+    "Sep",
+    "Oct",
+    "Nov",
+    "Dec",
+]
+SEASONS = ["DJF", "MAM", "JJA", "SON"]
+RIGID_WINGS = ["HGFAI-1 HG", "RW5FAI-5 RW"]
+WINDOW = pd.Timedelta(hours=24)
+# columns of the flights the features are derived from
+SOURCE_COLUMNS = (
+    "site_id",
+    "datetime",
+    "length_km",
+    "max_altitude_m",
+    "airtime",
+    "glider_cat",
+)
+FEATURE_COLUMNS = (
+    "datetime",
+    "length_km",
+    "max_altitude_m",
+    "airtime",
+    "glider_cat",
+    "date",
+    "airtime_hours",
+    "occurrences_last_24h",
+    "dayofweek",
+    "month",
+    "season",
+)
+
+
+def derive(df: pd.DataFrame) -> pd.DataFrame:
+    """Derived columns of flights (all but the 24 hour counts)."""
+    altitude = df["max_altitude_m"]
+    included = (
+        (df["length_km"] > 2)
+        & ((altitude < 5000) | altitude.isna())
+        & ((altitude > 1000) | altitude.isna())
+        & ~df["glider_cat"].isin(RIGID_WINGS)
+    )
+    datetime = pd.to_datetime(df["datetime"], utc=True)
+    return df.assign(
+        included=included,
+        datetime=datetime,
+        date=datetime.dt.date,
+        airtime_hours=pd.to_timedelta(df["airtime"]) / pd.Timedelta(hours=1),
+        dayofweek=datetime.dt.dayofweek,
+        month=datetime.dt.month,
+        season=datetime.dt.month % 12 // 3,
+    )
+
+
+def _utc_values(times: pd.Series) -> np.ndarray:
+    return times.dt.tz_convert(None).to_numpy()
+
+
+def count_last_24h(times: np.ndarray) -> np.ndarray:
+    """Number of flights in the 24 hours up to each flight (included), for
+    sorted times."""
+    first = np.searchsorted(times, times - WINDOW.to_timedelta64(), side="right")
+    return np.arange(1, len(times) + 1) - first
+
+
+def _changed_flights(con, site_id) -> pd.DataFrame:
+    """Flights without features, or whose source columns changed since, with
+    the datetime of their previous features (``previous``)."""
+    feature = FlightFeature.__table__
+    flight = Flight.__table__
+    query = (
+        select(
+            flight.c.id,
+            flight.c.site_id,
+            flight.c.datetime,
+            flight.c.length_km,
+            flight.c.max_altitude_m,
+            flight.c.airtime,
+            flight.c.glider_cat,
+            feature.c.datetime.label("previous"),
+        )
+        .select_from(flight.outerjoin(feature, feature.c.id == flight.c.id))
+        .where(flight.c.site_id == site_id)
+        .where(
+            or_(
+                feature.c.id.is_(None),
+                *[
+                    flight.c[col].is_distinct_from(feature.c[col])
+                    for col in SOURCE_COLUMNS
+                ],
+            )
+        )
+    )
+    return pd.read_sql(query, con)
+
+
+def _removed_flights(con, site_id) -> pd.DataFrame:
+    """Features of the site whose flight was deleted or moved to another
+    site."""
+    feature = FlightFeature.__table__
+    flight = Flight.__table__
+    query = (
+        select(feature.c.id, feature.c.datetime)
+        .select_from(feature.outerjoin(flight, feature.c.id == flight.c.id))
+        .where(feature.c.site_id == site_id)
+        .where(or_(flight.c.id.is_(None), flight.c.site_id != site_id))
+    )
+    df = pd.read_sql(query, con)
+    df["datetime"] = pd.to_datetime(df["datetime"], utc=True)
+    return df
+
+
+def _neighbours(con, site_id, start, end, exclude) -> pd.DataFrame:
+    """Included flights with features between start and end."""
+    feature = FlightFeature.__table__
+    query = (
+        select(feature.c.id, feature.c.datetime)
+        .where(feature.c.site_id == site_id)
+        .where(feature.c.included)
+        .where(feature.c.datetime >= start.to_pydatetime())
+        .where(feature.c.datetime <= end.to_pydatetime())
+    )
+    df = pd.read_sql(query, con)
+    df["datetime"] = pd.to_datetime(df["datetime"], utc=True)
+    return df[~df["id"].isin(exclude)]
+
+
+def refresh(engine, site_id: int) -> int:
+    """Compute the features of the new or changed flights of a site, and drop
+    those of the deleted flights.
+
+    Returns
+    -------
+    int
+        Number of flights whose features were (re)computed or dropped.
+    """
+    table = FlightFeature.__table__
+    with engine.begin() as con:
+        changed = _changed_flights(con, site_id)
+        removed = _removed_flights(con, site_id)
+        if changed.empty and removed.empty:
+            return 0
+        changed = derive(changed)
+        stale_ids = changed["id"].tolist() + removed["id"].tolist()
+        # the 24 hour counts change around the new and the previous times
+        times = pd.concat(
+            [
+                changed["datetime"],
+                pd.to_datetime(changed["previous"], utc=True),
+                removed["datetime"],
+            ]
+        ).dropna()
+        neighbours = _neighbours(
+            con, site_id, times.min() - WINDOW, times.max() + WINDOW, stale_ids
+        )
+
+        # recount the included flights around the changed ones
+        included = pd.concat(
+            [changed.loc[changed["included"], ["id", "datetime"]], neighbours]
+        ).sort_values(["datetime", "id"])
+        counts = pd.Series(
+            count_last_24h(_utc_values(included["datetime"])), index=included["id"]
+        )
+        changed["occurrences_last_24h"] = changed["id"].map(counts)
+
+        # neighbours with a changed flight in their preceding 24 hours
+        sorted_times = np.sort(_utc_values(times))
+        neighbour_times = _utc_values(neighbours["datetime"])
+        in_window = np.searchsorted(
+            sorted_times, neighbour_times, side="right"
+        ) - np.searchsorted(
+            sorted_times, neighbour_times - WINDOW.to_timedelta64(), side="right"
+        )
+        affected = neighbours.loc[in_window > 0, "id"]
+
+        con.execute(table.delete().where(table.c.id.in_(stale_ids)))
+        if not changed.empty:
+            rows = changed[["id", *table.columns.keys()[1:]]]
+            rows = rows.astype(object).where(rows.notna(), None).to_dict("records")
+            for row, dt in zip(rows, changed["datetime"].dt.to_pydatetime()):
+                row["datetime"] = dt
+            con.execute(table.insert(), rows)
+        if len(affected):
+            con.execute(
+                table.update()
+                .where(table.c.id == bindparam("key_id"))
+                .values(occurrences_last_24h=bindparam("count")),
+                [{"key_id": i, "count": int(counts[i])} for i in affected],
+            )
+    LOGGER.info(
+        f"Site {site_id}: features of {len(changed)} flights computed, "
+        f"{len(removed)} dropped, {len(affected)} counts updated."
+    )
+    return len(changed) + len(removed)
+
+
+def read_features(engine, target_id, start=None, end=None) -> pd.DataFrame:
+    """Flights of a site as returned by ``utils.prepare_flights``, with
+    categorical day of week, month and season.
+
+    Parameters
+    ----------
+    engine: sqlalchemy.engine.Engine
+    target_id: int
+        Id of the site.
+    start, end: datetime-like, optional
+        Only return flights in [start, end).
+
+    Returns
+    -------
+    pandas.DataFrame
+        Indexed by flight id.
+    """
+    table = FlightFeature.__table__
+    query = (
+        select(table.c.id, *[table.c[col] for col in FEATURE_COLUMNS])
+        .where(table.c.site_id == target_id)
+        .where(table.c.included)
+        .order_by(table.c.id)
+    )
+    if start is not None:
+        query = query.where(table.c.datetime >= pd.to_datetime(start))
+    if end is not None:
+        query = query.where(table.c.datetime < pd.to_datetime(end))
+    with engine.connect() as con:
+        df = pd.read_sql(query, con, index_col="id")
+    return decode(df)
+
+
+def decode(df: pd.DataFrame) -> pd.DataFrame:
+    """Categorical day of week, month and season and compact dtypes of the
+    feature columns as read from the table."""
+    codes = df[["dayofweek", "month", "season"]].astype("int8")
+    df = df.copy()
+    df["dayofweek"] = pd.Categorical.from_codes(codes["dayofweek"], DAYS, ordered=True)
+    df["month"] = pd.Categorical.from_codes(codes["month"] - 1, MONTHS, ordered=True)
+    df["season"] = pd.Categorical.from_codes(codes["season"], SEASONS, ordered=True)
+    return df.astype(
+        {
+            "glider_cat": "category",
+            "length_km": "float32",
+            "max_altitude_m": "float32",
+            "occurrences_last_24h": "float32",
+        }
+    )
@@ -0,0 +1,160 @@
+"""Persistent crawl frontier of the XContest scraper.
+
+For each site, the checkpoint records the next offset of the flight listing
+to query, and the frontier the flights whose details are still pending, were
+retrieved, or failed permanently. Runs can therefore stop at any time and
+resume where they left off, and spend their requests on new or missing data
+only. All writes are idempotent on the XContest flight id (``flid``).
+"""
+
+import logging
+from datetime import datetime, timezone
+
+from sqlalchemy import func, select
+
+from startleiter.database import CrawlCheckpoint, CrawlFlight, Flight
+
+LOGGER = logging.getLogger(__name__)
+
+PENDING = "pending"
+DONE = "done"
+FAILED = "failed"
+MAX_ATTEMPTS = 3
+
+
+def _now():
+    return datetime.now(timezone.utc)
+
+
+class CrawlFrontier:
+    """Crawl state of a site.
+
+    Parameters
+    ----------
+    db: startleiter.database.Database
+    site_id: int
+    """
+
+    def __init__(self, db, site_id):
+        self.db = db
+        self.site_id = site_id
+
+    def offset(self) -> int:
+        """Next listing offset, by default after the last flight number."""
+        checkpoint = self.db.session.get(CrawlCheckpoint, self.site_id)
+        if checkpoint is not None:
+            return checkpoint.listing_offset
+        last_flno = (
+            self.db.session.query(func.max(Flight.flno))
+            .filter_by(site_id=self.site_id)
+            .scalar()
+        )
+        return last_flno or 0
+
+    def advance(self, offset: int) -> None:
+        checkpoint = self.db.session.get(CrawlCheckpoint, self.site_id)
+        if checkpoint is None:
+            checkpoint = CrawlCheckpoint(site_id=self.site_id)
+            self.db.session.add(checkpoint)
+        checkpoint.listing_offset = offset
+        checkpoint.updated_at = _now()
+        self.db.session.commit()
+
+    def add(self, flights: dict) -> int:
+        """Add flights (detail URL by flid) to the pending ones, unless known."""
+        entries = [
+            {
+                "site_id": self.site_id,
+                "flid": flid,
+                "url": url,
+                "status": PENDING,
+                "attempts": 0,
+                "updated_at": _now(),
+            }
+            for flid, url in flights.items()
+        ]
+        if not entries:
+            return 0
+        inserted, _ = self.db.upsert(CrawlFlight, entries)
+        return inserted
+
+    def pending(self, limit=None) -> dict:
+        """Detail URL by flid of the pending flights, oldest first."""
+        query = (
+            select(CrawlFlight.flid, CrawlFlight.url)
+            .where(CrawlFlight.site_id == self.site_id)
+            .where(CrawlFlight.status == PENDING)
+            .order_by(CrawlFlight.flid)
+            .limit(limit)
+        )
+        with self.db.engine.connect() as con:
+            return dict(con.execute(query).fetchall())
+
+    def done(self, flids) -> None:
+        self._set(flids, status=DONE, last_error=None)
+
+    def failed(self, errors: dict) -> None:
+        """Count a failed attempt for each flid, give up after MAX_ATTEMPTS."""
+        rows = self.db.session.query(CrawlFlight).filter(
+            CrawlFlight.flid.in_(list(errors))
+        )
+        for row in rows:
+            row.attempts += 1
+            row.last_error = repr(errors[row.flid])[:200]
+            row.updated_at = _now()
+            if row.attempts >= MAX_ATTEMPTS:
+                row.status = FAILED
+                LOGGER.warning(f"Giving up on the details of flight {row.flid}")
+        self.db.session.commit()
+
+    def not_found(self, flids) -> int:
+        """Give up on flights whose detail URL could not be found (e.g. missing
+        from their listing page), so that they are not searched again."""
+        entries = [
+            {
+                "site_id": self.site_id,
+                "flid": flid,
+                "url": None,
+                "status": FAILED,
+                "attempts": 1,
+                "last_error": "Detail URL not found in the listing",
+                "updated_at": _now(),
+            }
+            for flid in flids
+        ]
+        if not entries:
+            return 0
+        inserted, _ = self.db.upsert(CrawlFlight, entries)
+        return inserted
+
+    def _set(self, flids, **values) -> None:
+        if not flids:
+            return
+        self.db.session.query(CrawlFlight).filter(
+            CrawlFlight.flid.in_(list(flids))
+        ).update(dict(values, updated_at=_now()), synchronize_session=False)
+        self.db.session.commit()
+
+    def missing_details(self) -> list:
+        """Flight number and id of the flights without details that are not in
+        the frontier (e.g. scraped before it existed), by flight number."""
+        known = select(CrawlFlight.flid).where(CrawlFlight.site_id == self.site_id)
+        query = (
+            select(Flight.flno, Flight.flid)
+            .where(Flight.site_id == self.site_id)
+            .where(Flight.airtime.is_(None))
+            .where(Flight.flno.isnot(None))
+            .where(Flight.flid.not_in(known))
+            .order_by(Flight.flno)
+        )
+        with self.db.engine.connect() as con:
+            return [tuple(row) for row in con.execute(query)]
+
+    def stats(self) -> dict:
+        query = (
+            select(CrawlFlight.status, func.count())
+            .where(CrawlFlight.site_id == self.site_id)
+            .group_by(CrawlFlight.status)
+        )
+        with self.db.engine.connect() as con:
+            return dict(con.execute(query).fetchall())
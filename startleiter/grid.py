@@ -0,0 +1,191 @@
+"""Launch points of the grid predictions and their GeoJSON encoding.
+
+The points are either listed explicitly (``"lat,lon;lat,lon;..."``) or laid
+on a regular latitude/longitude grid covering a bounding box. Each point is
+assigned to the nearest trained site, whose ID is the site embedding of the
+models.
+"""
+
+from datetime import datetime
+from typing import Optional
+
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0
+
+
+def bbox_points(lon_min, lat_min, lon_max, lat_max, step):
+    """Points of a regular grid with spacing ``step`` (degrees) covering a
+    bounding box, bounds included.
+
+    Returns
+    -------
+    lat, lon: numpy.ndarray
+    """
+    if lon_min > lon_max or lat_min > lat_max:
+        raise ValueError(
+            "Invalid bounding box, expected lon_min,lat_min,lon_max,lat_max"
+        )
+    if step <= 0:
+        raise ValueError("Argument 'step' must be positive!")
+    # tolerate rounding errors at the upper bounds
+    lats = np.arange(lat_min, lat_max + step / 1e6, step)
+    lons = np.arange(lon_min, lon_max + step / 1e6, step)
+    lat, lon = np.meshgrid(lats, lons, indexing="ij")
+    return lat.ravel(), lon.ravel()
+
+
+def parse_bbox(bbox: str) -> tuple:
+    """Parse ``"lon_min,lat_min,lon_max,lat_max"``."""
+    try:
+        lon_min, lat_min, lon_max, lat_max = map(float, bbox.split(","))
+    except ValueError:
+        raise ValueError(f"Invalid bounding box {bbox!r}") from None
+    return lon_min, lat_min, lon_max, lat_max
+
+
+def parse_points(points: str):
+    """Parse ``"lat,lon;lat,lon;..."``.
+
+    Returns
+    -------
+    lat, lon: numpy.ndarray
+    """
+    try:
+        coords = np.array(
+            [[float(x) for x in point.split(",")] for point in points.split(";")]
+        )
+    except ValueError:
+        raise ValueError(f"Invalid points {points!r}") from None
+    if coords.ndim != 2 or coords.shape[1] != 2:
+        raise ValueError(f"Invalid points {points!r}, expected 'lat,lon;lat,lon'")
+    if (np.abs(coords[:, 0]) > 90).any() or (np.abs(coords[:, 1]) > 180).any():
+        raise ValueError("Latitudes and longitudes out of range")
+    return coords[:, 0], coords[:, 1]
+
+
+def request_points(bbox, step, points, max_points: int):
+    """Points of a request, given either as ``points`` (see
+    :func:`parse_points`) or as a ``bbox`` with a grid ``step`` (see
+    :func:`bbox_points`).
+
+    Returns
+    -------
+    lat, lon: numpy.ndarray
+    """
+    if (bbox is None) == (points is None):
+        raise ValueError("Expected exactly one of the arguments 'bbox' or 'points'")
+    if points is not None:
+        lat, lon = parse_points(points)
+    else:
+        lat, lon = bbox_points(*parse_bbox(bbox), step)
+    if lat.size > max_points:
+        raise ValueError(f"Too many points ({lat.size}), at most {max_points} allowed")
+    return lat, lon
+
+
+def check_cycle(time: datetime, now: Optional[datetime] = None):
+    """Reject forecast cycles other than the current one: the soundings of the
+    points are those of the latest DWD-ICON run, archived runs are not
+    available."""
+    now = now or datetime.utcnow()
+    if time.date() != now.date():
+        raise ValueError(
+            f"Grid predictions are only available for the current forecast cycle "
+            f"({now:%Y-%m-%d}), not {time:%Y-%m-%d}"
+        )
+
+
+def haversine(lat1, lon1, lat2, lon2):
+    """Great-circle distance in km, broadcasting the arguments."""
+    lat1, lon1, lat2, lon2 = map(np.radians, (lat1, lon1, lat2, lon2))
+    a = (
+        np.sin((lat2 - lat1) / 2) ** 2
+        + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(a))
+
+
+def nearest_sites(lat, lon, sites: dict):
+    """Nearest of ``sites`` (name -> dict with latitude and longitude) to each
+    point.
+
+    Returns
+    -------
+    names: numpy.ndarray
+    distance_km: numpy.ndarray
+    """
+    names = np.array(list(sites))
+    site_lat = np.array([site["latitude"] for site in sites.values()])
+    site_lon = np.array([site["longitude"] for site in sites.values()])
+    distance = haversine(
+        np.asarray(lat)[:, None], np.asarray(lon)[:, None], site_lat, site_lon
+    )
+    nearest = distance.argmin(axis=1)
+    return names[nearest], distance[np.arange(len(nearest)), nearest]
+
+
+def predict_points(
+    run, inputs, lat, lon, elevation, sites: dict, site_ids: dict, chunk_size: int
+) -> dict:
+    """Predict flyability, max altitude and max distance at many points, each
+    one embedded as the nearest of ``sites``, ``chunk_size`` points at a time.
+
+    Parameters
+    ----------
+    run: callable
+        Models run on ``(inputs, site_ids)`` of a chunk of points, returning
+        the flying probability, the max altitude gain in m and the max
+        distance in km of each point.
+    inputs: xarray.DataArray
+        Inputs with dimensions (point, level, variable).
+    lat, lon: numpy.ndarray
+    elevation: numpy.ndarray
+        Elevation of each point in m.
+    sites: dict
+        Trained sites, name -> dict with latitude and longitude.
+    site_ids: dict
+        Site embedding of each trained site.
+    chunk_size: int
+
+    Returns
+    -------
+    dict
+        One array per property, with one value per point.
+    """
+    names, distance_km = nearest_sites(lat, lon, sites)
+    ids = np.array([site_ids[name] for name in names])
+    results = [
+        run(
+            inputs.isel(point=slice(start, start + chunk_size)),
+            ids[start : start + chunk_size],
+        )
+        for start in range(0, inputs.sizes["point"], chunk_size)
+    ]
+    fly_prob, max_alt_gain, max_dist = (np.concatenate(r) for r in zip(*results))
+    max_alt = (max_alt_gain + elevation) // 100 * 100
+    return {
+        "latitude": np.asarray(lat),
+        "longitude": np.asarray(lon),
+        "elevation": elevation,
+        "site": names,
+        "site_distance_km": distance_km.round(1),
+        "flying_probability": fly_prob.round(2),
+        "max_altitude_masl": max_alt.astype(int),
+        "max_distance_km": max_dist,
+    }
+
+
+def to_geojson(lat, lon, properties: dict) -> dict:
+    """FeatureCollection of points, ``properties`` maps names to arrays of
+    one value per point."""
+    columns = {name: np.asarray(values).tolist() for name, values in properties.items()}
+    features = [
+        {
+            "type": "Feature",
+            "geometry": {"type": "Point", "coordinates": [float(x), float(y)]},
+            "properties": {name: values[i] for name, values in columns.items()},
+        }
+        for i, (x, y) in enumerate(zip(lon, lat))
+    ]
+    return {"type": "FeatureCollection", "features": features}
@@ -0,0 +1,88 @@
+"""Hedged requests: race a slow primary source against a backup.
+
+The primary call starts first. If it has not succeeded after ``hedge_after``
+seconds, the backup call starts in parallel, and the primary result is still
+preferred if it arrives within ``budget`` seconds. The primary call runs with
+the HTTP requests bounded by the budget (see
+:func:`startleiter.resilience.time_limit`), and is cancelled if it has not
+started yet, so that abandoned calls do not hold on to the worker pool.
+"""
+
+import logging
+import time
+from concurrent.futures import Executor, wait
+
+from startleiter import metrics, resilience
+
+LOGGER = logging.getLogger(__name__)
+
+
+def _bounded(func, deadline):
+    """Call ``func`` with its HTTP requests bounded by the ``deadline``
+    (monotonic time)."""
+    budget = deadline - time.monotonic()
+    if budget <= 0:
+        raise TimeoutError("Hedging budget exhausted before the call started")
+    with resilience.time_limit(budget):
+        return func()
+
+
+def hedge(
+    name: str,
+    primary,
+    backup,
+    executor: Executor,
+    hedge_after: float,
+    budget: float,
+    errors: tuple = (Exception,),
+) -> tuple:
+    """Result of ``primary()``, or of ``backup()`` if the primary call fails
+    or is too slow.
+
+    Parameters
+    ----------
+    name: str
+        Name used for the ``<name>.hedged`` counter.
+    primary, backup: callable
+        Calls without arguments.
+    executor: concurrent.futures.Executor
+    hedge_after: float
+        Seconds before the backup call starts.
+    budget: float
+        Seconds to wait for the primary result.
+    errors: tuple
+        Failures of the primary call that fall back on the backup. Any other
+        exception is raised.
+
+    Returns
+    -------
+    result: object
+    source: str
+        "primary" or "backup".
+    """
+    t0 = time.monotonic()
+    first = executor.submit(_bounded, primary, t0 + budget)
+    wait([first], timeout=hedge_after)
+    if first.done():
+        error = first.exception()
+        if error is None:
+            return first.result(), "primary"
+        if not isinstance(error, errors):
+            raise error
+
+    metrics.increment(f"{name}.hedged")
+    second = executor.submit(backup)
+    wait([first], timeout=max(0, budget - (time.monotonic() - t0)))
+    if first.done():
+        error = first.exception()
+        if error is None:
+            second.cancel()
+            return first.result(), "primary"
+        if not isinstance(error, errors):
+            second.cancel()
+            raise error
+        LOGGER.error(f"{name}: primary source failed: {error!r}")
+    else:
+        first.cancel()
+        LOGGER.warning(f"{name}: primary source too slow, using the backup")
+    return second.result(), "backup"
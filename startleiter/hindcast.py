@@ -0,0 +1,294 @@
+"""Hindcast: re-run the models over the archive of observed soundings.
+
+The monthly sounding files written by ``uwyo.py`` are read in chunks of about
+``chunk_days`` days. For each chunk, the model inputs are built in a worker
+process (same features as ``app.get_inputs``, with the pressure differences
+taken from the open-meteo archive) and then go through the models in a single
+batch. Only the current chunks are kept in memory.
+
+The predictions are written to the ``hindcast`` table, apart from the
+operational ones and per version of the models (``app.MODEL_HASH``), or to a
+netcdf file.
+
+Usage: python startleiter/hindcast.py --start 2021-06-01 --output hindcast.nc
+"""
+
+import argparse
+import logging
+import multiprocessing
+import re
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Iterator, Optional
+
+import numpy as np
+import pandas as pd
+import xarray as xr
+
+from startleiter import config as CFG
+from startleiter import openmeteo
+from startleiter.utils import to_wind_components
+
+LOGGER = logging.getLogger(__name__)
+
+HOURS = pd.timedelta_range("1H", "24H", freq="1H")
+
+
+def archive_files(
+    source_id: int,
+    station_id: int,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    directory=None,
+) -> list[Path]:
+    """Monthly sounding files overlapping [start, end], sorted by month."""
+    directory = Path(directory or CFG["netcdf"]["repo"])
+    files = []
+    for path in directory.glob(f"sounding-{source_id}-{station_id}-*.nc"):
+        month = datetime.strptime(re.search(r"\d{6}", path.name).group(), "%Y%m")
+        month = month.date()
+        if start is not None and month < start.replace(day=1):
+            continue
+        if end is not None and month > end:
+            continue
+        files.append((month, path))
+    return [path for _, path in sorted(files)]
+
+
+def chunk_files(files: list[Path], chunk_days: int) -> list[list[Path]]:
+    """Group consecutive monthly files into chunks of about ``chunk_days``."""
+    months_per_chunk = max(1, chunk_days // 31)
+    return [
+        files[i : i + months_per_chunk] for i in range(0, len(files), months_per_chunk)
+    ]
+
+
+def read_soundings(files, start=None, end=None) -> xr.Dataset:
+    """00Z soundings of the given files within [start, end]."""
+    datasets = []
+    for path in files:
+        with xr.open_dataset(path) as ds:
+            datasets.append(ds.load())
+    ds = xr.concat(datasets, "validtime") if len(datasets) > 1 else datasets[0]
+    ds = ds.sortby("validtime")
+    ds = ds.sel(validtime=ds.validtime.dt.hour == 0)
+    ds = ds.sel(validtime=slice(start, end))
+    return ds.transpose("validtime", "PRES")
+
+
+def extract_features(ds: xr.Dataset, min_pressure: float) -> xr.Dataset:
+    """Same as ``app.extract_features``, vectorized over validtime."""
+    ds = to_wind_components(ds)
+    # dew point temperature depression
+    ds["DWPD"] = ds["TEMP"] - ds["DWPT"]
+    ds["WOY"] = ds.validtime.dt.isocalendar().week
+    (ds,) = xr.broadcast(ds)
+    ds = ds[["TEMP", "DWPD", "U", "V", "WOY"]].rename({"PRES": "level"})
+    return ds.sel(level=slice(1000, min_pressure))
+
+
+def get_surface(validtimes: pd.DatetimeIndex) -> xr.Dataset:
+    """Pressure differences of the 24 hours following each validtime."""
+    start = validtimes.min().date()
+    end = validtimes.max().date() + timedelta(days=1)
+    qff = {
+        name: openmeteo.scrape_archive(name, "pressure_msl", start, end)
+        for name in ("Kloten", "Lugano", "Geneva")
+    }
+    qff_diff = pd.DataFrame(
+        {
+            "KLO-GVE": qff["Kloten"].pressure_msl - qff["Geneva"].pressure_msl,
+            "KLO-LUG": qff["Kloten"].pressure_msl - qff["Lugano"].pressure_msl,
+        }
+    )
+    times = (validtimes.values[:, None] + HOURS.values[None, :]).ravel()
+    qff_diff = qff_diff.reindex(times)
+    return xr.Dataset(
+        {
+            name: (("validtime", "date"), qff_diff[name].values.reshape(-1, 24))
+            for name in qff_diff
+        },
+        coords={"validtime": validtimes},
+    )
+
+
+def load_inputs(files, start, end, min_pressure) -> Optional[xr.DataArray]:
+    """Model inputs of shape (validtime, level, variable), as in ``app.get_inputs``.
+
+    Runs in the worker processes.
+    """
+    ds = read_soundings(files, start, end)
+    if ds.sizes["validtime"] == 0:
+        return None
+    features = extract_features(ds, min_pressure)
+    surface = get_surface(pd.DatetimeIndex(ds.validtime.values))
+    surface = surface.pad(
+        date=(0, features.sizes["level"] - surface.sizes["date"]),
+        constant_values=np.nan,
+    )
+    surface = surface.rename({"date": "level"}).drop_vars("level", errors="ignore")
+    features = features.merge(surface)
+    inputs = features.to_array().transpose("validtime", "level", "variable")
+    LOGGER.info(f"Loaded {inputs.sizes['validtime']} soundings of {files[0].name}+")
+    return inputs.astype("float32")
+
+
+def iter_inputs(chunks, start, end, min_pressure, workers) -> Iterator[xr.DataArray]:
+    """Load the inputs of each chunk, in order, with at most ``2 * workers``
+    chunks loaded ahead."""
+    if workers <= 1:
+        for files in chunks:
+            yield load_inputs(files, start, end, min_pressure)
+        return
+    # spawn the workers, as forking a process with a tensorflow session is unsafe
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+        pending = deque()
+        for files in chunks:
+            pending.append(
+                executor.submit(load_inputs, files, start, end, min_pressure)
+            )
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def hindcast(
+    sites,
+    source_id: int,
+    station_id: int,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    chunk_days: int = 1000,
+    workers: int = 1,
+    directory=None,
+) -> Iterator[xr.Dataset]:
+    """Predict all 00Z soundings of the archive between ``start`` and ``end``.
+
+    Parameters
+    ----------
+    sites: list of str
+        Site names.
+    source_id, station_id: int
+        Ids of the archive files (see ``uwyo.save_sounding_data``).
+    start, end: datetime.date, optional
+        First and last day (included).
+    chunk_days: int, optional
+        Approximate number of days per chunk.
+    workers: int, optional
+        Number of processes loading the inputs.
+    directory: str or pathlib.Path, optional
+        Directory of the archive, by default the configured netcdf repo.
+
+    Yields
+    ------
+    xarray.Dataset
+        Predictions of a chunk, with dimensions (site, validtime).
+    """
+    # imported here since it loads the models
+    from startleiter import app
+
+    files = archive_files(source_id, station_id, start, end, directory)
+    chunks = chunk_files(files, chunk_days)
+    LOGGER.info(f"Hindcast of {len(files)} months in {len(chunks)} chunks")
+    workers = min(workers, len(chunks))
+    start = pd.Timestamp(start) if start else None
+    end = pd.Timestamp(end) + pd.Timedelta(hours=23) if end else None
+    for inputs in iter_inputs(chunks, start, end, app.PRESSURE_MIN_hPa, workers):
+        if inputs is None:
+            continue
+        fly_prob, max_alt, max_dist = app.predict_inputs(inputs, sites)
+        dims = ("site", "validtime")
+        yield xr.Dataset(
+            {
+                "flying_probability": (dims, fly_prob.astype("float32")),
+                "max_altitude_masl": (dims, max_alt.astype("float32")),
+                "max_distance_km": (dims, max_dist.astype("float32")),
+            },
+            coords={"site": list(sites), "validtime": inputs.validtime.values},
+            attrs={"model_hash": app.MODEL_HASH},
+        )
+
+
+def to_rows(ds: xr.Dataset, site_ids: dict) -> list[dict]:
+    """Rows of the hindcast table, identified by the model hash of ``ds``."""
+    df = ds.to_dataframe().reset_index()
+    df["validtime"] = df["validtime"].dt.date
+    df["model_hash"] = ds.attrs["model_hash"]
+    df["site_id"] = df.pop("site").map(site_ids)
+    return df.to_dict("records")
+
+
+def main(sites, start, end, output=None, overwrite=False, chunk_days=1000, workers=1):
+    from startleiter.database import Database, Hindcast, Source, Station
+    from startleiter.prediction import get_site_ids
+
+    db = Database()
+    archive_source_id = db.add(Source, CFG["sources"]["uwyo"])
+    station = dict(CFG["stations"]["Cameri"], source_id=archive_source_id)
+    station_id = db.add(Station, station)
+    source_id = db.add(Source, CFG["sources"]["startleiter"])
+    site_ids = get_site_ids(db, sites, source_id)
+
+    results = []
+    n = 0
+    for ds in hindcast(
+        list(site_ids),
+        archive_source_id,
+        station_id,
+        start,
+        end,
+        chunk_days=chunk_days,
+        workers=workers,
+    ):
+        if output is None:
+            inserted, updated = db.upsert(
+                Hindcast, to_rows(ds, site_ids), update=overwrite
+            )
+            n += inserted + updated
+        else:
+            results.append(ds)
+            n += ds.flying_probability.size
+    if output is not None and results:
+        xr.concat(results, "validtime").to_netcdf(output)
+        LOGGER.info(f"Saved: {output}")
+    LOGGER.info(f"Successfully hindcasted {n} predictions.")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        format="%(levelname)-4s [%(filename)s:%(lineno)d] %(message)s",
+        datefmt="%Y-%m-%d:%H:%M:%S",
+        level=logging.INFO,
+    )
+    parser = argparse.ArgumentParser(description="Hindcast the sounding archive.")
+    parser.add_argument("--start", type=date.fromisoformat)
+    parser.add_argument("--end", type=date.fromisoformat)
+    parser.add_argument(
+        "--output",
+        help="netcdf file to write the predictions to, instead of the hindcast "
+        "table of the database",
+    )
+    parser.add_argument(
+        "--overwrite",
+        action="store_true",
+        help="replace the rows of the hindcast table already computed with the "
+        "same models (same model hash), instead of keeping them; the "
+        "operational predictions are never touched",
+    )
+    parser.add_argument("--chunk-days", type=int, default=1000)
+    parser.add_argument("--workers", type=int, default=multiprocessing.cpu_count())
+    args = parser.parse_args()
+    sites = list(CFG["sites"].items())
+    main(
+        sites,
+        args.start,
+        args.end,
+        output=args.output,
+        overwrite=args.overwrite,
+        chunk_days=args.chunk_days,
+        workers=args.workers,
+    )
@@ -0,0 +1,338 @@
+"""Shared HTTP client for all scrapers.
+
+All plain HTTP traffic (UWYO, open-meteo, the startleiter web app) goes through
+:func:`get`, which reuses a pooled :class:`requests.Session` and a disk-backed
+response cache. Cached entries honor ``Cache-Control``, and stale entries are
+revalidated with conditional requests (``ETag`` / ``Last-Modified``).
+Requests are guarded by the circuit breaker of their upstream, and a stale
+cached response is served when the upstream cannot be reached.
+
+The environment variable ``STARTLEITER_HTTP_MODE`` selects the operation mode:
+
+- unset or "live": normal operation (network + cache);
+- "record": like live, but every response is also saved as a fixture;
+- "replay": responses are served from the fixtures only, no network access.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import re
+import tempfile
+import time
+from email.utils import parsedate_to_datetime
+from pathlib import Path
+from typing import Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+
+from startleiter import config as CFG
+from startleiter import resilience
+
+LOGGER = logging.getLogger(__name__)
+
+HTTP_CFG = CFG.get("http", {})
+DEFAULT_TIMEOUT = HTTP_CFG.get("timeout", 30)
+MODES = ("live", "record", "replay")
+
+_SESSION = None
+_CACHE = None
+
+
+def new_session() -> requests.Session:
+    """Return a new session with a connection pool of the configured size."""
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=HTTP_CFG.get("pool_connections", 10),
+        pool_maxsize=HTTP_CFG.get("pool_maxsize", 10),
+    )
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def get_session() -> requests.Session:
+    """Return the process-wide pooled session."""
+    global _SESSION
+    if _SESSION is None:
+        _SESSION = new_session()
+    return _SESSION
+
+
+def get_mode() -> str:
+    mode = os.environ.get("STARTLEITER_HTTP_MODE", "live").lower() or "live"
+    if mode not in MODES:
+        raise ValueError(f"Unknown STARTLEITER_HTTP_MODE '{mode}', use one of {MODES}")
+    return mode
+
+
+def request_key(url: str, params: Optional[dict] = None) -> str:
+    """Stable key of a GET request."""
+    if params:
+        url = url + "?" + "&".join(f"{k}={v}" for k, v in sorted(params.items()))
+    return hashlib.sha256(url.encode()).hexdigest()
+
+
+def _atomic_write(path: Path, data: bytes) -> None:
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+def freshness_lifetime(headers) -> Optional[float]:
+    """Freshness lifetime in seconds from the response headers.
+
+    Returns None when the response must not be stored at all (``no-store``)
+    and 0 when it must be revalidated before every use.
+    """
+    cache_control = headers.get("Cache-Control", "").lower()
+    directives = [d.strip() for d in cache_control.split(",") if d.strip()]
+    if "no-store" in directives:
+        return None
+    if "no-cache" in directives:
+        return 0
+    for directive in directives:
+        match = re.fullmatch(r"(?:s-)?max-age=(\d+)", directive)
+        if match:
+            return float(match.group(1))
+    if "Expires" in headers:
+        try:
+            expires = parsedate_to_datetime(headers["Expires"]).timestamp()
+        except (TypeError, ValueError):
+            return 0
+        return max(0.0, expires - time.time())
+    return 0
+
+
+class ResponseCache:
+    """Size-bounded, content-addressed, on-disk LRU cache of HTTP responses.
+
+    Bodies are stored once under their SHA-256 digest in ``blobs/`` and
+    referenced by small JSON metadata files in ``meta/`` (one per request key).
+    All writes are atomic, so that several processes can share the directory.
+
+    Parameters
+    ----------
+    cache_dir: str or pathlib.Path
+    max_bytes: int
+        Maximum total size of the stored bodies.
+    """
+
+    def __init__(self, cache_dir, max_bytes):
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+        self.meta_dir = self.cache_dir / "meta"
+        self.blob_dir = self.cache_dir / "blobs"
+        self.meta_dir.mkdir(parents=True, exist_ok=True)
+        self.blob_dir.mkdir(parents=True, exist_ok=True)
+
+    def get(self, key: str) -> Optional[tuple[dict, bytes]]:
+        meta_path = self.meta_dir / f"{key}.json"
+        try:
+            meta = json.loads(meta_path.read_text())
+            body = (self.blob_dir / meta["digest"]).read_bytes()
+        except (FileNotFoundError, ValueError, KeyError):
+            return None
+        os.utime(meta_path)  # LRU bookkeeping
+        return meta, body
+
+    def put(self, key: str, meta: dict, body: bytes) -> None:
+        digest = hashlib.sha256(body).hexdigest()
+        blob_path = self.blob_dir / digest
+        if not blob_path.exists():
+            _atomic_write(blob_path, body)
+        meta = dict(meta, digest=digest, size=len(body))
+        _atomic_write(self.meta_dir / f"{key}.json", json.dumps(meta).encode())
+        self.evict()
+
+    def touch(self, key: str, meta: dict) -> None:
+        """Update the metadata of an entry without rewriting its body."""
+        _atomic_write(self.meta_dir / f"{key}.json", json.dumps(meta).encode())
+
+    def evict(self) -> None:
+        """Drop least recently used entries until the size bound is met."""
+        entries = []
+        for meta_path in self.meta_dir.glob("*.json"):
+            try:
+                meta = json.loads(meta_path.read_text())
+                entries.append((meta_path.stat().st_mtime, meta_path, meta))
+            except (FileNotFoundError, ValueError):
+                continue
+        refs, sizes = {}, {}
+        for _, _, meta in entries:
+            refs[meta["digest"]] = refs.get(meta["digest"], 0) + 1
+            sizes[meta["digest"]] = meta["size"]
+        total = sum(sizes.values())
+        for _, meta_path, meta in sorted(entries, key=lambda e: e[0]):
+            if total <= self.max_bytes:
+                break
+            meta_path.unlink(missing_ok=True)
+            refs[meta["digest"]] -= 1
+            if refs[meta["digest"]] == 0:
+                (self.blob_dir / meta["digest"]).unlink(missing_ok=True)
+                total -= meta["size"]
+                LOGGER.debug(f"Evicted {meta['url']} from the HTTP cache")
+
+
+def get_cache() -> ResponseCache:
+    global _CACHE
+    if _CACHE is None:
+        cache_dir = os.environ.get(
+            "STARTLEITER_HTTP_CACHE", HTTP_CFG.get("cache_dir", ".cache/http")
+        )
+        _CACHE = ResponseCache(cache_dir, HTTP_CFG.get("cache_max_mb", 256) * 2**20)
+    return _CACHE
+
+
+def fixtures_dir() -> Path:
+    return Path(
+        os.environ.get(
+            "STARTLEITER_HTTP_FIXTURES",
+            HTTP_CFG.get("fixtures_dir", "tests/fixtures/http"),
+        )
+    )
+
+
+def _build_response(url, status_code, headers, body) -> requests.Response:
+    resp = requests.Response()
+    resp.url = url
+    resp.status_code = status_code
+    resp.headers = CaseInsensitiveDict(headers)
+    resp._content = body
+    resp.encoding = requests.utils.get_encoding_from_headers(resp.headers)
+    return resp
+
+
+def _save_fixture(key, url, resp):
+    path = fixtures_dir()
+    path.mkdir(parents=True, exist_ok=True)
+    meta = {"url": url, "status_code": resp.status_code, "headers": dict(resp.headers)}
+    _atomic_write(path / f"{key}.json", json.dumps(meta, indent=1).encode())
+    _atomic_write(path / f"{key}.body", resp.content)
+    LOGGER.debug(f"Recorded fixture {key} for {url}")
+
+
+def _load_fixture(key, url):
+    path = fixtures_dir()
+    try:
+        meta = json.loads((path / f"{key}.json").read_text())
+        body = (path / f"{key}.body").read_bytes()
+    except FileNotFoundError:
+        raise FileNotFoundError(f"No recorded fixture for {url} in {path}") from None
+    return _build_response(url, meta["status_code"], meta["headers"], body)
+
+
+def _send(url, params, headers, timeout, session=None) -> requests.Response:
+    """Send the request through the circuit breaker of its upstream."""
+    breaker = resilience.breaker_for_url(url)
+    breaker.check()
+    session = session or get_session()
+    try:
+        resp = session.get(url, params=params, headers=headers, timeout=timeout)
+    except requests.RequestException:
+        breaker.record_failure()
+        raise
+    if resp.status_code >= 500:
+        breaker.record_failure()
+    else:
+        breaker.record_success()
+    return resp
+
+
+def get(
+    url: str,
+    params: Optional[dict] = None,
+    timeout=None,
+    use_cache=True,
+    max_age: Optional[float] = None,
+    session: Optional[requests.Session] = None,
+):
+    """Cached GET request.
+
+    Parameters
+    ----------
+    url: str
+    params: dict, optional
+        Query parameters.
+    timeout: float, optional
+        Connect and read timeout in seconds, at most the time left before the
+        deadline of the enclosing :func:`startleiter.resilience.retry`.
+    use_cache: bool, optional
+        If False, bypass the response cache (but not the record/replay mode).
+    max_age: float, optional
+        Minimum freshness lifetime in seconds, for upstreams that do not send
+        any caching headers. Ignored if the response forbids storing it.
+    session: requests.Session, optional
+        Session to send the request with (e.g. with authentication cookies),
+        instead of the process-wide one.
+
+    Returns
+    -------
+    requests.Response
+    """
+    mode = get_mode()
+    key = request_key(url, params)
+    if mode == "replay":
+        return _load_fixture(key, url)
+
+    timeout = timeout or DEFAULT_TIMEOUT
+    cache = get_cache() if use_cache else None
+    cached = cache.get(key) if cache is not None else None
+    headers = {}
+    if cached is not None:
+        meta, body = cached
+        if time.time() < meta["expires"]:
+            LOGGER.debug(f"HTTP cache hit: {url}")
+            resp = _build_response(url, meta["status_code"], meta["headers"], body)
+            if mode == "record":
+                _save_fixture(key, url, resp)
+            return resp
+        if meta["headers"].get("ETag"):
+            headers["If-None-Match"] = meta["headers"]["ETag"]
+        if meta["headers"].get("Last-Modified"):
+            headers["If-Modified-Since"] = meta["headers"]["Last-Modified"]
+
+    try:
+        budget = resilience.remaining_time()
+        if budget is not None:
+            if budget <= 0:
+                raise requests.Timeout(f"Deadline exceeded before requesting {url}")
+            timeout = min(timeout, budget)
+        resp = _send(url, params, headers, timeout, session)
+    except (requests.RequestException, resilience.CircuitOpenError) as err:
+        if cached is None:
+            raise
+        LOGGER.warning(f"Serving stale cached response for {url}: {err!r}")
+        return _build_response(url, meta["status_code"], meta["headers"], body)
+
+    if cached is not None and resp.status_code == 304:
+        LOGGER.debug(f"HTTP cache revalidated: {url}")
+        meta["expires"] = time.time() + (freshness_lifetime(resp.headers) or 0)
+        cache.touch(key, meta)
+        resp = _build_response(url, meta["status_code"], meta["headers"], body)
+    elif cache is not None and resp.status_code == 200:
+        lifetime = freshness_lifetime(resp.headers)
+        if lifetime is not None and max_age is not None:
+            lifetime = max(lifetime, max_age)
+        validator = "ETag" in resp.headers or "Last-Modified" in resp.headers
+        if lifetime is not None and (lifetime > 0 or validator):
+            meta = {
+                "url": resp.url,
+                "status_code": resp.status_code,
+                "headers": dict(resp.headers),
+                "expires": time.time() + lifetime,
+            }
+            cache.put(key, meta, resp.content)
+
+    if mode == "record":
+        _save_fixture(key, url, resp)
+    return resp
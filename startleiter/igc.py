@@ -0,0 +1,259 @@
+"""Tracklogs: IGC parsing, compact storage and derived metrics.
+
+The B records (fixes) of an IGC file are decoded in chunks of lines straight
+into a numpy structured array of fixed-point integers, 16 bytes per fix:
+
+- time: seconds since midnight UTC of the flight date (HFDTE header),
+- lat, lon: thousandths of arc minutes, as in the file (exact),
+- alt_baro, alt_gps: meters.
+
+Each track is stored as an ``.npy`` file named after the XContest flight id
+(``flid``) and read back memory-mapped, so that only the fixes in use are
+loaded.
+
+Usage: python startleiter/igc.py 3901234.igc [...]
+"""
+
+import argparse
+import logging
+import os
+import re
+from datetime import date, timedelta
+from pathlib import Path
+from typing import BinaryIO, Iterable, Iterator, Optional, Union
+
+import numpy as np
+
+from startleiter import config as CFG
+
+LOGGER = logging.getLogger(__name__)
+
+FIX_DTYPE = np.dtype(
+    [
+        ("time", "i4"),
+        ("lat", "i4"),
+        ("lon", "i4"),
+        ("alt_baro", "i2"),
+        ("alt_gps", "i2"),
+    ]
+)
+# B HHMMSS DDMMmmmN DDDMMmmmE V PPPPP GGGGG, followed by optional extensions
+B_RECORD_LENGTH = 35
+MINUTES = 60000  # thousandths of arc minutes per degree
+EARTH_RADIUS_KM = 6371.0
+_HFDTE = re.compile(rb"^HFDTE(?:DATE:)?(\d{2})(\d{2})(\d{2})")
+
+
+def _number(digits: np.ndarray, start: int, stop: int) -> np.ndarray:
+    """Decimal number of the digit columns [start, stop) of each record."""
+    powers = 10 ** np.arange(stop - start - 1, -1, -1, dtype="i4")
+    return digits[:, start:stop] @ powers
+
+
+def decode_b_records(records: np.ndarray) -> np.ndarray:
+    """Decode B records, an array of shape (n, 35) of ASCII codes, to fixes."""
+    digits = records.astype("i4") - ord("0")
+    fixes = np.empty(len(records), dtype=FIX_DTYPE)
+    fixes["time"] = (
+        _number(digits, 1, 3) * 3600
+        + _number(digits, 3, 5) * 60
+        + _number(digits, 5, 7)
+    )
+    lat = _number(digits, 7, 9) * MINUTES + _number(digits, 9, 14)
+    fixes["lat"] = np.where(records[:, 14] == ord("S"), -lat, lat)
+    lon = _number(digits, 15, 18) * MINUTES + _number(digits, 18, 23)
+    fixes["lon"] = np.where(records[:, 23] == ord("W"), -lon, lon)
+    for name, start in [("alt_baro", 25), ("alt_gps", 30)]:
+        # altitudes below sea level are written as e.g. "-0012"
+        negative = records[:, start] == ord("-")
+        digits[negative, start] = 0
+        alt = _number(digits, start, start + 5)
+        fixes[name] = np.where(negative, -alt, alt)
+    return fixes
+
+
+def _iter_chunks(lines: Iterable[bytes], chunk_size: int) -> Iterator[np.ndarray]:
+    chunk = []
+    for line in lines:
+        if line[:1] == b"B" and len(line.rstrip()) >= B_RECORD_LENGTH:
+            chunk.append(line[:B_RECORD_LENGTH])
+            if len(chunk) == chunk_size:
+                yield np.frombuffer(b"".join(chunk), "u1").reshape(-1, B_RECORD_LENGTH)
+                chunk = []
+    if chunk:
+        yield np.frombuffer(b"".join(chunk), "u1").reshape(-1, B_RECORD_LENGTH)
+
+
+def parse_igc(
+    source: Union[str, Path, BinaryIO], chunk_size: int = 65536
+) -> tuple[Optional[date], np.ndarray]:
+    """Parse the flight date and the fixes of an IGC file.
+
+    Parameters
+    ----------
+    source: str, pathlib.Path or binary file object
+    chunk_size: int, optional
+        Number of B records decoded at once.
+
+    Returns
+    -------
+    flight_date: datetime.date or None
+    fixes: numpy.ndarray
+        Structured array of ``FIX_DTYPE``, times increasing past midnight.
+    """
+    if isinstance(source, (str, Path)):
+        with open(source, "rb") as f:
+            return parse_igc(f, chunk_size)
+
+    flight_date = None
+
+    def lines():
+        nonlocal flight_date
+        for line in source:
+            if flight_date is None and line[:5] == b"HFDTE":
+                match = _HFDTE.match(line)
+                if match:
+                    day, month, year = map(int, match.groups())
+                    flight_date = date(2000 + year, month, day)
+            yield line
+
+    chunks = [
+        decode_b_records(records) for records in _iter_chunks(lines(), chunk_size)
+    ]
+    fixes = np.concatenate(chunks) if chunks else np.empty(0, dtype=FIX_DTYPE)
+    # flights through midnight UTC
+    rollover = np.concatenate([[0], np.cumsum(np.diff(fixes["time"]) < 0)])
+    fixes["time"] += (rollover * 86400).astype("i4")
+    return flight_date, fixes
+
+
+class TrackStore:
+    """Directory of tracks, one ``<flid>.npy`` file per flight.
+
+    Parameters
+    ----------
+    path: str or pathlib.Path, optional
+        By default the configured ``tracks.path``.
+    """
+
+    def __init__(self, path=None):
+        self.path = Path(path or CFG["tracks"]["path"])
+
+    def _file(self, flid: int) -> Path:
+        # at most 10000 tracks per directory
+        return self.path / f"{flid // 10000:05d}" / f"{flid}.npy"
+
+    def __contains__(self, flid: int) -> bool:
+        return self._file(flid).exists()
+
+    def save(self, flid: int, fixes: np.ndarray) -> None:
+        path = self._file(flid)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(".tmp")
+        with open(tmp, "wb") as f:
+            np.save(f, fixes.astype(FIX_DTYPE, copy=False))
+        os.replace(tmp, path)
+
+    def load(self, flid: int, mmap: bool = True) -> np.ndarray:
+        return np.load(self._file(flid), mmap_mode="r" if mmap else None)
+
+    def flids(self) -> list[int]:
+        return sorted(int(path.stem) for path in self.path.glob("*/*.npy"))
+
+
+def altitude(fixes: np.ndarray) -> np.ndarray:
+    """GPS altitude, or the barometric one if the logger has no GPS altitude."""
+    alt = fixes["alt_gps"]
+    if not alt.any():
+        alt = fixes["alt_baro"]
+    return alt.astype("f4")
+
+
+def vertical_speed(fixes: np.ndarray, window: int = 20) -> np.ndarray:
+    """Mean vertical speed (m/s) over the ``window`` seconds before each fix."""
+    time = fixes["time"]
+    alt = altitude(fixes)
+    start = np.searchsorted(time, time - window)
+    dt = (time - time[start]).astype("f4")
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(dt > 0, (alt - alt[start]) / dt, np.nan)
+
+
+def distances_km(fixes: np.ndarray) -> np.ndarray:
+    """Great circle distances between consecutive fixes."""
+    lat = np.radians(fixes["lat"] / MINUTES)
+    lon = np.radians(fixes["lon"] / MINUTES)
+    a = (
+        np.sin(np.diff(lat) / 2) ** 2
+        + np.cos(lat[:-1]) * np.cos(lat[1:]) * np.sin(np.diff(lon) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(a))
+
+
+def thermals(vario: np.ndarray, time: np.ndarray, min_climb=0.5, min_duration=30):
+    """Start and end index of the climbs of at least ``min_duration`` seconds."""
+    climbing = np.concatenate([[False], vario > min_climb, [False]])
+    edges = np.flatnonzero(np.diff(climbing.astype("i1")))
+    starts, ends = edges[::2], edges[1::2] - 1
+    keep = time[ends] - time[starts] >= min_duration
+    return starts[keep], ends[keep]
+
+
+def track_metrics(fixes: np.ndarray, window: int = 20) -> dict:
+    """Flight metrics of a track, with the names of the flight table columns
+    where they exist.
+
+    Parameters
+    ----------
+    fixes: numpy.ndarray
+        Structured array of ``FIX_DTYPE``.
+    window: int, optional
+        Seconds over which the vertical speed is averaged.
+    """
+    if len(fixes) < 2:
+        return {}
+    time = np.asarray(fixes["time"])
+    alt = altitude(fixes)
+    vario = vertical_speed(fixes, window)
+    starts, _ = thermals(vario, time)
+    return {
+        "airtime": timedelta(seconds=int(time[-1] - time[0])),
+        "max_altitude_m": int(alt.max()),
+        "max_alt_gain_m": int((alt - np.minimum.accumulate(alt)).max()),
+        "max_climb_ms": round(float(np.nanmax(vario)), 1),
+        "max_sink_ms": round(float(np.nanmin(vario)), 1),
+        "tracklog_length_km": round(float(distances_km(fixes).sum()), 1),
+        "thermal_count": len(starts),
+        "n_fixes": len(fixes),
+    }
+
+
+def ingest(path, store: TrackStore, flid: Optional[int] = None) -> dict:
+    """Parse an IGC file, store its track and return its metrics.
+
+    By default the flight id is the name of the file (``<flid>.igc``).
+    """
+    path = Path(path)
+    flid = int(path.stem) if flid is None else flid
+    _, fixes = parse_igc(path)
+    store.save(flid, fixes)
+    return track_metrics(fixes)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        format="%(levelname)-4s [%(filename)s:%(lineno)d] %(message)s",
+        datefmt="%Y-%m-%d:%H:%M:%S",
+        level=logging.INFO,
+    )
+    parser = argparse.ArgumentParser(description="Ingest IGC tracklogs.")
+    parser.add_argument("files", nargs="+", help="IGC files named <flid>.igc")
+    parser.add_argument("--store", help="track directory (default: tracks.path)")
+    args = parser.parse_args()
+    store = TrackStore(args.store)
+    n_fixes = 0
+    for path in args.files:
+        metrics = ingest(path, store)
+        n_fixes += metrics.get("n_fixes", 0)
+        LOGGER.info(f"{path}: {metrics}")
+    LOGGER.info(f"Stored {n_fixes} fixes of {len(args.files)} tracks in {store.path}")
@@ -0,0 +1,33 @@
+"""Minimal in-process metrics registry.
+
+Counters are plain floats identified by dotted names, e.g.
+``retry.uwyo.attempts``. They are process-local and reset on restart.
+"""
+
+import threading
+from collections import defaultdict
+
+_LOCK = threading.Lock()
+_COUNTERS = defaultdict(float)
+
+
+def increment(name: str, value: float = 1) -> None:
+    """Increment the counter ``name`` by ``value``."""
+    with _LOCK:
+        _COUNTERS[name] += value
+
+
+def get(name: str) -> float:
+    with _LOCK:
+        return _COUNTERS.get(name, 0)
+
+
+def snapshot(prefix: str = "") -> dict:
+    """Return a copy of all counters whose name starts with ``prefix``."""
+    with _LOCK:
+        return {k: v for k, v in sorted(_COUNTERS.items()) if k.startswith(prefix)}
+
+
+def reset() -> None:
+    with _LOCK:
+        _COUNTERS.clear()
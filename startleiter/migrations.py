@@ -0,0 +1,312 @@
+"""Versioned schema migrations.
+
+The applied version is stored in the ``schema_version`` table. Each migration
+is applied once, in order, in its own transaction. The first one creates the
+tables of the original schema and later ones evolve existing databases. The
+tables they create are frozen below, not taken from the ORM models, so that a
+given version means the same schema in every release: changes to the models
+need a new migration.
+
+Migrations are applied explicitly, before the jobs using the database:
+
+Usage: python startleiter/migrations.py [--target VERSION]
+"""
+
+import argparse
+import logging
+import os
+from datetime import datetime
+
+from sqlalchemy import (
+    Boolean,
+    Column,
+    Date,
+    DateTime,
+    Float,
+    ForeignKey,
+    Index,
+    Integer,
+    Interval,
+    MetaData,
+    SmallInteger,
+    String,
+    Table,
+    create_engine,
+    text,
+)
+
+LOGGER = logging.getLogger(__name__)
+
+# arbitrary key of the PostgreSQL advisory lock held while migrating
+LOCK_KEY = 5217
+
+
+# the tables of the original schema, do not change
+BASELINE = MetaData()
+Table(
+    "source",
+    BASELINE,
+    Column("id", Integer, primary_key=True),
+    Column("name", String(30)),
+    Column("base_url", String(50)),
+)
+Table(
+    "site",
+    BASELINE,
+    Column("id", Integer, primary_key=True),
+    Column("source_id", Integer, ForeignKey("source.id"), nullable=False),
+    Column("name", String(30)),
+    Column("country", String(30)),
+    Column("longitude", Float),
+    Column("latitude", Float),
+    Column("radius", Integer),
+)
+Table(
+    "station",
+    BASELINE,
+    Column("id", Integer, primary_key=True),
+    Column("source_id", Integer, ForeignKey("source.id"), nullable=False),
+    Column("name", String(30)),
+    Column("long_name", String(30)),
+    Column("stid", Integer),
+    Column("country", String(30)),
+    Column("longitude", Float),
+    Column("latitude", Float),
+    Column("elevation", Float),
+)
+Table(
+    "flight",
+    BASELINE,
+    Column("id", Integer, primary_key=True),
+    Column("source_id", Integer, ForeignKey("source.id"), nullable=False),
+    Column("site_id", Integer, ForeignKey("site.id"), nullable=False),
+    Column("flid", Integer),
+    Column("flno", Integer),
+    Column("datetime", DateTime(timezone=True)),
+    Column("pilot", String(30)),
+    Column("route", String(30)),
+    Column("length_km", Float),
+    Column("points", Float),
+    Column("glider", String(30)),
+    Column("glider_cat", String(30)),
+    Column("airtime", Interval),
+    Column("max_altitude_m", Integer),
+    Column("max_alt_gain_m", Integer),
+    Column("max_climb_ms", Float),
+    Column("max_sink_ms", Float),
+    Column("tracklog_length_km", Float),
+    Column("free_distance_1_km", Float),
+    Column("free_distance_2_km", Float),
+)
+Table(
+    "prediction",
+    BASELINE,
+    Column("id", Integer, primary_key=True),
+    Column("source_id", Integer, ForeignKey("source.id"), nullable=False),
+    Column("site_id", Integer, ForeignKey("site.id"), nullable=False),
+    Column("reftime", Date),
+    Column("validtime", Date),
+    Column("leadtime_days", Integer),
+    Column("flying_probability", Float),
+    Column("max_altitude_masl", Float),
+    Column("max_distance_km", Float),
+)
+
+
+# the tables added by later migrations, do not change either
+ADDED = MetaData()
+# referenced by the foreign keys
+for table in BASELINE.tables.values():
+    table.to_metadata(ADDED)
+Table(
+    "crawl_checkpoint",
+    ADDED,
+    Column("site_id", Integer, ForeignKey("site.id"), primary_key=True),
+    Column("listing_offset", Integer, nullable=False),
+    Column("updated_at", DateTime(timezone=True)),
+)
+Table(
+    "crawl_flight",
+    ADDED,
+    Column("id", Integer, primary_key=True),
+    Column("site_id", Integer, ForeignKey("site.id"), nullable=False),
+    Column("flid", Integer, nullable=False),
+    Column("url", String(200)),
+    Column("status", String(10), nullable=False),
+    Column("attempts", Integer, nullable=False),
+    Column("last_error", String(200)),
+    Column("updated_at", DateTime(timezone=True)),
+    Index("crawl_flight_flid_key", "flid", unique=True),
+    Index("ix_crawl_flight_site_status", "site_id", "status"),
+)
+Table(
+    "crawl_schedule",
+    ADDED,
+    Column("site_id", Integer, ForeignKey("site.id"), primary_key=True),
+    Column("caught_up_at", DateTime(timezone=True)),
+    Column("flights_per_day", Float),
+    Column("backlog", Float),
+    Column("budget", Integer),
+    Column("eta_days", Float),
+    Column("updated_at", DateTime(timezone=True)),
+)
+Table(
+    "flight_feature",
+    ADDED,
+    Column("id", Integer, ForeignKey("flight.id"), primary_key=True),
+    Column("site_id", Integer, ForeignKey("site.id"), nullable=False),
+    Column("included", Boolean, nullable=False),
+    Column("datetime", DateTime(timezone=True)),
+    Column("date", Date),
+    Column("length_km", Float),
+    Column("max_altitude_m", Integer),
+    Column("airtime", Interval),
+    Column("airtime_hours", Float),
+    Column("glider_cat", String(30)),
+    Column("occurrences_last_24h", Integer),
+    Column("dayofweek", SmallInteger),
+    Column("month", SmallInteger),
+    Column("season", SmallInteger),
+    Index("ix_flight_feature_site_datetime", "site_id", "datetime"),
+)
+Table(
+    "climatology",
+    ADDED,
+    Column("id", Integer, primary_key=True),
+    Column("site_id", Integer, ForeignKey("site.id"), nullable=False),
+    Column("date", Date, nullable=False),
+    Column("n_flights", Float),
+    Column("max_altitude_m", Float),
+    Column("length_km", Float),
+    Column("airtime_hours", Float),
+    Index("climatology_site_date_key", "site_id", "date", unique=True),
+)
+
+Table(
+    "hindcast",
+    ADDED,
+    Column("id", Integer, primary_key=True),
+    Column("site_id", Integer, ForeignKey("site.id"), nullable=False),
+    Column("validtime", Date, nullable=False),
+    Column("model_hash", String(16), nullable=False),
+    Column("flying_probability", Float),
+    Column("max_altitude_masl", Float),
+    Column("max_distance_km", Float),
+    Index(
+        "hindcast_site_validtime_model_key",
+        "site_id",
+        "validtime",
+        "model_hash",
+        unique=True,
+    ),
+)
+
+
+def _create_baseline(con):
+    BASELINE.create_all(con)
+
+
+def _create_tables(*names):
+    def create_tables(con):
+        ADDED.create_all(con, tables=[ADDED.tables[name] for name in names])
+
+    return create_tables
+
+
+MIGRATIONS = [
+    (1, "Create tables", _create_baseline),
+    (
+        2,
+        "Deduplicate and add unique keys of flights and predictions",
+        [
+            "DELETE FROM flight WHERE flid IS NOT NULL AND id NOT IN "
+            "(SELECT MIN(id) FROM flight WHERE flid IS NOT NULL GROUP BY flid)",
+            "DELETE FROM prediction WHERE id NOT IN "
+            "(SELECT MAX(id) FROM prediction "
+            "GROUP BY site_id, reftime, leadtime_days)",
+            "CREATE UNIQUE INDEX IF NOT EXISTS flight_flid_key ON flight (flid)",
+            "CREATE UNIQUE INDEX IF NOT EXISTS prediction_site_reftime_key "
+            "ON prediction (site_id, reftime, leadtime_days)",
+        ],
+    ),
+    (
+        3,
+        "Add indexes for the flight and prediction query paths",
+        [
+            "CREATE INDEX IF NOT EXISTS ix_flight_site_flno ON flight (site_id, flno)",
+            "CREATE INDEX IF NOT EXISTS ix_flight_site_datetime "
+            "ON flight (site_id, datetime)",
+            "CREATE INDEX IF NOT EXISTS ix_prediction_site_validtime "
+            "ON prediction (site_id, validtime)",
+        ],
+    ),
+    (
+        4,
+        "Add the XContest crawl checkpoints and frontier",
+        _create_tables("crawl_checkpoint", "crawl_flight"),
+    ),
+    (5, "Add the XContest crawl schedule", _create_tables("crawl_schedule")),
+    (6, "Add the flight feature table", _create_tables("flight_feature")),
+    (7, "Add the climatology table", _create_tables("climatology")),
+    (8, "Add the hindcast table", _create_tables("hindcast")),
+]
+
+
+def current_version(con) -> int:
+    version = con.execute(text("SELECT MAX(version) FROM schema_version")).scalar()
+    return version or 0
+
+
+def migrate(engine, target=None) -> int:
+    """Apply all pending migrations up to ``target`` (default: latest).
+
+    Returns
+    -------
+    version: int
+        The schema version after migrating.
+    """
+    with engine.begin() as con:
+        con.execute(
+            text(
+                "CREATE TABLE IF NOT EXISTS schema_version ("
+                "version INTEGER PRIMARY KEY, "
+                "description VARCHAR(100), "
+                "applied_at TIMESTAMP)"
+            )
+        )
+    for version, description, migration in MIGRATIONS:
+        if target is not None and version > target:
+            break
+        with engine.begin() as con:
+            if engine.dialect.name == "postgresql":
+                # serialize concurrent workers starting up at the same time
+                con.execute(text(f"SELECT pg_advisory_xact_lock({LOCK_KEY})"))
+            if current_version(con) >= version:
+                continue
+            LOGGER.info(f"Applying migration {version}: {description}")
+            if callable(migration):
+                migration(con)
+            else:
+                for statement in migration:
+                    con.execute(text(statement))
+            con.execute(
+                text("INSERT INTO schema_version VALUES (:v, :d, :t)"),
+                {"v": version, "d": description, "t": datetime.utcnow()},
+            )
+    with engine.connect() as con:
+        return current_version(con)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        format="%(levelname)-4s [%(filename)s:%(lineno)d] %(message)s",
+        datefmt="%Y-%m-%d:%H:%M:%S",
+        level=logging.INFO,
+    )
+    parser = argparse.ArgumentParser(description="Migrate the database schema.")
+    parser.add_argument("--target", type=int, help="version (default: latest)")
+    args = parser.parse_args()
+
+    db_url = os.environ["DATABASE_URL"].replace("postgres://", "postgresql://")
+    version = migrate(create_engine(db_url), args.target)
+    LOGGER.info(f"Database schema at version {version}")
@@ -0,0 +1,335 @@
+"""Input moments and explainer background of a model, from a training dataset.
+
+One streaming pass over the shards of a dataset (see ``dataset.py``)
+accumulates, for every level and variable, the weighted count, mean and sum
+of squared deviations of the inputs (Welford), ignoring missing values. Each
+sample of a model (a labeled day and site) weighs on the inputs of its day.
+The statistics of blocks and shards are combined with the parallel merge of
+Chan et al., so that shards are processed by several processes and the
+result does not depend on how they are split.
+
+The same pass draws a stratified sample of the model inputs for the SHAP
+explainer: each sample gets a random key and, per stratum (site and label),
+the samples with the smallest keys are kept. These reservoirs merge as the
+statistics do. At the end, the background size is split across the strata
+in proportion to their sizes.
+
+The statistics, the reservoirs and the days already processed are kept in a
+state file, so that after the archive grows only the new days are read.
+The outputs are written in the formats used by ``app``:
+``<model>_moments.nc`` (mu and sigma by variable) and
+``<model>_background.npy`` (standardized inputs with the site model id).
+
+Usage: python startleiter/moments.py --dataset .cache/dataset --model flyability
+"""
+
+import argparse
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import NamedTuple, Optional, Sequence
+
+import numpy as np
+import xarray as xr
+
+from startleiter import config as CFG
+from startleiter.dataset import TrainingDataset
+from startleiter.scheduler import allocate
+
+LOGGER = logging.getLogger(__name__)
+
+MOMENTS_CFG = CFG["moments"]
+BLOCK_SIZE = 1024
+
+
+class Stats(NamedTuple):
+    """Weighted count, mean and sum of squared deviations."""
+
+    count: np.ndarray
+    mean: np.ndarray
+    m2: np.ndarray
+
+
+class Sample(NamedTuple):
+    """Samples with their random key and stratum."""
+
+    key: np.ndarray
+    stratum: np.ndarray
+    day: np.ndarray
+    site: np.ndarray
+    inputs: np.ndarray
+
+
+def accumulate(x: np.ndarray, weights: np.ndarray) -> Stats:
+    """Statistics along the first axis of ``x``, ignoring NaNs."""
+    x = x.astype("f8")
+    valid = ~np.isnan(x)
+    w = np.where(valid, weights.reshape(-1, *[1] * (x.ndim - 1)), 0.0)
+    x = np.where(valid, x, 0.0)
+    count = w.sum(axis=0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = np.where(count > 0, (w * x).sum(axis=0) / count, 0.0)
+    m2 = (w * (x - mean) ** 2).sum(axis=0)
+    return Stats(count, mean, m2)
+
+
+def merge(a: Stats, b: Stats) -> Stats:
+    """Statistics of the union of two sets (Chan et al.)."""
+    count = a.count + b.count
+    delta = b.mean - a.mean
+    with np.errstate(invalid="ignore", divide="ignore"):
+        ratio = np.where(count > 0, b.count / count, 0.0)
+    mean = a.mean + delta * ratio
+    m2 = a.m2 + b.m2 + delta**2 * a.count * ratio
+    return Stats(count, mean, m2)
+
+
+def reduce_levels(stats: Stats) -> Stats:
+    """Merge the statistics of all levels, (level, variable) to (variable,)."""
+    total = Stats(*[values[0] for values in stats])
+    for level in range(1, len(stats.count)):
+        total = merge(total, Stats(*[values[level] for values in stats]))
+    return total
+
+
+def to_moments(stats: Stats, variables: Sequence[str], levels=None) -> xr.Dataset:
+    """Mean ``mu`` and (population) standard deviation ``sigma``, by variable,
+    or by level and variable if ``levels`` are given."""
+    with np.errstate(invalid="ignore", divide="ignore"):
+        sigma = np.sqrt(stats.m2 / stats.count)
+    dims = ("variable",) if levels is None else ("level", "variable")
+    coords = {"variable": list(variables)}
+    if levels is not None:
+        coords["level"] = list(levels)
+    return xr.Dataset(
+        {"mu": (dims, stats.mean.astype("f4")), "sigma": (dims, sigma.astype("f4"))},
+        coords=coords,
+    )
+
+
+def keep_smallest(sample: Sample, size: int) -> Sample:
+    """The ``size`` samples with the smallest keys of each stratum."""
+    order = np.lexsort((sample.key, sample.stratum))
+    stratum = sample.stratum[order]
+    first = np.searchsorted(stratum, stratum, side="left")
+    keep = order[np.arange(len(order)) - first < size]
+    return Sample(*[values[keep] for values in sample])
+
+
+def merge_samples(a: Sample, b: Sample, size: int) -> Sample:
+    return keep_smallest(Sample(*[np.concatenate([x, y]) for x, y in zip(a, b)]), size)
+
+
+def shard_pass(path, shard: int, model: str, skip_days, size: int, seed: int):
+    """Statistics, stratum sizes and reservoirs of the new days of a shard.
+
+    Runs in the worker processes.
+    """
+    data = TrainingDataset(path)
+    start, end = data.offsets[shard], data.offsets[shard + 1]
+    samples = data.samples(model)
+    samples = samples[(samples[:, 0] >= start) & (samples[:, 0] < end)]
+    samples = samples[~np.isin(data.validtime[samples[:, 0]], skip_days)]
+    inputs = data.inputs[shard]
+    weights = np.bincount(samples[:, 0] - start, minlength=end - start)
+
+    stats = None
+    for block in range(0, end - start, BLOCK_SIZE):
+        block_stats = accumulate(
+            inputs[block : block + BLOCK_SIZE], weights[block : block + BLOCK_SIZE]
+        )
+        stats = block_stats if stats is None else merge(stats, block_stats)
+
+    stratum = samples[:, 1] * 256 + samples[:, 2]
+    rng = np.random.default_rng([seed, int(data.validtime[start].astype("i8"))])
+    sample = keep_smallest(
+        Sample(
+            rng.random(len(samples)),
+            stratum,
+            data.validtime[samples[:, 0]],
+            samples[:, 1],
+            np.empty((len(samples), 0)),
+        ),
+        size,
+    )
+    rows = np.searchsorted(data.validtime[start:end], sample.day)
+    sample = sample._replace(inputs=np.asarray(inputs[rows]))
+    days = np.unique(data.validtime[samples[:, 0]])
+    return stats, np.unique(stratum, return_counts=True), sample, days
+
+
+class MomentsState:
+    """Accumulated statistics of a model, saved as ``<model>.npz``.
+
+    Parameters
+    ----------
+    path: str or pathlib.Path, optional
+        Directory of the states, by default the configured ``moments.state``.
+    model: str
+    """
+
+    def __init__(self, model: str, path=None):
+        self.model = model
+        self.file = Path(path or MOMENTS_CFG["state"]) / f"{model}.npz"
+        self.stats = None
+        self.strata = {}
+        self.sample = None
+        self.days = np.array([], dtype="datetime64[D]")
+        self.levels = self.variables = self.model_ids = None
+        if self.file.exists():
+            with np.load(self.file) as state:
+                self.stats = Stats(state["count"], state["mean"], state["m2"])
+                self.strata = dict(zip(state["strata"], state["strata_count"]))
+                self.sample = Sample(*[state[f"sample_{f}"] for f in Sample._fields])
+                self.days = state["days"]
+                self.levels = state["levels"].tolist()
+                self.variables = state["variables"].tolist()
+                self.model_ids = state["model_ids"]
+
+    def save(self) -> None:
+        self.file.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.file.with_suffix(".tmp.npz")
+        np.savez(
+            tmp,
+            count=self.stats.count,
+            mean=self.stats.mean,
+            m2=self.stats.m2,
+            strata=np.array(list(self.strata), dtype="i8"),
+            strata_count=np.array(list(self.strata.values()), dtype="i8"),
+            days=self.days,
+            levels=np.array(self.levels),
+            variables=np.array(self.variables),
+            model_ids=self.model_ids,
+            **{f"sample_{f}": values for f, values in zip(Sample._fields, self.sample)},
+        )
+        tmp.replace(self.file)
+
+    def update(self, path, size: int = 1000, workers: int = 1, seed: int = 0) -> int:
+        """Accumulate the days of a dataset not accumulated yet.
+
+        Parameters
+        ----------
+        path: str or pathlib.Path
+            Dataset directory.
+        size: int, optional
+            Reservoir size per stratum, at least the background size.
+        workers: int, optional
+            Number of processes reading the shards.
+        seed: int, optional
+
+        Returns
+        -------
+        int
+            Number of new days.
+        """
+        data = TrainingDataset(path)
+        if self.levels is None:
+            self.levels, self.variables = data.levels, data.variables
+        if (self.levels, self.variables) != (data.levels, data.variables):
+            raise ValueError("The dataset has other levels or variables")
+        self.model_ids = data.model_ids
+        args = [
+            (path, shard, self.model, self.days, size, seed)
+            for shard in range(len(data.inputs))
+        ]
+        if workers <= 1:
+            results = [shard_pass(*arg) for arg in args]
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                results = list(executor.map(shard_pass, *zip(*args)))
+
+        n_days = 0
+        for stats, (strata, counts), sample, days in results:
+            self.stats = stats if self.stats is None else merge(self.stats, stats)
+            for stratum, count in zip(strata.tolist(), counts.tolist()):
+                self.strata[stratum] = self.strata.get(stratum, 0) + count
+            if self.sample is None:
+                self.sample = sample
+            else:
+                self.sample = merge_samples(self.sample, sample, size)
+            self.days = np.union1d(self.days, days)
+            n_days += len(days)
+        return n_days
+
+    def moments(self, variables: Optional[Sequence[str]] = None, per_level=False):
+        """Moments of the given variables (by default all)."""
+        variables = list(variables or self.variables)
+        index = [self.variables.index(variable) for variable in variables]
+        stats = Stats(*[values[:, index] for values in self.stats])
+        if per_level:
+            return to_moments(stats, variables, self.levels)
+        return to_moments(reduce_levels(stats), variables)
+
+    def background(self, size: int, moments: xr.Dataset, fill_value: float):
+        """Stratified sample of ``size`` standardized model inputs."""
+        strata = sorted(self.strata)
+        sizes = allocate([self.strata[stratum] for stratum in strata], size)
+        keep = []
+        for stratum, n in zip(strata, sizes):
+            index = np.flatnonzero(self.sample.stratum == stratum)
+            keep.extend(index[np.argsort(self.sample.key[index])][:n])
+        keep = np.sort(np.array(keep, dtype=int))
+        variables = list(moments["variable"].values)
+        index = [self.variables.index(variable) for variable in variables]
+        mu, sigma = moments["mu"], moments["sigma"]
+        if "level" in mu.dims:
+            mu, sigma = (
+                values.transpose("level", "variable") for values in (mu, sigma)
+            )
+        inputs = self.sample.inputs[keep][..., index]
+        background = np.empty((*inputs.shape[:-1], len(index) + 1))
+        background[..., :-1] = (inputs - mu.values) / sigma.values
+        background[np.isnan(background)] = fill_value
+        background[..., -1] = self.model_ids[self.sample.site[keep]][:, None]
+        return background
+
+
+def main(dataset, model, output, background, workers, per_level=False):
+    state = MomentsState(model)
+    n_days = state.update(
+        dataset, size=max(background, MOMENTS_CFG["reservoir"]), workers=workers
+    )
+    state.save()
+    LOGGER.info(f"{model}: {n_days} new days, {len(state.days)} in total")
+
+    output = Path(output)
+    moments_file = output / f"{model}_moments.nc"
+    variables = None
+    if moments_file.exists():
+        # same inputs as the trained model
+        variables = list(xr.load_dataset(moments_file)["variable"].values)
+    moments = state.moments(variables, per_level)
+    moments.to_netcdf(moments_file)
+    LOGGER.info(f"Saved: {moments_file}")
+    if background > 0:
+        fill_value = TrainingDataset(dataset).manifest["fill_value"]
+        background_file = output / f"{model}_background.npy"
+        np.save(background_file, state.background(background, moments, fill_value))
+        LOGGER.info(f"Saved: {background_file}")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        format="%(levelname)-4s [%(filename)s:%(lineno)d] %(message)s",
+        datefmt="%Y-%m-%d:%H:%M:%S",
+        level=logging.INFO,
+    )
+    parser = argparse.ArgumentParser(description="Compute the input moments.")
+    parser.add_argument("--dataset", required=True, help="dataset directory")
+    parser.add_argument("--model", default="flyability")
+    parser.add_argument("--output", default="models")
+    parser.add_argument(
+        "--background",
+        type=int,
+        help="size of the explainer background (default: 100 for flyability)",
+    )
+    parser.add_argument("--per-level", action="store_true")
+    parser.add_argument("--workers", type=int, default=multiprocessing.cpu_count())
+    args = parser.parse_args()
+    background = args.background
+    if background is None:
+        background = 100 if args.model == "flyability" else 0
+    main(
+        args.dataset, args.model, args.output, background, args.workers, args.per_level
+    )
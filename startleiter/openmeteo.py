@@ -1,7 +1,7 @@
 import logging
 import re
+from concurrent.futures import ThreadPoolExecutor
 
-import requests
 import numpy as np
 import pandas as pd
 import xarray as xr
@@ -9,9 +9,9 @@ import metpy.calc as mpcalc
 from metpy.units import units
 
 import startleiter.scraping as scr
+from startleiter import httpclient
 from startleiter import config as CFG
 
-
 _LOGGER = logging.getLogger(__name__)
 
 BASE_URL = "https://api.open-meteo.com"
@@ -21,9 +21,21 @@ DEFAULT_QUERY = {
     "longitude": 8.58,
     "hourly": "pressure_msl",
 }
+ARCHIVE_URL = "https://archive-api.open-meteo.com/v1/archive"
+FORECAST_MAX_AGE = httpclient.HTTP_CFG.get("forecast_max_age")
+ARCHIVE_MAX_AGE = httpclient.HTTP_CFG.get("archive_max_age")
 
 # https://api.open-meteo.com/v1/dwd-icon?latitude=47.45&longitude=8.58&hourly=pressure_msl
 
+SOUNDING_HOURLY = "temperature_2m,relative_humidity_2m,temperature_1000hPa,temperature_975hPa,temperature_950hPa,temperature_925hPa,temperature_900hPa,temperature_850hPa,temperature_800hPa,temperature_700hPa,temperature_600hPa,temperature_500hPa,temperature_400hPa,temperature_300hPa,temperature_250hPa,temperature_200hPa,temperature_150hPa,temperature_100hPa,temperature_70hPa,temperature_50hPa,temperature_30hPa,relative_humidity_1000hPa,relative_humidity_975hPa,relative_humidity_950hPa,relative_humidity_925hPa,relative_humidity_900hPa,relative_humidity_850hPa,relative_humidity_800hPa,relative_humidity_700hPa,relative_humidity_600hPa,relative_humidity_500hPa,relative_humidity_400hPa,relative_humidity_300hPa,relative_humidity_250hPa,relative_humidity_200hPa,relative_humidity_150hPa,relative_humidity_100hPa,relative_humidity_70hPa,relative_humidity_50hPa,wind_speed_1000hPa,wind_speed_975hPa,wind_speed_950hPa,wind_speed_925hPa,wind_speed_900hPa,wind_speed_850hPa,wind_speed_800hPa,wind_speed_700hPa,wind_speed_600hPa,wind_speed_500hPa,wind_speed_400hPa,wind_speed_300hPa,wind_speed_250hPa,wind_speed_200hPa,wind_speed_150hPa,wind_speed_100hPa,wind_speed_70hPa,wind_speed_50hPa,wind_speed_30hPa,wind_direction_1000hPa,wind_direction_975hPa,wind_direction_950hPa,wind_direction_925hPa,wind_direction_900hPa,wind_direction_850hPa,wind_direction_800hPa,wind_direction_700hPa,wind_direction_600hPa,wind_direction_500hPa,wind_direction_400hPa,wind_direction_300hPa,wind_direction_250hPa,wind_direction_200hPa,wind_direction_150hPa,wind_direction_100hPa,wind_direction_70hPa,wind_direction_50hPa,wind_direction_30hPa"
+SOUNDING_VARIABLES = (
+    "temperature",
+    "relative_humidity",
+    "wind_speed",
+    "wind_direction",
+)
+REF_PRES = np.logspace(np.log10(200), 3, 64, base=10)[::-1] // 1
+
 
 def scrape(station_name, hourly_parameter):
     """
@@ -47,7 +59,38 @@ def scrape(station_name, hourly_parameter):
     }
     query_url = scr.build_query(SEARCH_URL, DEFAULT_QUERY, this_query)
     _LOGGER.info(query_url)
-    resp = requests.get(query_url)
+    resp = httpclient.get(query_url, max_age=FORECAST_MAX_AGE)
+    df = pd.DataFrame(resp.json()["hourly"])
+    df["time"] = pd.to_datetime(df["time"])
+    df = df.set_index("time")
+    return df.astype("float32")
+
+
+def scrape_archive(station_name, hourly_parameter, start_date, end_date):
+    """
+    Parameters
+    ----------
+    station_name: str
+        The station shortname or its identifier
+    hourly_parameter: str, e.g. "pressure_msl"
+        See https://open-meteo.com/en/docs/historical-weather-api
+    start_date, end_date: datetime.date
+        First and last day (included).
+
+    Returns
+    -------
+    pandas.DataFrame
+    """
+    this_query = {
+        "latitude": CFG["stations"][station_name]["latitude"],
+        "longitude": CFG["stations"][station_name]["longitude"],
+        "hourly": hourly_parameter,
+        "start_date": f"{start_date:%Y-%m-%d}",
+        "end_date": f"{end_date:%Y-%m-%d}",
+    }
+    query_url = scr.build_query(ARCHIVE_URL, DEFAULT_QUERY, this_query)
+    _LOGGER.info(query_url)
+    resp = httpclient.get(query_url, max_age=ARCHIVE_MAX_AGE)
     df = pd.DataFrame(resp.json()["hourly"])
     df["time"] = pd.to_datetime(df["time"])
     df = df.set_index("time")
@@ -109,11 +152,11 @@ def scrape_sounding(lat, lon, leadtime):
     this_query = {
         "latitude": lat,
         "longitude": lon,
-        "hourly": "temperature_2m,relative_humidity_2m,temperature_1000hPa,temperature_975hPa,temperature_950hPa,temperature_925hPa,temperature_900hPa,temperature_850hPa,temperature_800hPa,temperature_700hPa,temperature_600hPa,temperature_500hPa,temperature_400hPa,temperature_300hPa,temperature_250hPa,temperature_200hPa,temperature_150hPa,temperature_100hPa,temperature_70hPa,temperature_50hPa,temperature_30hPa,relative_humidity_1000hPa,relative_humidity_975hPa,relative_humidity_950hPa,relative_humidity_925hPa,relative_humidity_900hPa,relative_humidity_850hPa,relative_humidity_800hPa,relative_humidity_700hPa,relative_humidity_600hPa,relative_humidity_500hPa,relative_humidity_400hPa,relative_humidity_300hPa,relative_humidity_250hPa,relative_humidity_200hPa,relative_humidity_150hPa,relative_humidity_100hPa,relative_humidity_70hPa,relative_humidity_50hPa,wind_speed_1000hPa,wind_speed_975hPa,wind_speed_950hPa,wind_speed_925hPa,wind_speed_900hPa,wind_speed_850hPa,wind_speed_800hPa,wind_speed_700hPa,wind_speed_600hPa,wind_speed_500hPa,wind_speed_400hPa,wind_speed_300hPa,wind_speed_250hPa,wind_speed_200hPa,wind_speed_150hPa,wind_speed_100hPa,wind_speed_70hPa,wind_speed_50hPa,wind_speed_30hPa,wind_direction_1000hPa,wind_direction_975hPa,wind_direction_950hPa,wind_direction_925hPa,wind_direction_900hPa,wind_direction_850hPa,wind_direction_800hPa,wind_direction_700hPa,wind_direction_600hPa,wind_direction_500hPa,wind_direction_400hPa,wind_direction_300hPa,wind_direction_250hPa,wind_direction_200hPa,wind_direction_150hPa,wind_direction_100hPa,wind_direction_70hPa,wind_direction_50hPa,wind_direction_30hPa",
+        "hourly": SOUNDING_HOURLY,
     }
     query_url = scr.build_query(SEARCH_URL, DEFAULT_QUERY, this_query)
     _LOGGER.debug(query_url)
-    resp = requests.get(query_url)
+    resp = httpclient.get(query_url, max_age=FORECAST_MAX_AGE)
     df = pd.DataFrame(resp.json()["hourly"])
     df["time"] = pd.to_datetime(df["time"])
     df = df.set_index("time")
@@ -121,8 +164,98 @@ def scrape_sounding(lat, lon, leadtime):
     ds = sounding_parse_df(df)
     ds = sounding_convert_units(ds)
     ds = ds.sel(leadtime=leadtime)
-    ref_pres = np.logspace(np.log10(200), 3, 64, base=10)[::-1] // 1
-    ds = ds.interp(PRES=ref_pres)
+    ds = ds.interp(PRES=REF_PRES)
     validtime = pd.to_datetime(ds.validtime.values)
     ds = ds.drop_vars(("leadtime", "validtime"), errors="ignore")
     return validtime, ds
+
+
+def parse_soundings(responses, leadtime):
+    """Soundings of several locations, vectorized ``scrape_sounding``.
+
+    Parameters
+    ----------
+    responses: list of dict
+        JSON responses of the locations, with the hourly ``SOUNDING_HOURLY``.
+    leadtime: datetime.timedelta
+        Time since the first hour of the forecasts.
+
+    Returns
+    -------
+    validtime: pandas.Timestamp
+    ds: xarray.Dataset
+        TEMP, DWPT, SKNT and DRCT with dimensions (point, PRES), interpolated
+        to ``REF_PRES``.
+    """
+    time = pd.to_datetime(responses[0]["hourly"]["time"])
+    validtime = time[0] + leadtime
+    row = time.get_loc(validtime)
+    pattern = re.compile(rf"({'|'.join(SOUNDING_VARIABLES)})_(\d+)hPa")
+    columns = [pattern.fullmatch(key) for key in responses[0]["hourly"]]
+    columns = [match for match in columns if match]
+    pressures = sorted({int(match.group(2)) for match in columns})
+    shape = (len(responses), len(pressures))
+    data = {name: np.full(shape, np.nan, "float32") for name in SOUNDING_VARIABLES}
+    for match in columns:
+        values = [response["hourly"][match.group(0)][row] for response in responses]
+        level = pressures.index(int(match.group(2)))
+        data[match.group(1)][:, level] = np.array(values, dtype="float32")
+
+    relhum = np.where(data["relative_humidity"] > 1, data["relative_humidity"], 1)
+    dewpoint = mpcalc.dewpoint_from_relative_humidity(
+        data["temperature"] * units.degC, relhum * units.percent
+    )
+    wspeed = data["wind_speed"] * units.kilometer / units.hour
+    dims = ("point", "PRES")
+    ds = xr.Dataset(
+        {
+            "TEMP": (dims, data["temperature"]),
+            "DWPT": (dims, dewpoint.magnitude.astype("float32"), {"units": "degC"}),
+            "SKNT": (dims, wspeed.to(units.knots).magnitude.astype("float32")),
+            "DRCT": (dims, data["wind_direction"]),
+        },
+        coords={"PRES": np.array(pressures, dtype="float32")},
+    )
+    return validtime, ds.interp(PRES=REF_PRES)
+
+
+def scrape_soundings(latitudes, longitudes, leadtime, batch_size=100, workers=4):
+    """DWD-ICON soundings of many locations, ``batch_size`` locations per
+    request and ``workers`` requests at a time.
+
+    Returns
+    -------
+    validtime: pandas.Timestamp
+    ds: xarray.Dataset
+        As returned by ``parse_soundings``, with the elevation of the model
+        grid cell of each point.
+    """
+    batches = [
+        (latitudes[i : i + batch_size], longitudes[i : i + batch_size])
+        for i in range(0, len(latitudes), batch_size)
+    ]
+
+    def fetch(batch):
+        this_query = {
+            "latitude": ",".join(f"{lat:.4f}" for lat in batch[0]),
+            "longitude": ",".join(f"{lon:.4f}" for lon in batch[1]),
+            "hourly": SOUNDING_HOURLY,
+        }
+        query_url = scr.build_query(SEARCH_URL, DEFAULT_QUERY, this_query)
+        resp = httpclient.get(query_url, max_age=FORECAST_MAX_AGE)
+        responses = resp.json()
+        # a single location is not returned as a list
+        responses = responses if isinstance(responses, list) else [responses]
+        # keep only the validtime row, not the hourly series of the batch
+        validtime, ds = parse_soundings(responses, leadtime)
+        elevation = [r.get("elevation", np.nan) for r in responses]
+        return validtime, ds.assign(elevation=("point", np.array(elevation, "float32")))
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(fetch, batches))
+    validtimes = {validtime for validtime, _ in results}
+    if len(validtimes) > 1:
+        raise ValueError(f"Soundings of different forecast runs: {sorted(validtimes)}")
+    ds = xr.concat([ds for _, ds in results], dim="point")
+    _LOGGER.info(f"Fetched {ds.sizes['point']} soundings in {len(batches)} requests")
+    return validtimes.pop(), ds
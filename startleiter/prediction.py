@@ -1,13 +1,17 @@
+import argparse
 import logging
 from datetime import datetime
 
 import requests
 
 from startleiter import config as CFG
+from startleiter import httpclient
 from startleiter.database import Database, Prediction, Site, Source
 
 LOGGER = logging.getLogger(__name__)
 
+APP_URL = "https://startleiter.herokuapp.com"
+
 
 def preprocess_prediction(prediction):
     prediction.update(
@@ -15,54 +19,96 @@ def preprocess_prediction(prediction):
             "validtime": datetime.strptime(prediction["validtime"], "%Y-%m-%d").date(),
         }
     )
-    prediction.pop("site")
+    for key in ("site", "source", "stale"):
+        prediction.pop(key, None)
     return prediction
 
 
-def main(sites):
-    """"""
+def get_site_ids(db, sites, source_id) -> dict:
+    """Look up (or add) the sites and return their ids by name."""
+    # the site config also has keys that are not columns, e.g. the elevation
+    columns = Site.__table__.columns.keys()
+    site_ids = {}
+    for site_name, site in sites:
+        site = {key: value for key, value in site.items() if key in columns}
+        site_ids[site_name] = db.add(Site, dict(site, source_id=source_id))
+    return site_ids
+
+
+def fetch_predictions_http(site_names, reftime, leadtime_days):
+    """Request the predictions from the web app, one site at a time."""
+    predictions = []
+    for site_name in site_names:
+        LOGGER.info(f"Site: {site_name}")
+        response = httpclient.get(
+            f"{APP_URL}/site?site={site_name}&time={reftime:%Y-%m-%d}&leadtime_days={leadtime_days}",
+            timeout=120,
+        )
+        try:
+            response.raise_for_status()
+        except requests.exceptions.HTTPError as e:
+            LOGGER.error(f"Request failed: {e}")
+            continue
+        predictions.append(response.json())
+    return predictions
+
+
+def fetch_predictions_local(site_names, reftime, leadtime_days):
+    """Run the prediction engine in-process, all sites in one batch."""
+    # imported here since it loads the models
+    from startleiter import app
+
+    time = datetime.combine(reftime, datetime.min.time())
+    return app.get_predictions(site_names, time, leadtime_days)
+
+
+def main(sites, http=False):
+    """Predict all sites for the next days and store the predictions.
+
+    Parameters
+    ----------
+    sites: list of tuple
+        Pairs of site name and site configuration.
+    http: bool, optional
+        Request the predictions from the web app instead of running the
+        models in-process.
+    """
     db = Database()
 
     source = CFG["sources"]["startleiter"]
     source_id = db.add(Source, source)
+    site_ids = get_site_ids(db, sites, source_id)
 
-    reftime = datetime.today().date()
+    reftime = datetime.utcnow().date()
+    fetch_predictions = fetch_predictions_http if http else fetch_predictions_local
 
-    n = 0
+    predictions = []
     for day in range(5):
-        predictions = []
         LOGGER.info(f"Day: {day}")
-        for site_name, site in sites:
-            LOGGER.info(f"Site: {site_name}")
-            site.update({"source_id": source_id})
-            site_id = db.add(Site, site)
-            response = requests.get(
-                f"https://startleiter.herokuapp.com/site?site={site_name}&time={reftime:%Y-%m-%d}&leadtime_days={day}"
+        try:
+            daily = fetch_predictions(list(site_ids), reftime, day)
+        except Exception as err:
+            LOGGER.error(f"Prediction failed: {err!r}")
+            continue
+        for prediction in daily:
+            prediction.update(
+                {
+                    "source_id": source_id,
+                    "site_id": site_ids[prediction["site"]],
+                    "reftime": reftime,
+                    "leadtime_days": day,
+                }
             )
-            try:
-                response.raise_for_status()
-            except requests.exceptions.HTTPError as e:
-                LOGGER.error(f"Request failed: {e}")
-                continue
-            else:
-                prediction = response.json()
-                prediction.update(
-                    {
-                        "source_id": source_id,
-                        "site_id": site_id,
-                        "reftime": reftime,
-                        "leadtime_days": day,
-                    }
-                )
-                predictions.append(prediction)
-        if predictions:
-            db.add_all(
-                Prediction,
-                predictions,
-                preprocess_fn=preprocess_prediction,
-            )
-            n += len(predictions)
-    LOGGER.info(f"Successfully added {n} predictions.")
+        predictions.extend(daily)
+
+    if predictions:
+        db.upsert(
+            Prediction,
+            predictions,
+            update=True,
+            preprocess_fn=preprocess_prediction,
+        )
+    LOGGER.info(f"Successfully added {len(predictions)} predictions.")
 
 
 if __name__ == "__main__":
@@ -72,5 +118,12 @@ if __name__ == "__main__":
         datefmt="%Y-%m-%d:%H:%M:%S",
         level=logging.INFO,
     )
+    parser = argparse.ArgumentParser(description="Make the daily predictions.")
+    parser.add_argument(
+        "--http",
+        action="store_true",
+        help="request the predictions from the web app instead of running the models",
+    )
+    args = parser.parse_args()
     sites = list(CFG["sites"].items())
-    main(sites)
+    main(sites, http=args.http)
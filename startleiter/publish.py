@@ -0,0 +1,289 @@
+"""Publish the Quarto website from a snapshot of the database.
+
+The flights, predictions and climatology of all sites are extracted once, in
+a single read-only transaction, into one parquet file per table and site.
+The monitoring and statistics pages then load their site's slice from the
+snapshot (see ``load_flights``, ``load_predictions`` and
+``load_climatology``) instead of querying the database, and are rendered in
+parallel, one Quarto process per page. The project render that follows
+reuses their frozen outputs (``execute: freeze: auto``) to build the site.
+
+Usage: python startleiter/publish.py [--workers 4] [--skip-snapshot]
+"""
+
+import argparse
+import json
+import logging
+import os
+import shutil
+import subprocess
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta, timezone
+from pathlib import Path
+from typing import NamedTuple, Optional, Sequence
+
+import pandas as pd
+from sqlalchemy import select
+
+from startleiter import climatology, features
+from startleiter import config as CFG
+from startleiter.database import Climatology, Flight, FlightFeature, Prediction
+from startleiter.utils import (
+    PREDICTION_DTYPES,
+    get_engine,
+    get_flights,
+    get_predictions,
+)
+
+LOGGER = logging.getLogger(__name__)
+
+PUBLISH_CFG = CFG["publish"]
+SNAPSHOT_ENV = "STARTLEITER_SNAPSHOT"
+PAGES = ("monitoring_*.qmd", "statistics_*.qmd")
+
+
+class PageTiming(NamedTuple):
+    page: str
+    seconds: float
+    returncode: int
+    output: str = ""
+
+
+def _write(df: pd.DataFrame, directory: Path, name: str, site_ids) -> None:
+    """One parquet file per site, ``<name>/<site_id>.parquet``."""
+    (directory / name).mkdir(parents=True)
+    for site_id in site_ids:
+        site = df[df["site_id"] == site_id].drop(columns="site_id")
+        site.to_parquet(directory / name / f"{site_id}.parquet")
+
+
+def extract(con, site_ids: Sequence[int], today: date, days: int) -> dict:
+    """Flights, recent predictions and climatology of the sites."""
+    feature = FlightFeature.__table__
+    flights = pd.read_sql(
+        select(
+            feature.c.id,
+            feature.c.site_id,
+            *[feature.c[col] for col in features.FEATURE_COLUMNS],
+        )
+        .where(feature.c.site_id.in_(site_ids))
+        .where(feature.c.included)
+        .order_by(feature.c.id),
+        con,
+        index_col="id",
+    )
+    flights = features.decode(flights)
+    flights["datetime"] = pd.to_datetime(flights["datetime"], utc=True)
+
+    prediction = Prediction.__table__
+    predictions = pd.read_sql(
+        select(prediction)
+        .where(prediction.c.site_id.in_(site_ids))
+        .where(prediction.c.validtime >= today - timedelta(days=days))
+        .order_by(prediction.c.id),
+        con,
+    ).astype(PREDICTION_DTYPES)
+
+    clim = Climatology.__table__
+    start = today - timedelta(days=days + climatology.SMOOTHING_DAYS)
+    references = pd.read_sql(
+        select(
+            clim.c.site_id, clim.c.date, *[clim.c[col] for col in climatology.VARIABLES]
+        )
+        .where(clim.c.site_id.in_(site_ids))
+        .where(clim.c.date > start)
+        .where(clim.c.date <= today)
+        .order_by(clim.c.site_id, clim.c.date),
+        con,
+    )
+    return {"flights": flights, "predictions": predictions, "climatology": references}
+
+
+def snapshot(engine, site_ids: Sequence[int], path=None, today=None) -> Path:
+    """Bring the derived tables up to date and write the snapshot of the sites.
+
+    Parameters
+    ----------
+    engine: sqlalchemy.engine.Engine
+    site_ids: sequence of int
+    path: str or pathlib.Path, optional
+        By default the configured ``publish.snapshot``. It is replaced
+        atomically, so that pages never read a partial snapshot.
+    today: datetime.date, optional
+
+    Returns
+    -------
+    pathlib.Path
+    """
+    path = Path(path or PUBLISH_CFG["snapshot"])
+    today = today or date.today()
+    days = PUBLISH_CFG["days"]
+    tic = time.perf_counter()
+    for site_id in site_ids:
+        climatology.update(engine, site_id, today=today)
+
+    options = {}
+    if engine.dialect.name == "postgresql":
+        options = {"isolation_level": "REPEATABLE READ", "postgresql_readonly": True}
+    with engine.connect().execution_options(**options) as con:
+        with con.begin():
+            tables = extract(con, list(site_ids), today, days)
+
+    tmp = path.with_name(path.name + ".tmp")
+    shutil.rmtree(tmp, ignore_errors=True)
+    tmp.mkdir(parents=True)
+    for name, df in tables.items():
+        _write(df, tmp, name, site_ids)
+    manifest = {
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "date": today.isoformat(),
+        "days": days,
+        "sites": sorted(int(site_id) for site_id in site_ids),
+        "rows": {name: len(df) for name, df in tables.items()},
+    }
+    (tmp / "manifest.json").write_text(json.dumps(manifest, indent=2))
+    old = path.with_name(path.name + ".old")
+    shutil.rmtree(old, ignore_errors=True)
+    if path.exists():
+        path.rename(old)
+    tmp.rename(path)
+    shutil.rmtree(old, ignore_errors=True)
+    LOGGER.info(
+        f"Snapshot of {len(site_ids)} sites ({manifest['rows']}) written to {path} "
+        f"in {time.perf_counter() - tic:.1f} s"
+    )
+    return path
+
+
+def snapshot_path() -> Optional[Path]:
+    """Snapshot the pages are rendered from, if any."""
+    path = os.environ.get(SNAPSHOT_ENV)
+    return Path(path) if path else None
+
+
+def _read(name: str, site_id: int) -> pd.DataFrame:
+    return pd.read_parquet(snapshot_path() / name / f"{site_id}.parquet")
+
+
+def load_flights(site_id: int, start=None) -> pd.DataFrame:
+    """Flights of a site as returned by ``utils.get_flights``, from the
+    snapshot if there is one."""
+    if snapshot_path() is None:
+        return get_flights(get_engine(), site_id, start=start)
+    df = _read("flights", site_id)
+    if start is not None:
+        df = df[df["datetime"] >= pd.to_datetime(start)]
+    return df
+
+
+def load_predictions(site_id: int, start=None) -> pd.DataFrame:
+    """Predictions of a site valid since ``start``, from the snapshot if
+    there is one."""
+    if snapshot_path() is None:
+        return get_predictions(get_engine(), site_id, start=start)
+    df = _read("predictions", site_id)
+    if start is not None:
+        df = df[df["validtime"] >= pd.to_datetime(start)]
+    return df.reset_index(drop=True)
+
+
+def load_climatology(site_id: int, days: int = 90) -> pd.DataFrame:
+    """Smoothed climatology of the last ``days`` days of a site, as returned
+    by ``climatology.query``, from the snapshot if there is one."""
+    path = snapshot_path()
+    if path is None:
+        return climatology.query(get_engine(), site_id, days)
+    today = date.fromisoformat(json.loads((path / "manifest.json").read_text())["date"])
+    df = _read("climatology", site_id)
+    return climatology.smooth(df, pd.Timestamp(today) - pd.Timedelta(days=days))
+
+
+def find_pages(project) -> list[Path]:
+    """Monitoring and statistics pages of the Quarto project."""
+    project = Path(project)
+    return [page for pattern in PAGES for page in sorted(project.glob(pattern))]
+
+
+def render_page(page, command: Sequence[str] = ("quarto", "render"), env=None):
+    """Render a single page (this executes its code) and time it."""
+    tic = time.perf_counter()
+    proc = subprocess.run(
+        [*command, str(page)],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        text=True,
+        env=env,
+    )
+    return PageTiming(
+        Path(page).name, time.perf_counter() - tic, proc.returncode, proc.stdout
+    )
+
+
+def render(
+    pages: Sequence[Path],
+    workers: int,
+    snapshot=None,
+    command: Sequence[str] = ("quarto", "render"),
+) -> list[PageTiming]:
+    """Render pages in parallel, one process each, from a snapshot.
+
+    Raises
+    ------
+    RuntimeError
+        If any page failed to render.
+    """
+    env = dict(os.environ)
+    if snapshot is not None:
+        env[SNAPSHOT_ENV] = str(Path(snapshot).resolve())
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        timings = list(
+            executor.map(lambda page: render_page(page, command, env), pages)
+        )
+    for timing in timings:
+        LOGGER.info(f"{timing.page:<32} {timing.seconds:>6.1f} s")
+    failed = [timing for timing in timings if timing.returncode != 0]
+    for timing in failed:
+        LOGGER.error(f"{timing.page} failed:\n{timing.output}")
+    if failed:
+        raise RuntimeError(f"{len(failed)} pages failed to render")
+    return timings
+
+
+def main(project, workers: int, skip_snapshot: bool = False) -> None:
+    tic = time.perf_counter()
+    path = Path(PUBLISH_CFG["snapshot"])
+    if not skip_snapshot:
+        engine = get_engine()
+        with engine.connect() as con:
+            site_ids = con.execute(select(Flight.site_id).distinct()).scalars().all()
+        path = snapshot(engine, sorted(site_ids), path)
+    timings = render(find_pages(project), workers, path)
+    total = sum(timing.seconds for timing in timings)
+
+    # the project render reuses the outputs frozen by the page renders
+    project_tic = time.perf_counter()
+    subprocess.run(["quarto", "render", str(project)], check=True)
+    LOGGER.info(
+        f"Rendered {len(timings)} pages ({total:.1f} s of page time) on {workers} "
+        f"workers, project in {time.perf_counter() - project_tic:.1f} s, "
+        f"{time.perf_counter() - tic:.1f} s in total"
+    )
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        format="%(levelname)-4s [%(filename)s:%(lineno)d] %(message)s",
+        datefmt="%Y-%m-%d:%H:%M:%S",
+        level=logging.INFO,
+    )
+    parser = argparse.ArgumentParser(description="Render the Quarto website.")
+    parser.add_argument("--project", default="quarto", help="Quarto project")
+    parser.add_argument(
+        "--workers", type=int, default=PUBLISH_CFG["workers"], help="parallel renders"
+    )
+    parser.add_argument(
+        "--skip-snapshot", action="store_true", help="reuse the existing snapshot"
+    )
+    args = parser.parse_args()
+    main(args.project, args.workers, args.skip_snapshot)
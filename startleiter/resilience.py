@@ -0,0 +1,288 @@
+"""Retry policies and circuit breakers for calls to upstream services.
+
+:func:`retry` wraps both plain and ``async`` functions. Attempts are separated
+by a jittered exponential backoff and bounded by a per-call deadline, so that
+a failing upstream cannot stack up sleeps indefinitely. Each upstream
+(UWYO, open-meteo, XContest, ...) has its own :class:`CircuitBreaker`, which
+makes calls fail fast with :class:`CircuitOpenError` while it is open.
+
+A synchronous attempt cannot be interrupted, so its remaining deadline is
+published with :func:`remaining_time`, which :mod:`startleiter.httpclient`
+uses to bound the timeout of the requests sent during the attempt.
+"""
+
+import asyncio
+import functools
+import inspect
+import logging
+import random
+import threading
+import time
+from contextlib import contextmanager
+from typing import Optional
+from urllib.parse import urlparse
+
+from startleiter import config as CFG
+from startleiter import metrics
+
+LOGGER = logging.getLogger(__name__)
+
+RESILIENCE_CFG = CFG.get("resilience", {})
+
+
+_DEADLINES = threading.local()
+
+
+def remaining_time() -> Optional[float]:
+    """Seconds left before the earliest deadline of the :func:`retry` calls
+    running in the current thread, or None if there is no deadline."""
+    deadlines = getattr(_DEADLINES, "stack", [])
+    if not deadlines:
+        return None
+    return min(deadlines) - time.monotonic()
+
+
+@contextmanager
+def time_limit(budget: Optional[float]):
+    """Deadline of ``budget`` seconds for the HTTP requests sent from the
+    current thread (see :func:`remaining_time`)."""
+    if budget is None:
+        yield
+        return
+    if not hasattr(_DEADLINES, "stack"):
+        _DEADLINES.stack = []
+    _DEADLINES.stack.append(time.monotonic() + budget)
+    try:
+        yield
+    finally:
+        _DEADLINES.stack.pop()
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised when calling an upstream whose circuit breaker is open."""
+
+
+class CircuitBreaker:
+    """Consecutive-failures circuit breaker.
+
+    After ``failure_threshold`` consecutive failures the circuit opens and all
+    calls are rejected for ``reset_timeout`` seconds. Then a single trial call
+    is let through (half-open): its success closes the circuit, its failure
+    opens it again.
+
+    Can be used as a context manager around the protected call.
+    """
+
+    def __init__(self, name, failure_threshold=5, reset_timeout=60.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = None
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        """Whether a call may proceed now."""
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open":
+                if time.monotonic() - self.opened_at >= self.reset_timeout:
+                    self.state = "half_open"
+                    LOGGER.info(f"Circuit '{self.name}' half-open, trying again")
+                    return True
+            metrics.increment(f"circuit.{self.name}.rejected")
+            return False
+
+    def check(self) -> None:
+        if not self.allow():
+            raise CircuitOpenError(f"Circuit '{self.name}' is open")
+
+    def record_success(self) -> None:
+        with self._lock:
+            if self.state != "closed":
+                self._close()
+            self.failures = 0
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            metrics.increment(f"circuit.{self.name}.failures")
+            if self.state == "half_open" or (
+                self.state == "closed" and self.failures >= self.failure_threshold
+            ):
+                self._open()
+
+    def _open(self):
+        if self.state == "half_open":
+            self._record_open_time()
+        self.state = "open"
+        self.opened_at = time.monotonic()
+        metrics.increment(f"circuit.{self.name}.opened")
+        LOGGER.warning(
+            f"Circuit '{self.name}' open for {self.reset_timeout:.0f} s "
+            f"after {self.failures} failures"
+        )
+
+    def _close(self):
+        self._record_open_time()
+        self.state = "closed"
+        self.opened_at = None
+        LOGGER.info(f"Circuit '{self.name}' closed")
+
+    def _record_open_time(self):
+        if self.opened_at is not None:
+            elapsed = time.monotonic() - self.opened_at
+            metrics.increment(f"circuit.{self.name}.open_seconds", elapsed)
+            self.opened_at = time.monotonic()
+
+    def __enter__(self):
+        self.check()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.record_success()
+        elif not issubclass(exc_type, CircuitOpenError):
+            self.record_failure()
+        return False
+
+
+_BREAKERS = {}
+_BREAKERS_LOCK = threading.Lock()
+
+
+def get_breaker(name: str) -> CircuitBreaker:
+    """Return the (shared) circuit breaker of a given upstream."""
+    with _BREAKERS_LOCK:
+        if name not in _BREAKERS:
+            _BREAKERS[name] = CircuitBreaker(
+                name,
+                failure_threshold=RESILIENCE_CFG.get("failure_threshold", 5),
+                reset_timeout=RESILIENCE_CFG.get("reset_timeout", 60),
+            )
+        return _BREAKERS[name]
+
+
+def upstream_name(url: str) -> str:
+    """Name of the configured source serving ``url``, or its host name."""
+    host = urlparse(url).hostname or ""
+    for name, source in CFG["sources"].items():
+        if urlparse(source["base_url"]).hostname == host:
+            return name
+    return host
+
+
+def breaker_for_url(url: str) -> CircuitBreaker:
+    return get_breaker(upstream_name(url))
+
+
+def backoff(attempt, base_delay, max_delay, jitter=True) -> float:
+    """Exponential backoff delay before retry ``attempt`` (0-based).
+
+    With ``jitter``, the "full jitter" strategy is used, i.e. a delay drawn
+    uniformly between zero and the exponential cap.
+    """
+    cap = min(max_delay, base_delay * 2**attempt)
+    return random.uniform(0, cap) if jitter else cap
+
+
+def retry(
+    maxattempts: int = 3,
+    deadline: Optional[float] = None,
+    base_delay: Optional[float] = None,
+    max_delay: Optional[float] = None,
+    jitter: bool = True,
+    upstream: Optional[str] = None,
+    exceptions: tuple = (Exception,),
+):
+    """Retry decorator for sync and async functions.
+
+    Parameters
+    ----------
+    maxattempts: int
+        Maximum number of attempts.
+    deadline: float, optional
+        Time budget in seconds for all attempts of a call, including waiting.
+        No new attempt is started (and no sleep is scheduled) past the deadline.
+        For coroutines, the running attempt is also cancelled at the deadline,
+        for plain functions the HTTP requests of the attempt time out at the
+        deadline (see :func:`remaining_time`).
+    base_delay, max_delay: float, optional
+        Parameters of the exponential backoff, see :func:`backoff`.
+    jitter: bool
+    upstream: str, optional
+        Name of the upstream circuit breaker to consult before each attempt.
+    exceptions: tuple
+        Exceptions that trigger a retry, any other is raised immediately.
+    """
+    base_delay = (
+        RESILIENCE_CFG.get("base_delay", 0.5) if base_delay is None else base_delay
+    )
+    max_delay = RESILIENCE_CFG.get("max_delay", 4) if max_delay is None else max_delay
+
+    def _retry(func):
+        name = upstream or func.__name__
+
+        def _budget(t0):
+            return None if deadline is None else deadline - (time.monotonic() - t0)
+
+        def _next_delay(attempt, err, t0):
+            """Delay before the next attempt, or None to give up."""
+            metrics.increment(f"retry.{name}.failures")
+            LOGGER.error(f"@retry: {func.__name__} Failed: {err!r}")
+            if isinstance(err, CircuitOpenError) or attempt == maxattempts - 1:
+                return None
+            delay = backoff(attempt, base_delay, max_delay, jitter)
+            budget = _budget(t0)
+            if budget is not None and delay >= budget:
+                metrics.increment(f"retry.{name}.deadline_exceeded")
+                LOGGER.warning(f"@retry: {func.__name__} Deadline exceeded")
+                return None
+            LOGGER.info(f"@retry: {func.__name__} Waiting {delay:.1f} seconds ...")
+            return delay
+
+        def _before_attempt(attempt):
+            metrics.increment(f"retry.{name}.attempts")
+            LOGGER.debug(f"@retry: {func.__name__} Trying ... ({attempt + 1})")
+            if upstream is not None:
+                get_breaker(upstream).check()
+
+        if inspect.iscoroutinefunction(func):
+
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                t0 = time.monotonic()
+                for attempt in range(maxattempts):
+                    try:
+                        _before_attempt(attempt)
+                        budget = _budget(t0)
+                        if budget is None:
+                            return await func(*args, **kwargs)
+                        return await asyncio.wait_for(func(*args, **kwargs), budget)
+                    except (CircuitOpenError, asyncio.TimeoutError, *exceptions) as err:
+                        delay = _next_delay(attempt, err, t0)
+                        if delay is None:
+                            raise
+                    await asyncio.sleep(delay)
+
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            t0 = time.monotonic()
+            for attempt in range(maxattempts):
+                try:
+                    _before_attempt(attempt)
+                    with time_limit(_budget(t0)):
+                        return func(*args, **kwargs)
+                except (CircuitOpenError, *exceptions) as err:
+                    delay = _next_delay(attempt, err, t0)
+                    if delay is None:
+                        raise
+                time.sleep(delay)
+
+        return wrapper
+
+    return _retry
@@ -0,0 +1,145 @@
+"""Persistent cache of computed results, shared across processes and restarts.
+
+Results are pickled into a local SQLite database (in WAL mode, so that several
+uvicorn workers can read and write it concurrently) and evicted in least
+recently used order once the total size exceeds the configured bound.
+"""
+
+import functools
+import hashlib
+import logging
+import pickle
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Optional
+
+from startleiter import metrics
+
+LOGGER = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    value BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    accessed REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed);
+"""
+
+
+class ResultCache:
+    """SQLite-backed key-value store with size-bounded LRU eviction.
+
+    Parameters
+    ----------
+    path: str or pathlib.Path
+        Path of the SQLite database file.
+    max_bytes: int
+        Maximum total size of the stored values.
+    """
+
+    def __init__(self, path, max_bytes):
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        with self._connect() as con:
+            con.execute("PRAGMA journal_mode=WAL")
+            con.executescript(SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        con = getattr(self._local, "con", None)
+        if con is None:
+            con = sqlite3.connect(self.path, timeout=30)
+            self._local.con = con
+        return con
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._connect() as con:
+            row = con.execute("SELECT value FROM entries WHERE key = ?", (key,))
+            row = row.fetchone()
+            if row is None:
+                return None
+            con.execute(
+                "UPDATE entries SET accessed = ? WHERE key = ?", (time.time(), key)
+            )
+        return row[0]
+
+    def set(self, key: str, value: bytes) -> None:
+        with self._connect() as con:
+            con.execute(
+                "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?)",
+                (key, value, len(value), time.time()),
+            )
+            self._evict(con)
+
+    def _evict(self, con):
+        (total,) = con.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()
+        if total <= self.max_bytes:
+            return
+        rows = con.execute("SELECT key, size FROM entries ORDER BY accessed")
+        evicted = []
+        for key, size in rows.fetchall():
+            if total <= self.max_bytes:
+                break
+            evicted.append((key,))
+            total -= size
+        con.executemany("DELETE FROM entries WHERE key = ?", evicted)
+        LOGGER.debug(f"Evicted {len(evicted)} entries from {self.path}")
+
+
+def artifacts_hash(*paths) -> str:
+    """Short digest of the content of the given files."""
+    digest = hashlib.sha256()
+    for path in sorted(Path(p) for p in paths):
+        digest.update(path.name.encode())
+        digest.update(path.read_bytes())
+    return digest.hexdigest()[:16]
+
+
+def _key_part(arg) -> str:
+    if hasattr(arg, "isoformat"):  # datetime.datetime and pandas.Timestamp
+        return arg.isoformat()
+    return repr(arg)
+
+
+def persistent(
+    cache: Optional[ResultCache],
+    namespace: str,
+    version: str = "",
+    final: Optional[Callable[..., bool]] = None,
+):
+    """Decorator caching the (picklable) results of a function in ``cache``.
+
+    The key is made of ``namespace``, ``version`` (e.g. the hash of the model
+    artifacts) and the call arguments. If ``cache`` is None, this is a no-op.
+    If given, ``final(*args)`` tells whether a freshly computed result is
+    final, only final results are stored (e.g. not those computed from
+    provisional inputs that will be replaced later).
+    """
+
+    def _persistent(func):
+        if cache is None:
+            return func
+
+        @functools.wraps(func)
+        def wrapper(*args):
+            key = ":".join([namespace, version, *map(_key_part, args)])
+            value = cache.get(key)
+            if value is not None:
+                metrics.increment(f"resultcache.{namespace}.hits")
+                return pickle.loads(value)
+            metrics.increment(f"resultcache.{namespace}.misses")
+            result = func(*args)
+            if final is None or final(*args):
+                cache.set(key, pickle.dumps(result))
+            else:
+                metrics.increment(f"resultcache.{namespace}.provisional")
+            return result
+
+        return wrapper
+
+    return _persistent
@@ -0,0 +1,192 @@
+"""Split the request budget of a scraping run across the sites.
+
+The backlog of a site is the number of flights it most likely has on XContest
+but not in the database: the flights pending in the crawl frontier plus the
+flights expected since the site was last known to be up to date. The expected
+flights are those of the same period one year earlier, which accounts for the
+season (or the mean daily rate if the history is shorter than a year). The
+budget is then split in proportion to the backlogs, so that each request goes
+where it most likely retrieves a missing flight.
+
+The estimates and the time the listing of each site was last crawled to its
+end are kept in the ``crawl_schedule`` table between runs.
+"""
+
+import logging
+import math
+from datetime import datetime, timedelta, timezone
+from typing import NamedTuple, Optional
+
+from sqlalchemy import func, select
+
+from startleiter import config as CFG
+from startleiter.database import CrawlFlight, CrawlSchedule, Flight
+from startleiter.frontier import PENDING
+
+LOGGER = logging.getLogger(__name__)
+
+SCHEDULER_CFG = CFG["xcontest"]
+YEAR = timedelta(days=365)
+
+
+class SiteBacklog(NamedTuple):
+    site_id: int
+    name: str
+    up_to_date_at: Optional[datetime]
+    flights_per_day: float
+    backlog: float
+    budget: int = 0
+    eta_days: float = math.inf
+
+
+def _utc(dt: Optional[datetime]) -> Optional[datetime]:
+    # sqlite returns naive datetimes
+    if dt is not None and dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt
+
+
+def _count_flights(con, site_id, start, end) -> int:
+    query = (
+        select(func.count())
+        .select_from(Flight)
+        .where(Flight.site_id == site_id)
+        .where(Flight.datetime > start)
+        .where(Flight.datetime <= end)
+    )
+    return con.execute(query).scalar()
+
+
+def estimate_backlog(db, site_id: int, name: str, now: datetime) -> SiteBacklog:
+    """Estimate the number of flights of a site still to be retrieved."""
+    with db.engine.connect() as con:
+        first, last = con.execute(
+            select(func.min(Flight.datetime), func.max(Flight.datetime)).where(
+                Flight.site_id == site_id
+            )
+        ).one()
+        first, last = _utc(first), _utc(last)
+        pending = con.execute(
+            select(func.count())
+            .select_from(CrawlFlight)
+            .where(CrawlFlight.site_id == site_id)
+            .where(CrawlFlight.status == PENDING)
+        ).scalar()
+        caught_up_at = con.execute(
+            select(CrawlSchedule.caught_up_at).where(CrawlSchedule.site_id == site_id)
+        ).scalar()
+        caught_up_at = _utc(caught_up_at)
+
+        if last is None:
+            # never scraped, or no flights at all
+            backlog = pending if caught_up_at else SCHEDULER_CFG["new_site_backlog"]
+            return SiteBacklog(site_id, name, caught_up_at, 0.0, backlog)
+        up_to_date_at = max(last, caught_up_at) if caught_up_at else last
+        window = min(max((last - first).days, 1), 365)
+        flights_per_day = (
+            _count_flights(con, site_id, last - timedelta(days=window), last) / window
+        )
+        if first <= up_to_date_at - YEAR:
+            expected = _count_flights(con, site_id, up_to_date_at - YEAR, now - YEAR)
+        else:
+            expected = flights_per_day * (now - up_to_date_at) / timedelta(days=1)
+    return SiteBacklog(
+        site_id, name, up_to_date_at, flights_per_day, pending + expected
+    )
+
+
+def allocate(backlogs: list[float], budget: int) -> list[int]:
+    """Split ``budget`` in proportion to the backlogs (largest remainders),
+    never giving a site more than its (rounded up) backlog."""
+    caps = [math.ceil(backlog) for backlog in backlogs]
+    if sum(caps) <= budget:
+        return caps
+    total = sum(backlogs)
+    shares = [budget * backlog / total for backlog in backlogs]
+    alloc = [min(int(share), cap) for share, cap in zip(shares, caps)]
+    order = sorted(
+        range(len(backlogs)), key=lambda i: shares[i] - int(shares[i]), reverse=True
+    )
+    for i in order:
+        if sum(alloc) >= budget:
+            break
+        if alloc[i] < caps[i]:
+            alloc[i] += 1
+    return alloc
+
+
+def eta_days(backlog: float, budget: int, flights_per_day: float) -> float:
+    """Days to catch up if every run spends ``budget`` requests on the site."""
+    if backlog <= budget:
+        return 0.0
+    interval = SCHEDULER_CFG["run_interval_days"]
+    net = budget - flights_per_day * interval
+    if net <= 0:
+        return math.inf
+    return math.ceil((backlog - budget) / net) * interval
+
+
+def plan(db, site_ids: dict, budget: int, now=None) -> list[SiteBacklog]:
+    """Budget and expected time to catch up of each site, highest budget first.
+
+    Parameters
+    ----------
+    db: startleiter.database.Database
+    site_ids: dict
+        Site ids by name.
+    budget: int
+        Number of flight details to fetch in this run.
+    now: datetime.datetime, optional
+
+    Returns
+    -------
+    list of SiteBacklog
+    """
+    now = now or datetime.now(timezone.utc)
+    sites = [
+        estimate_backlog(db, site_id, name, now) for name, site_id in site_ids.items()
+    ]
+    budgets = allocate([site.backlog for site in sites], budget)
+    sites = [
+        site._replace(
+            budget=site_budget,
+            eta_days=eta_days(site.backlog, site_budget, site.flights_per_day),
+        )
+        for site, site_budget in zip(sites, budgets)
+    ]
+    for site in sites:
+        db.session.merge(
+            CrawlSchedule(
+                site_id=site.site_id,
+                flights_per_day=site.flights_per_day,
+                backlog=site.backlog,
+                budget=site.budget,
+                eta_days=None if math.isinf(site.eta_days) else site.eta_days,
+                updated_at=now,
+            )
+        )
+    db.session.commit()
+    return sorted(sites, key=lambda site: site.budget, reverse=True)
+
+
+def mark_caught_up(db, site_id: int, now=None) -> None:
+    """Record that the listing of a site was crawled to its end."""
+    schedule = db.session.get(CrawlSchedule, site_id)
+    if schedule is None:
+        schedule = CrawlSchedule(site_id=site_id)
+        db.session.add(schedule)
+    schedule.caught_up_at = now or datetime.now(timezone.utc)
+    db.session.commit()
+
+
+def report(sites: list[SiteBacklog]) -> str:
+    lines = [
+        f"{'site':<20} {'backlog':>8} {'flights/day':>11} {'budget':>6} {'ETA':>8}"
+    ]
+    for site in sites:
+        eta = "never" if math.isinf(site.eta_days) else f"{site.eta_days:.0f} d"
+        lines.append(
+            f"{site.name:<20} {site.backlog:>8.0f} {site.flights_per_day:>11.2f} "
+            f"{site.budget:>6} {eta:>8}"
+        )
+    return "\n".join(lines)
@@ -1,11 +1,17 @@
 import getpass
 import logging
+import queue
+import threading
 import time
+from typing import Callable, Iterator
 
 import psutil
 from selenium import webdriver
+from selenium.common.exceptions import TimeoutException, WebDriverException
 from selenium.webdriver import FirefoxOptions
 
+from startleiter import metrics
+
 LOGGER = logging.getLogger(__name__)
 
 
@@ -90,6 +96,146 @@ def pacing(n, ntot, t0, pace, total_sleep):
     return total_sleep
 
 
+class RateLimiter:
+    """Token bucket shared by several threads.
+
+    Parameters
+    ----------
+    pace: float
+        Average number of requests per hour.
+    burst: int, optional
+        Number of requests that can be made at once after a pause.
+    """
+
+    def __init__(self, pace, burst=1, clock=time.monotonic, sleep=time.sleep):
+        self.interval = 3600 / pace
+        self.burst = burst
+        self._clock = clock
+        self._sleep = sleep
+        self._tokens = burst
+        self._last = clock()
+        self._lock = threading.Lock()
+
+    def _reserve(self) -> float:
+        """Take a token and return how long to wait before using it."""
+        with self._lock:
+            now = self._clock()
+            elapsed = now - self._last
+            self._tokens = min(self.burst, self._tokens + elapsed / self.interval)
+            self._last = now
+            self._tokens -= 1
+            return max(0, -self._tokens * self.interval)
+
+    def acquire(self) -> float:
+        """Block until a request can be made, return the time waited."""
+        wait = self._reserve()
+        if wait > 0:
+            LOGGER.debug(f"Slowing down... wait {wait:.1f} seconds...")
+            self._sleep(wait)
+        return wait
+
+
+class BrowserPool:
+    """Pool of browser sessions working off a shared queue of tasks.
+
+    Each worker thread owns one browser, launched (and set up, e.g. logged in)
+    when needed. A browser that crashes or times out is quit and replaced
+    before the next task of its worker.
+
+    Parameters
+    ----------
+    size: int
+        Number of browsers.
+    setup: callable, optional
+        Called with each new browser, returns the browser to use.
+    rate_limiter: RateLimiter, optional
+        Limiter acquired before each task, shared by all workers.
+    launch: callable, optional
+        Launch a new browser.
+    """
+
+    RESTART_ERRORS = (TimeoutException, WebDriverException)
+
+    def __init__(self, size, setup=None, rate_limiter=None, launch=launch_browser):
+        self.size = size
+        self.setup = setup
+        self.rate_limiter = rate_limiter
+        self.launch = launch
+        self._tasks = queue.Queue()
+        self._workers = [
+            threading.Thread(target=self._work, name=f"browser-{n}", daemon=True)
+            for n in range(size)
+        ]
+        for worker in self._workers:
+            worker.start()
+
+    def _start_browser(self):
+        browser = self.launch()
+        if self.setup is not None:
+            browser = self.setup(browser)
+        metrics.increment("browserpool.launched")
+        return browser
+
+    @staticmethod
+    def _quit(browser):
+        try:
+            browser.quit()
+        except Exception as err:
+            LOGGER.debug(f"Failed to quit browser: {err!r}")
+
+    def _work(self):
+        browser = None
+        while True:
+            task = self._tasks.get()
+            if task is None:
+                break
+            func, item, results = task
+            try:
+                if browser is None:
+                    browser = self._start_browser()
+                if self.rate_limiter is not None:
+                    self.rate_limiter.acquire()
+                results.put((item, func(item, browser), None))
+            except self.RESTART_ERRORS as err:
+                LOGGER.warning(f"Restarting browser after {err.__class__.__name__}")
+                metrics.increment("browserpool.restarts")
+                if browser is not None:
+                    self._quit(browser)
+                browser = None
+                results.put((item, None, err))
+            except Exception as err:
+                results.put((item, None, err))
+        if browser is not None:
+            self._quit(browser)
+
+    def map(self, func: Callable, items) -> Iterator[tuple]:
+        """Call ``func(item, browser)`` for all items.
+
+        Yields
+        ------
+        item, result, error
+            In order of completion. ``error`` is the raised exception, if any.
+        """
+        results = queue.Queue()
+        items = list(items)
+        for item in items:
+            self._tasks.put((func, item, results))
+        for _ in items:
+            yield results.get()
+
+    def close(self):
+        for _ in self._workers:
+            self._tasks.put(None)
+        for worker in self._workers:
+            worker.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
 def cleanup():
     for proc in psutil.process_iter():
         if (
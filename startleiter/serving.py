@@ -0,0 +1,123 @@
+"""Stale-while-revalidate serving of the last good results.
+
+For each key (e.g. site and lead time) the last successfully computed result
+is kept together with its basis, i.e. the data cycle it was computed from.
+When a newer cycle is requested, the last good result can be returned
+immediately, flagged as stale, while the new one is computed in background.
+The same entries are used as fallback when the computation fails.
+"""
+
+import logging
+import threading
+from datetime import datetime, timedelta
+from typing import Any, NamedTuple, Optional
+
+from starlette.background import BackgroundTasks
+from starlette.concurrency import run_in_threadpool
+
+from startleiter import config as CFG
+from startleiter import metrics
+
+LOGGER = logging.getLogger(__name__)
+
+SERVING_CFG = CFG["serving"]
+
+
+class Entry(NamedTuple):
+    basis: datetime
+    value: Any
+
+
+class LastGoodCache:
+    """Last good result per key.
+
+    Parameters
+    ----------
+    name: str
+        Name used for the ``serving.<name>.*`` counters.
+    max_staleness: datetime.timedelta
+        Maximum age of the basis of a result (with respect to the requested
+        basis) for it to be served.
+    """
+
+    def __init__(self, name, max_staleness):
+        self.name = name
+        self.max_staleness = max_staleness
+        self._entries = {}
+        self._refreshing = set()
+        self._lock = threading.Lock()
+
+    def get(self, key, basis) -> Optional[Entry]:
+        """Last good entry of ``key`` that is not too stale for ``basis``, nor
+        from a newer basis (i.e. another date than requested)."""
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is None or entry.basis > basis:
+            return None
+        if basis - entry.basis > self.max_staleness:
+            return None
+        return entry
+
+    def put(self, key, basis, value) -> None:
+        """Store a result, unless a result from a newer basis is known."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry.basis <= basis:
+                self._entries[key] = Entry(basis, value)
+
+    def refresh(self, key, basis, compute, *args) -> None:
+        """Compute and store a result, logging (not raising) failures."""
+        try:
+            self.put(key, basis, compute(*args))
+        except Exception as err:
+            metrics.increment(f"serving.{self.name}.refresh_failures")
+            LOGGER.error(f"Background refresh of {self.name}{key} failed: {err!r}")
+        finally:
+            with self._lock:
+                self._refreshing.discard((key, basis))
+
+    def schedule_refresh(self, background_tasks, key, basis, compute, *args):
+        with self._lock:
+            if (key, basis) in self._refreshing:
+                return
+            self._refreshing.add((key, basis))
+        background_tasks.add_task(self.refresh, key, basis, compute, *args)
+
+
+async def serve(
+    cache: LastGoodCache,
+    key,
+    basis: datetime,
+    compute,
+    args: tuple,
+    stale_ok: bool,
+    background_tasks: BackgroundTasks,
+) -> tuple[Any, bool]:
+    """Serve ``compute(*args)`` with stale-while-revalidate semantics.
+
+    Returns
+    -------
+    value: any
+        The fresh result, or the last good one.
+    stale: bool
+        Whether the returned value was computed from an older basis.
+    """
+    last = cache.get(key, basis)
+    if stale_ok and last is not None and last.basis < basis:
+        metrics.increment(f"serving.{cache.name}.stale")
+        cache.schedule_refresh(background_tasks, key, basis, compute, *args)
+        return last.value, True
+    try:
+        value = await run_in_threadpool(compute, *args)
+    except Exception as err:
+        if not SERVING_CFG["fallback_on_error"] or last is None:
+            raise
+        metrics.increment(f"serving.{cache.name}.fallback")
+        LOGGER.error(f"Serving last good {cache.name}{key} after error: {err!r}")
+        return last.value, last.basis != basis
+    cache.put(key, basis, value)
+    return value, False
+
+
+def max_staleness() -> timedelta:
+    return timedelta(hours=SERVING_CFG["max_staleness_hours"])
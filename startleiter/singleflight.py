@@ -0,0 +1,121 @@
+"""Single-flight coalescing of concurrent identical calls.
+
+While a call for a given key is in flight, any further call with the same key
+waits for the result of the first one instead of running the function again.
+Works from threads (:meth:`SingleFlight.do`) and from asyncio coroutines
+(:meth:`SingleFlight.do_async`).
+"""
+
+import asyncio
+import functools
+import inspect
+import logging
+import threading
+from concurrent.futures import Future
+
+from startleiter import metrics
+
+LOGGER = logging.getLogger(__name__)
+
+
+class SingleFlight:
+    """Group of calls deduplicated by key.
+
+    Parameters
+    ----------
+    name: str
+        Name used for the ``singleflight.<name>.*`` counters.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def _join(self, key):
+        """Return the future of the call in flight and whether we lead it."""
+        with self._lock:
+            future = self._calls.get(key)
+            if future is not None:
+                metrics.increment(f"singleflight.{self.name}.coalesced")
+                LOGGER.debug(f"Coalescing {self.name}{key}")
+                return future, False
+            future = Future()
+            self._calls[key] = future
+            metrics.increment(f"singleflight.{self.name}.calls")
+            return future, True
+
+    def _done(self, key, future, result=None, error=None):
+        with self._lock:
+            self._calls.pop(key, None)
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def do(self, key, func, *args, **kwargs):
+        """Call ``func(*args, **kwargs)`` unless a call with ``key`` is in flight."""
+        future, leader = self._join(key)
+        if not leader:
+            return future.result()
+        try:
+            result = func(*args, **kwargs)
+        except BaseException as err:
+            self._done(key, future, error=err)
+            raise
+        self._done(key, future, result=result)
+        return result
+
+    async def do_async(self, key, func, *args, **kwargs):
+        """Async version of :meth:`do`.
+
+        ``func`` can be a coroutine function, or a plain function that is then
+        run in the default executor.
+        """
+        future, leader = self._join(key)
+        if not leader:
+            return await asyncio.wrap_future(future)
+        try:
+            if inspect.iscoroutinefunction(func):
+                result = await func(*args, **kwargs)
+            else:
+                loop = asyncio.get_running_loop()
+                result = await loop.run_in_executor(
+                    None, functools.partial(func, *args, **kwargs)
+                )
+        except BaseException as err:
+            self._done(key, future, error=err)
+            raise
+        self._done(key, future, result=result)
+        return result
+
+
+def coalesce(name):
+    """Decorator coalescing concurrent calls with the same arguments.
+
+    Arguments must be hashable. Coroutine functions are supported too.
+    """
+
+    def _coalesce(func):
+        group = SingleFlight(name)
+
+        def _key(args, kwargs):
+            return args + tuple(sorted(kwargs.items()))
+
+        if inspect.iscoroutinefunction(func):
+
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                return await group.do_async(_key(args, kwargs), func, *args, **kwargs)
+
+            async_wrapper.singleflight = group
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            return group.do(_key(args, kwargs), func, *args, **kwargs)
+
+        wrapper.singleflight = group
+        return wrapper
+
+    return _coalesce
@@ -5,8 +5,10 @@ import os
 
 import numpy as np
 import pandas as pd
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, select
 
+from startleiter import features
+from startleiter.database import Flight, Prediction
 
 # silence invalid value warning
 np.seterr(invalid="ignore")
@@ -18,27 +20,127 @@ def get_engine():
     return create_engine(db_url, echo=False)
 
 
-def read_flights(engine, target_id):
-    cols = [
-        "datetime",
-        "site_id",
-        "length_km",
-        "max_altitude_m",
-        "airtime",
-        "glider_cat",
-    ]
-    df = pd.read_sql("flight", engine, index_col="id", columns=cols)
-    return df[df.site_id == target_id].drop("site_id", axis=1)
+FLIGHT_COLUMNS = (
+    "datetime",
+    "length_km",
+    "max_altitude_m",
+    "airtime",
+    "glider_cat",
+)
+FLIGHT_DTYPES = {
+    "glider_cat": "category",
+    "length_km": "float32",
+    "max_altitude_m": "float32",
+    "points": "float32",
+    "max_alt_gain_m": "float32",
+    "max_climb_ms": "float32",
+    "max_sink_ms": "float32",
+}
+PREDICTION_DTYPES = {
+    "reftime": "datetime64[ns]",
+    "validtime": "datetime64[ns]",
+    "flying_probability": "float32",
+    "max_altitude_masl": "float32",
+    "max_distance_km": "float32",
+}
+
+
+def _compact(df, dtypes):
+    dtypes = {col: dtype for col, dtype in dtypes.items() if col in df}
+    return df.astype(dtypes)
+
+
+def _read_sql(engine, query, dtypes, index_col=None, chunksize=None):
+    """Read a query into a dataframe, or an iterator of dataframes of
+    ``chunksize`` rows fetched through a server-side cursor."""
+    if chunksize is None:
+        with engine.connect() as con:
+            df = pd.read_sql(query, con, index_col=index_col)
+        return _compact(df, dtypes)
+    return _read_sql_chunks(engine, query, dtypes, index_col, chunksize)
+
+
+def _read_sql_chunks(engine, query, dtypes, index_col, chunksize):
+    with engine.connect().execution_options(stream_results=True) as con:
+        for df in pd.read_sql(query, con, index_col=index_col, chunksize=chunksize):
+            yield _compact(df, dtypes)
+
+
+def read_flights(
+    engine, target_id, start=None, end=None, columns=FLIGHT_COLUMNS, chunksize=None
+):
+    """
+    Read the flights of a site.
 
+    Parameters
+    ----------
+    engine: sqlalchemy.engine.Engine
+    target_id: int
+        Id of the site.
+    start, end: datetime-like, optional
+        Only return flights in [start, end).
+    columns: sequence of str, optional
+        Columns to return (the index is the flight id).
+    chunksize: int, optional
+        If given, return an iterator of dataframes of ``chunksize`` rows
+        streamed from the database.
 
-def read_predictions(engine, target_id, date=None):
-    df = pd.read_sql("prediction", engine)
-    df = df[df.site_id == target_id].drop("site_id", axis=1)
+    Returns
+    -------
+    pandas.DataFrame or iterator of pandas.DataFrame
+    """
+    table = Flight.__table__
+    query = select(table.c.id, *[table.c[col] for col in columns]).where(
+        table.c.site_id == target_id
+    )
+    if start is not None:
+        query = query.where(table.c.datetime >= pd.to_datetime(start))
+    if end is not None:
+        query = query.where(table.c.datetime < pd.to_datetime(end))
+    return _read_sql(engine, query, FLIGHT_DTYPES, "id", chunksize)
+
+
+def read_predictions(
+    engine, target_id, date=None, start=None, end=None, columns=None, chunksize=None
+):
+    """
+    Read the predictions of a site.
+
+    Parameters
+    ----------
+    engine: sqlalchemy.engine.Engine
+    target_id: int
+        Id of the site.
+    date: date-like, optional
+        Only return the predictions issued on this date (the reftime column
+        is then dropped).
+    start, end: date-like, optional
+        Only return predictions valid in [start, end).
+    columns: sequence of str, optional
+        Columns to return, by default all but the site id.
+    chunksize: int, optional
+        If given, return an iterator of dataframes of ``chunksize`` rows
+        streamed from the database.
+
+    Returns
+    -------
+    pandas.DataFrame or iterator of pandas.DataFrame
+    """
+    table = Prediction.__table__
+    if columns is None:
+        columns = [col.name for col in table.columns if col.name != "site_id"]
     if date:
-        timestamp = pd.to_datetime(date).replace(hour=0, minute=0, second=0)
-        date_id = df.reftime == timestamp
-        df = df[date_id].drop("reftime", axis=1)
-    return df
+        columns = [col for col in columns if col != "reftime"]
+    query = select(*[table.c[col] for col in columns]).where(
+        table.c.site_id == target_id
+    )
+    if date:
+        query = query.where(table.c.reftime == pd.to_datetime(date).date())
+    if start is not None:
+        query = query.where(table.c.validtime >= pd.to_datetime(start).date())
+    if end is not None:
+        query = query.where(table.c.validtime < pd.to_datetime(end).date())
+    return _read_sql(engine, query, PREDICTION_DTYPES, chunksize=chunksize)
 
 
 def prepare_flights(df_flight):
@@ -104,13 +206,14 @@ def prepare_flights(df_flight):
     return df_flight
 
 
-def get_flights(target_id, engine):
-    df = read_flights(target_id, engine)
-    return prepare_flights(df)
+def get_flights(engine, target_id, start=None, end=None):
+    """Flights of a site as prepared by ``prepare_flights``, read from the
+    flight feature table (kept up to date by ``features.refresh``)."""
+    return features.read_features(engine, target_id, start, end)
 
 
-def get_predictions(target_id, engine):
-    df = read_predictions(target_id, engine)
+def get_predictions(engine, target_id, **kwargs):
+    df = read_predictions(engine, target_id, **kwargs)
     return df
 
 
@@ -133,8 +236,9 @@ def to_wind_components(dataset, inverse=False):
         wind_components = mpcalc.wind_components(
             dataset["SKNT"].values * units.knots, dataset["DRCT"].values * units.deg
         )
-        dataset["U"] = (dataset.coords, wind_components[0].magnitude)
-        dataset["V"] = (dataset.coords, wind_components[1].magnitude)
+        dims = dataset["SKNT"].dims
+        dataset["U"] = (dims, wind_components[0].magnitude)
+        dataset["V"] = (dims, wind_components[1].magnitude)
         dataset["U"].attrs["units"] = "knot"
         dataset["U"] = dataset["U"].astype("float32")
         dataset["V"].attrs["units"] = "knot"
@@ -142,14 +246,15 @@ def to_wind_components(dataset, inverse=False):
         dataset = dataset.drop_vars(("SKNT", "DRCT"))
 
     else:
+        dims = dataset["U"].dims
         dataset["SKNT"] = (
-            dataset.coords,
+            dims,
             mpcalc.wind_speed(
                 dataset["U"].values * units.knots, dataset["V"].values * units.knots
             ).magnitude,
         )
         dataset["DRCT"] = (
-            dataset.coords,
+            dims,
             mpcalc.wind_direction(
                 dataset["U"].values * units.knots, dataset["V"].values * units.knots
             ).magnitude,
@@ -6,11 +6,11 @@ from pathlib import Path
 
 import numpy as np
 import pandas as pd
-import requests
 import xarray as xr
 from bs4 import BeautifulSoup
 
 import startleiter.scraping as scr
+from startleiter import httpclient
 from startleiter.database import Source, Station
 from startleiter.database import Database
 from startleiter.utils import to_wind_components
@@ -154,7 +154,11 @@ def scrape(station_name, from_validtime, to_validtime=None):
     query_url = scr.build_query(SEARCH_URL, DEFAULT_QUERY, this_query)
     LOGGER.info(query_url)
 
-    page = requests.get(query_url)
+    # past soundings never change, so they can be cached for a long time
+    last_validtime = to_validtime or from_validtime
+    archived = datetime.utcnow() - last_validtime > timedelta(days=2)
+    max_age = httpclient.HTTP_CFG.get("archive_max_age") if archived else None
+    page = httpclient.get(query_url, max_age=max_age)
     soup = BeautifulSoup(page.content, "html.parser")
 
     return sounding(soup)
@@ -1,11 +1,17 @@
 import logging
 import os
-import random
 import time
+import weakref
 from datetime import datetime, timedelta
+from pathlib import Path
 
 
+import lxml.html
+import numpy as np
+import pandas as pd
+import requests
 from bs4 import BeautifulSoup
+from lxml import etree
 from selenium.common.exceptions import (
     TimeoutException,
     StaleElementReferenceException,
@@ -17,16 +23,23 @@ from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.support.ui import WebDriverWait
 
 import startleiter.scraping as scr
+from startleiter import climatology, httpclient, metrics, scheduler
 from startleiter.database import Site, Source, Flight
 from startleiter.database import Database
 from startleiter import config as CFG
+from startleiter.frontier import CrawlFrontier
+from startleiter.prediction import get_site_ids
+from startleiter.resilience import CircuitOpenError
 
 LOGGER = logging.getLogger(__name__)
+XCONTEST_CFG = CFG["xcontest"]
 TIME_START = time.monotonic()
 NUM_FLIGHTS_PER_SITE = 20
 BUFFER_DAYS = 3
 COUNTER = 0
-STOP_AFTER = 60
+NOT_AUTHORIZED = "You are not authorized to see the flight"
+# HTTP session of each browser of the pool
+_HTTP_SESSIONS = weakref.WeakKeyDictionary()
 BASE_URL = "https://www.xcontest.org"
 SEARCH_URL = BASE_URL + "/world/en/flights-search"
 DEFAULT_QUERY = {
@@ -55,7 +68,9 @@ def login_xcontest(browser):
     browser.find_element(By.ID, "login-password").send_keys(password)
     browser.find_element(By.CLASS_NAME, "submit").submit()
     try:
-        browser.find_element(By.XPATH, "//input[@class='submit short' and @value='Storno']").click()
+        browser.find_element(
+            By.XPATH, "//input[@class='submit short' and @value='Storno']"
+        ).click()
     except NoSuchElementException:
         pass
     else:
@@ -94,6 +109,118 @@ def _flight_details_href(row):
     return None
 
 
+# compiled once, evaluated relative to each row of the listing
+_ROWS = etree.XPath("//table[contains(@class, 'flights')]/tbody/tr")
+_CELLS = etree.XPath("td")
+_TITLE = etree.XPath("string((.//div)[1]/@title)")
+_DETAIL_HREF = etree.XPath(
+    "string((.//div//a[contains(concat(' ', @class, ' '), ' detail ')])[1]/@href)"
+)
+LISTING_COLUMNS = [
+    "flid",
+    "flno",
+    "datetime",
+    "pilot",
+    "launch",
+    "route",
+    "length_km",
+    "points",
+    "glider_cat",
+    "glider",
+    "url",
+]
+
+
+def parse_listing_html(page_source, max_flights=None) -> pd.DataFrame:
+    """Extract the flight summaries of a listing page in a single pass.
+
+    Same fields as ``flight_summary`` and ``_flight_details_href``, but with
+    lxml and precompiled XPath expressions. All values are strings, see
+    ``convert_listing`` for the typed columns.
+    """
+    rows = []
+    for n, row in enumerate(_ROWS(lxml.html.fromstring(page_source))):
+        if max_flights is not None and len(rows) >= max_flights:
+            break
+        cells = _CELLS(row)
+        if len(cells) < 10 or not cells[0].get("title", "").startswith("FLID:"):
+            LOGGER.error(f"Failed to parse flight {n}")
+            continue
+        href = _DETAIL_HREF(row)
+        rows.append(
+            (
+                cells[0].get("title").split(":")[1],
+                *[cell.text_content().strip() for cell in cells[:4]],
+                _TITLE(cells[4]),
+                *[cell.text_content().strip() for cell in cells[5:8]],
+                _TITLE(cells[7]),
+                BASE_URL + href if href else None,
+            )
+        )
+    return pd.DataFrame(rows, columns=LISTING_COLUMNS, dtype=object)
+
+
+def convert_listing(raw: pd.DataFrame) -> pd.DataFrame:
+    """Typed columns of a listing (see ``parse_listing_html``), vectorized
+    over all rows. Rows that cannot be parsed are dropped.
+
+    Datetimes are converted to UTC. Same values as ``preprocess_xcontest``.
+    """
+    start = raw["datetime"].str.extract(
+        r"^(?P<local>\d\d\.\d\d\.\d\d \d\d:\d\d)UTC(?P<offset>[+-]\d\d:\d\d)?$"
+    )
+    offset = start["offset"].fillna("+00:00")
+    offset_minutes = offset.str[1:3].astype(float) * 60 + offset.str[4:6].astype(float)
+    offset_minutes = offset_minutes.where(offset.str[0] == "+", -offset_minutes)
+    local = pd.to_datetime(start["local"], format="%d.%m.%y %H:%M", errors="coerce")
+    df = pd.DataFrame(
+        {
+            "flid": pd.to_numeric(raw["flid"], errors="coerce"),
+            "flno": pd.to_numeric(raw["flno"], errors="coerce"),
+            "datetime": (
+                local - pd.to_timedelta(offset_minutes, unit="min")
+            ).dt.tz_localize("UTC"),
+            "pilot": raw["pilot"].str[2:],
+            "launch": raw["launch"].str[2:],
+            "route": raw["route"],
+            "length_km": pd.to_numeric(
+                raw["length_km"].str.replace(" km", "", regex=False), errors="coerce"
+            ),
+            "points": pd.to_numeric(
+                raw["points"].str.replace(" p.", "", regex=False), errors="coerce"
+            ),
+            "glider": raw["glider"].where(raw["glider"] != "", None),
+            "glider_cat": raw["glider_cat"],
+            "url": raw["url"],
+        }
+    )
+    invalid = df[["flid", "flno", "datetime", "length_km", "points"]].isna().any(axis=1)
+    for n in np.flatnonzero(invalid):
+        LOGGER.error(f"Could not parse {raw.iloc[n].tolist()}")
+    df = df[~invalid]
+    return df.astype({"flid": "int64", "flno": "int64"}).reset_index(drop=True)
+
+
+def read_listing_dumps(paths) -> pd.DataFrame:
+    """Typed flight summaries of saved listing pages, converted in one chunk."""
+    raw = [parse_listing_html(Path(path).read_bytes()) for path in paths]
+    if not raw:
+        return convert_listing(parse_listing_html("<html></html>"))
+    listing = convert_listing(pd.concat(raw, ignore_index=True))
+    return listing.drop_duplicates("flid", keep="last", ignore_index=True)
+
+
+def listing_records(listing: pd.DataFrame, source_id, site_id) -> list[dict]:
+    """Flight table rows (without the details) of a converted listing."""
+    df = listing.drop(columns=["launch", "url"]).assign(
+        source_id=source_id, site_id=site_id
+    )
+    records = df.astype(object).where(df.notna(), None).to_dict("records")
+    for record, dt in zip(records, listing["datetime"].dt.to_pydatetime()):
+        record["datetime"] = dt
+    return records
+
+
 def _parse_table(soup, class_name):
     table = soup.find("table", attrs={"class": class_name})
     table_body = table.find("tbody")
@@ -106,12 +233,33 @@ def _parse_table(soup, class_name):
     return content
 
 
-def flight_details(flight, browser):
+def parse_details(page_source):
+    """Parse the flight details from the HTML of a flight detail page.
+
+    Returns
+    -------
+    details: list
+        airtime, max. altitude, max. alt. gain, max. climb, max. sink, tracklog length, free distance
+    """
+    if NOT_AUTHORIZED in page_source:
+        raise PermissionError("Not authorized to see the flight")
+    soup = BeautifulSoup(page_source, "html.parser")
+    subsoup = soup.find("div", attrs={"class": "XCmoreInfo"})
+    if subsoup is None:
+        raise ValueError("No flight details found")
+    details = _parse_table(subsoup, "XCinfo")
+    details = [detail[0] if detail else None for detail in details]
+    LOGGER.debug(details)
+    return details
+
+
+def flight_details(url, browser):
     """Parse flight detail data from a given query.
 
     Parameters
     ----------
-    flight
+    url: str
+        URL of the flight detail page.
     browser
 
     Returns
@@ -119,10 +267,6 @@ def flight_details(flight, browser):
     details: list
         airtime, max. altitude, max. alt. gain, max. climb, max. sink, tracklog length, free distance
     """
-    href = _flight_details_href(flight)
-    if not href:
-        return None
-    url = BASE_URL + href
     LOGGER.debug(url)
 
     # browser.delete_all_cookies()  # after this, will need to login again!
@@ -130,118 +274,197 @@ def flight_details(flight, browser):
     loaded = scr.wait_till_loaded(browser, url)
     if not loaded:
         raise WebDriverException
-    authorized = "You are not authorized to see the flight" not in browser.page_source
+    authorized = NOT_AUTHORIZED not in browser.page_source
     if not authorized:
         raise WebDriverException("Not authorized to see the flight")
     element = WebDriverWait(
         browser, 20, ignored_exceptions=StaleElementReferenceException
     ).until(EC.element_to_be_clickable((By.LINK_TEXT, "Flight")))
     element.click()
-    soup = BeautifulSoup(browser.page_source, "html.parser")
-    subsoup = soup.find("div", attrs={"class": "XCmoreInfo"})
-    details = _parse_table(subsoup, "XCinfo")
-    details = [detail[0] if isinstance(detail, list) else None for detail in details]
-    LOGGER.debug(details)
+    return parse_details(browser.page_source)
+
+
+def http_session(browser) -> requests.Session:
+    """Pooled HTTP session sharing the cookies of the (logged in) browser."""
+    session = _HTTP_SESSIONS.get(browser)
+    if session is None:
+        session = httpclient.new_session()
+        for cookie in browser.get_cookies():
+            session.cookies.set(
+                cookie["name"],
+                cookie["value"],
+                domain=cookie.get("domain"),
+                path=cookie.get("path", "/"),
+            )
+        _HTTP_SESSIONS[browser] = session
+    return session
+
+
+def flight_details_http(url, session):
+    """Download and parse the flight detail page without a browser."""
+    resp = httpclient.get(url, use_cache=False, session=session)
+    resp.raise_for_status()
+    return parse_details(resp.text)
+
+
+def fetch_flight_details(url, browser):
+    """Get the flight details over plain HTTP, with the browser as fallback.
+
+    The number of flights that went through each path is counted in the
+    ``xcontest.details.*`` metrics.
+    """
+    try:
+        details = flight_details_http(url, http_session(browser))
+    except PermissionError:
+        metrics.increment("xcontest.details.failed")
+        raise
+    except (
+        requests.RequestException,
+        CircuitOpenError,
+        ValueError,
+        AttributeError,
+    ) as err:
+        LOGGER.debug(f"HTTP fetch of {url} failed ({err!r}), using the browser")
+    else:
+        metrics.increment("xcontest.details.http")
+        return details
+    try:
+        details = flight_details(url, browser)
+    except Exception:
+        metrics.increment("xcontest.details.failed")
+        raise
+    metrics.increment("xcontest.details.selenium")
     return details
 
 
-def parse_flights(browser, pace):
-    """Loop all flights for a given query on xcontest.org, extract
-    flight summary and details.
+def parse_listing(browser, max_flights=NUM_FLIGHTS_PER_SITE) -> pd.DataFrame:
+    """Parse the flight summaries and detail page URLs of a listing page.
 
-    Parameters
-    ----------
-    browser: selenium.WebDriver
-        A selenium-webdriver client.
-    pace: int
-        The desired pacing in number of requests per hour.
+    Stops at the first flight that is less than ``BUFFER_DAYS`` old.
 
     Returns
     -------
-
+    pandas.DataFrame
+        Typed flight summaries and detail URL (None if not found), see
+        ``convert_listing``.
     """
-    global COUNTER
+    listing = convert_listing(parse_listing_html(browser.page_source, max_flights))
+    too_recent = listing["datetime"] > pd.Timestamp.now(tz="UTC") - pd.Timedelta(
+        days=BUFFER_DAYS
+    )
+    if too_recent.any():
+        first = too_recent.to_numpy().argmax()
+        LOGGER.warning(
+            f"Available flights are less than {BUFFER_DAYS} day old ({listing['datetime'].iloc[first].isoformat()}), skipping."
+        )
+        listing = listing.iloc[:first]
+    return listing
 
-    soup = BeautifulSoup(browser.page_source, "html.parser")
-    table = soup.find("table", attrs={"class": "flights"})
-    table_body = table.find("tbody")
-    flights = table_body.find_all("tr")
-
-    t0 = time.monotonic()
-    total_sleep = 0
-    consecutive_timeouts = 0
-    flights_data = []
-    for n, flight in enumerate(flights):
-        flight_data = []
-
-        # Parse flight summary
-        try:
-            summary = flight_summary(flight)
-        except (AttributeError, IndexError):
-            LOGGER.error(f"Failed to parse flight {n}")
-            continue
 
-        flight_datetime_str = (
-            f"{summary[2]}+00:00" if summary[2][-3:] == "UTC" else summary[2]
-        )
-        flight_datetime = datetime.strptime(
-            flight_datetime_str, "%d.%m.%y %H:%MUTC%z"
-        ).replace(tzinfo=None)
-        if datetime.utcnow() - flight_datetime < timedelta(days=BUFFER_DAYS):
-            LOGGER.warning(
-                f"Available flights are less than {BUFFER_DAYS} day old ({flight_datetime.isoformat()}), skipping."
-            )
-            break
+def load_listing(browser, site, offset, rate_limiter, max_flights=NUM_FLIGHTS_PER_SITE):
+    """Load and parse the listing page of a site starting at ``offset``."""
+    this_query = {
+        "list[start]": offset,
+        "filter[point]": f"{site['longitude']}%20{site['latitude']}",
+        "filter[radius]": site["radius"],
+    }
+    query_url = scr.build_query(SEARCH_URL, DEFAULT_QUERY, this_query)
+    LOGGER.info(query_url)
+    rate_limiter.acquire()
+    browser.get(query_url)
+    wait = WebDriverWait(browser, 30)
+    wait.until(EC.title_contains("Worldwide flights search"))
+    return parse_listing(browser, max_flights)
 
-        flight_data += summary
-
-        # Parse flight details
-        try:
-            details = flight_details(flight, browser)
-        except (AttributeError, TimeoutException, WebDriverException) as e:
-            details = [None] * 7
-            if e.__class__.__name__ == "TimeoutException":
-                consecutive_timeouts += 1
-                print("T", end="", flush=True)
-            else:
-                print("F", end="", flush=True)
-        else:
-            print(".", end="", flush=True)
-            consecutive_timeouts = 0
-        finally:
-            flight_data += details
 
-        if consecutive_timeouts > 3:
-            raise TimeoutException
+def fetch_details(db, frontier, pool, limit):
+    """Fetch the details of up to ``limit`` pending flights of the frontier.
 
-        # TODO: Parse flight track
+    The details are written to the database in batches of
+    ``NUM_FLIGHTS_PER_SITE`` flights as they come in.
 
-        flights_data.append(flight_data)
-        total_sleep = scr.pacing(n, len(flights), t0, pace, total_sleep)
-        COUNTER += 1
+    Returns
+    -------
+    int
+        Number of flights for which the details were retrieved.
+    """
+    global COUNTER
 
-        if COUNTER == STOP_AFTER:
-            break
-        if n + 1 == NUM_FLIGHTS_PER_SITE:
-            break
+    pending = frontier.pending(limit)
+    flids = {url: flid for flid, url in pending.items()}
+    rows, errors = [], {}
+    n_done = 0
+
+    def write():
+        nonlocal rows, errors, n_done
+        db.update(Flight, rows)
+        frontier.done([row["flid"] for row in rows])
+        frontier.failed(errors)
+        n_done += len(rows)
+        rows, errors = [], {}
 
+    for url, details, error in pool.map(fetch_flight_details, pending.values()):
+        COUNTER += 1
+        if error is None:
+            try:
+                rows.append({"flid": flids[url], **details_columns(details)})
+            except (ValueError, TypeError, IndexError) as err:
+                error = err
+        if error is None:
+            print(".", end="", flush=True)
+        else:
+            errors[flids[url]] = error
+            print(
+                "T" if isinstance(error, TimeoutException) else "F", end="", flush=True
+            )
+        if len(rows) + len(errors) >= NUM_FLIGHTS_PER_SITE:
+            write()
+    write()
     print("")
-    return flights_data
+    return n_done
+
+
+def details_columns(details):
+    """Reformat raw xcontest flight details to database columns"""
+    airtime = details[0] if details[0] is None else details[0].split(":")[:2]
+    altitude = details[1] if details[1] is None else details[1].replace(" m", "")
+    alt_gain = details[2] if details[2] is None else details[2].replace(" m", "")
+    max_climb = details[3] if details[3] is None else details[3].replace(" m/s", "")
+    max_sink = details[4] if details[4] is None else details[4].replace(" m/s", "")
+    tracklog_length = (
+        details[5] if details[5] is None else details[5].replace(" km", "")
+    )
+    free_distance = details[6] if details[6] is None else details[6].split("/")
+    return {
+        "airtime": (
+            airtime
+            if airtime is None
+            else timedelta(hours=int(airtime[0]), minutes=int(airtime[1]))
+        ),
+        "max_altitude_m": altitude if altitude is None else int(altitude),
+        "max_alt_gain_m": alt_gain if alt_gain is None else int(alt_gain),
+        "max_climb_ms": max_climb if max_climb is None else float(max_climb),
+        "max_sink_ms": max_sink if max_sink is None else float(max_sink),
+        "tracklog_length_km": (
+            tracklog_length if tracklog_length is None else float(tracklog_length)
+        ),
+        "free_distance_1_km": (
+            free_distance
+            if free_distance is None
+            else float(free_distance[0].replace(" km", ""))
+        ),
+        "free_distance_2_km": (
+            free_distance
+            if free_distance is None
+            else float(free_distance[1].replace(" km", ""))
+        ),
+    }
 
 
 def preprocess_xcontest(flight, source_id, site_id):
     """Reformat raw xcontest data before appending to the database"""
     try:
         datetime_str = f"{flight[2]}+00:00" if flight[2][-3:] == "UTC" else flight[2]
-        airtime = flight[11] if flight[11] is None else flight[11].split(":")[:2]
-        altitude = flight[12] if flight[12] is None else flight[12].replace(" m", "")
-        alt_gain = flight[13] if flight[13] is None else flight[13].replace(" m", "")
-        max_climb = flight[14] if flight[14] is None else flight[14].replace(" m/s", "")
-        max_sink = flight[15] if flight[15] is None else flight[15].replace(" m/s", "")
-        tracklog_length = (
-            flight[16] if flight[16] is None else flight[16].replace(" km", "")
-        )
-        free_distance = flight[17] if flight[17] is None else flight[17].split("/")
         out = {
             "source_id": source_id,
             "site_id": site_id,
@@ -254,22 +477,7 @@ def preprocess_xcontest(flight, source_id, site_id):
             "points": float(flight[7].replace(" p.", "")),
             "glider": flight[9] if flight[9] else None,
             "glider_cat": flight[8],
-            "airtime": airtime
-            if airtime is None
-            else timedelta(hours=int(airtime[0]), minutes=int(airtime[1])),
-            "max_altitude_m": altitude if altitude is None else int(altitude),
-            "max_alt_gain_m": alt_gain if alt_gain is None else int(alt_gain),
-            "max_climb_ms": max_climb if max_climb is None else float(max_climb),
-            "max_sink_ms": max_sink if max_sink is None else float(max_sink),
-            "tracklog_length_km": tracklog_length
-            if tracklog_length is None
-            else float(tracklog_length),
-            "free_distance_1_km": free_distance
-            if free_distance is None
-            else float(free_distance[0].replace(" km", "")),
-            "free_distance_2_km": free_distance
-            if free_distance is None
-            else float(free_distance[1].replace(" km", "")),
+            **details_columns(flight[11:]),
         }
     except ValueError:
         LOGGER.error(f"Could not parse {flight}")
@@ -277,19 +485,85 @@ def preprocess_xcontest(flight, source_id, site_id):
     return out
 
 
-def query_last_flight_id(db, site_id):
-    obj = (
-        db.session.query(Flight)
-        .filter_by(site_id=site_id)
-        .order_by(Flight.flno.desc())
-        .first()
-    )
-    flight_no = 0 if obj is None else obj.flno
-    return flight_no
+def add_listing(db, frontier, listing, source_id, site_id, only=None):
+    """Store the flight summaries (without details) and add their detail URLs
+    to the frontier. With ``only``, restrict to these flight ids."""
+    if only is not None:
+        listing = listing[listing["flid"].isin(list(only))]
+    db.upsert(Flight, listing_records(listing, source_id, site_id))
+    urls = listing.dropna(subset=["url"])
+    return frontier.add(dict(zip(urls["flid"].tolist(), urls["url"])))
 
 
-def main(site, pace):
-    """Main scraping routine for xcontest.org"""
+def discover_new_flights(
+    browser, site, frontier, db, source_id, site_id, rate_limiter, budget
+):
+    """Crawl the listing from the checkpoint until ``budget`` flights are pending.
+
+    Returns True if the end of the listing was reached.
+    """
+    offset = frontier.offset()
+    LOGGER.info(f"Starting querying from flight no. {offset}.")
+    while len(frontier.pending(budget)) < budget:
+        listing = load_listing(browser, site, offset, rate_limiter)
+        if len(listing):
+            add_listing(db, frontier, listing, source_id, site_id)
+            offset = int(listing["flno"].iloc[-1])
+            frontier.advance(offset)
+        if len(listing) < NUM_FLIGHTS_PER_SITE:
+            return True
+    return False
+
+
+def discover_missing_details(
+    browser, site, frontier, db, source_id, site_id, rate_limiter, budget
+):
+    """Re-detail queue: find the detail URLs of stored flights without details
+    (e.g. scraped before the frontier existed) by loading their listing pages.
+
+    The listing pages count against ``budget``, and the flights not found on
+    their page are given up, so that their page is not loaded again.
+
+    Returns
+    -------
+    int
+        Number of listing pages loaded.
+    """
+    missing = frontier.missing_details()
+    pages = 0
+    while missing and pages + len(frontier.pending(budget)) < budget:
+        offset = missing[0][0] - 1
+        listing = load_listing(browser, site, offset, rate_limiter)
+        pages += 1
+        on_page = {
+            flid for flno, flid in missing if flno <= offset + NUM_FLIGHTS_PER_SITE
+        }
+        add_listing(db, frontier, listing, source_id, site_id, only=on_page)
+        found = set(listing.loc[listing["url"].notna(), "flid"].tolist())
+        frontier.not_found(on_page - found)
+        missing = [(flno, flid) for flno, flid in missing if flid not in on_page]
+    if pages:
+        LOGGER.info(f"Loaded {pages} listing pages to complete older flights.")
+    return pages
+
+
+def main(site, pool, rate_limiter, budget):
+    """Main scraping routine for xcontest.org
+
+    New flights are discovered from the checkpoint of the site, then the
+    details of the pending flights are fetched. Everything is recorded in the
+    crawl frontier, so that an interrupted run resumes where it stopped.
+
+    Parameters
+    ----------
+    site: dict
+    pool: startleiter.scraping.BrowserPool
+        The browsers fetching the flight details.
+    rate_limiter: startleiter.scraping.RateLimiter
+        The limiter shared with the pool, acquired before each listing page.
+    budget: int
+        Maximum number of flight details to fetch (see ``scheduler.plan``).
+    """
 
     db = Database()
 
@@ -297,40 +571,20 @@ def main(site, pace):
     source_id = db.add(Source, source)
     site.update({"source_id": source_id})
     site_id = db.add(Site, site)
+    frontier = CrawlFrontier(db, site_id)
 
     browser = scr.launch_browser()
     browser = login_xcontest(browser)
 
     try:
-        id_start = query_last_flight_id(db, site_id)
-        LOGGER.info(f"Starting querying from flight no. {id_start}.")
-        while COUNTER < STOP_AFTER:
-            LOGGER.debug(
-                f"XContest Flight Chunk {id_start} to {id_start + min(STOP_AFTER - 1, NUM_FLIGHTS_PER_SITE)}"
-            )
-            this_query = {
-                "list[start]": id_start,
-                "filter[point]": f"{site['longitude']}%20{site['latitude']}",
-                "filter[radius]": site["radius"],
-            }
-            query_url = scr.build_query(SEARCH_URL, DEFAULT_QUERY, this_query)
-            LOGGER.info(query_url)
-            browser.get(query_url)
-            wait = WebDriverWait(browser, 30)
-            wait.until(EC.title_contains("Worldwide flights search"))
-
-            flight_chunk = parse_flights(browser, pace)
-            if flight_chunk:
-                db.add_all(
-                    Flight,
-                    flight_chunk,
-                    preprocess_fn=preprocess_xcontest,
-                    preprocess_kwargs={"source_id": source_id, "site_id": site_id},
-                )
-            if len(flight_chunk) == NUM_FLIGHTS_PER_SITE:
-                id_start += NUM_FLIGHTS_PER_SITE
-            else:
-                break
+        args = (browser, site, frontier, db, source_id, site_id, rate_limiter, budget)
+        if discover_new_flights(*args):
+            scheduler.mark_caught_up(db, site_id)
+        budget -= discover_missing_details(*args)
+        fetch_details(db, frontier, pool, budget)
+        # refreshes the flight features too
+        climatology.update(db.engine, site_id)
+        LOGGER.info(f"Crawl frontier: {frontier.stats()}")
 
     except TimeoutException as err:
         time_lapsed = time.monotonic() - TIME_START
@@ -351,15 +605,24 @@ if __name__ == "__main__":
         datefmt="%Y-%m-%d:%H:%M:%S",
         level=logging.INFO,
     )
-    sites = list(CFG["sites"].items())
-    random.shuffle(sites)
-    for site_name, site in sites:
-        LOGGER.info(f"Site: {site_name}")
-        main(site, pace=400)
-        if COUNTER >= STOP_AFTER:
-            break
+    sites = CFG["sites"]
+    db = Database()
+    source_id = db.add(Source, CFG["sources"]["xcontest"])
+    site_ids = get_site_ids(db, sites.items(), source_id)
+    schedule = scheduler.plan(db, site_ids, XCONTEST_CFG["budget"])
+    LOGGER.info(f"Crawl schedule:\n{scheduler.report(schedule)}")
+    rate_limiter = scr.RateLimiter(XCONTEST_CFG["pace"], XCONTEST_CFG["burst"])
+    with scr.BrowserPool(
+        XCONTEST_CFG["workers"], setup=login_xcontest, rate_limiter=rate_limiter
+    ) as pool:
+        for entry in schedule:
+            if entry.budget == 0:
+                continue
+            LOGGER.info(f"Site: {entry.name} (budget: {entry.budget})")
+            main(sites[entry.name], pool, rate_limiter, entry.budget)
 
     time_lapsed = time.monotonic() - TIME_START
     LOGGER.info(
         f"Successfully retrieved {COUNTER} flight records in {time_lapsed / 60:.1f} minutes."
     )
+    LOGGER.info(f"Flight details per path: {metrics.snapshot('xcontest.details')}")
@@ -0,0 +1,49 @@
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pytest
+
+
+def random_flights(
+    n, seed=0, start=datetime(2022, 1, 1, tzinfo=timezone.utc), years=2, valid=False
+):
+    """Flights of site 1 at random times over ``years`` years from ``start``.
+
+    Unless ``valid``, some of them are filtered out by ``prepare_flights``
+    (too short, too low or too high, hang gliders) or lack their details.
+    """
+    rng = np.random.default_rng(seed)
+    seconds = np.sort(rng.choice(years * 365 * 86400, n, replace=False))
+    flights = []
+    for i, s in enumerate(seconds):
+        details = valid or i % 5
+        flights.append(
+            {
+                "source_id": 1,
+                "site_id": 1,
+                "flid": i,
+                "flno": i,
+                "datetime": start + timedelta(seconds=int(s)),
+                "length_km": float(rng.uniform(3 if valid else 0, 100)),
+                "max_altitude_m": (
+                    int(rng.uniform(1500, 4000) if valid else rng.uniform(500, 5500))
+                    if details
+                    else None
+                ),
+                "airtime": (
+                    timedelta(minutes=int(rng.integers(5, 400))) if details else None
+                ),
+                "glider_cat": (
+                    "FAI-3 PG"
+                    if valid
+                    else ["FAI-3 PG", "HGFAI-1 HG", "FAI-2 PG"][i % 3]
+                ),
+            }
+        )
+    return flights
+
+
+@pytest.fixture
+def make_flights():
+    """Factory of random flights, see ``random_flights``."""
+    return random_flights
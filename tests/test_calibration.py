@@ -0,0 +1,43 @@
+import pickle
+import shutil
+
+import numpy as np
+import pytest
+
+from startleiter import calibration
+
+CURVE = "models/flyability_calibration_curve"
+
+
+def test_table_matches_pickled_curve():
+    pytest.importorskip("sklearn")
+    with open(f"{CURVE}.pkl", "rb") as f:
+        estimator = pickle.load(f)
+    table = calibration.load(CURVE)
+    prob = np.linspace(-0.1, 1.1, 10001)
+    np.testing.assert_allclose(
+        table.predict(prob), estimator.predict(prob), rtol=0, atol=1e-9
+    )
+    assert np.all(np.diff(table.y) >= 0)
+    # batches of any shape in a single call
+    batch = prob[:10000].reshape(100, 10, 10)
+    assert table.predict(batch).shape == batch.shape
+
+
+def test_load_falls_back_to_pickle(tmp_path):
+    pytest.importorskip("sklearn")
+    shutil.copy(f"{CURVE}.pkl", tmp_path)
+    fallback = calibration.load(tmp_path / "flyability_calibration_curve")
+    table = calibration.load(CURVE)
+    np.testing.assert_array_equal(fallback.x, table.x)
+    np.testing.assert_array_equal(fallback.y, table.y)
+
+
+def test_from_estimator_without_thresholds():
+    class Estimator:
+        def predict(self, x):
+            return np.sqrt(x)
+
+    table = calibration.from_estimator(Estimator())
+    prob = np.random.default_rng(0).random(1000)
+    np.testing.assert_allclose(table.predict(prob), np.sqrt(prob), atol=1e-2)
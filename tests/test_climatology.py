@@ -0,0 +1,58 @@
+from datetime import date, datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+from startleiter import climatology, utils
+from startleiter.database import Database, Flight
+
+TODAY = date(2023, 6, 30)
+
+
+def notebook_climatology(df_flight, end):
+    """Reference curves as previously computed in the monitoring report."""
+    ts = df_flight.set_index("datetime").sort_index()
+    ts = ts[["date", "max_altitude_m", "length_km", "airtime_hours"]]
+    ts.loc[pd.Timestamp(end)] = None
+    clim = ts.resample("1D").mean(numeric_only=True)
+    clim = clim.groupby(clim.index.isocalendar().week)
+    clim = clim.rolling("2190D").mean().reset_index(0, drop=True)
+    clim = clim.sort_index().rolling("20D", center=True).mean()
+    counts = ts.date.resample("1D").count()
+    counts = counts.where(counts > 0)
+    counts = counts.groupby(counts.index.isocalendar().week)
+    counts = counts.rolling("2190D").mean().reset_index(0, drop=True)
+    clim["n_flights"] = counts.sort_index().rolling("20D", center=True).mean()
+    return clim
+
+
+def test_climatology_matches_notebook(tmp_path, make_flights):
+    db = Database(f"sqlite:///{tmp_path}/test.db")
+    db.migrate()
+    flights = make_flights(
+        8000, start=datetime(2016, 1, 1, tzinfo=timezone.utc), years=7, valid=True
+    )
+    db.upsert(Flight, flights[:7000])
+    end = flights[6999]["datetime"].date()
+    assert climatology.update(db.engine, 1, today=end) > 2000
+    # incremental update with the next flights
+    db.upsert(Flight, flights[7000:])
+    n_days = (TODAY - end).days + climatology.REVISE_DAYS + 1
+    assert climatology.update(db.engine, 1, today=TODAY) == n_days
+
+    actual = climatology.query(db.engine, 1, days=90, end=TODAY)
+    df_flight = utils.prepare_flights(utils.read_flights(db.engine, 1))
+    expected = notebook_climatology(df_flight, TODAY)
+    expected = expected.loc[actual.index, climatology.VARIABLES]
+    assert len(actual) == 90
+    np.testing.assert_allclose(actual, expected, rtol=1e-6)
+
+
+def test_get_climatology_is_read_only(tmp_path, make_flights):
+    db = Database(f"sqlite:///{tmp_path}/test.db")
+    db.migrate()
+    db.upsert(Flight, make_flights(100, valid=True))
+    assert climatology.get_climatology(db.engine, 1).empty
+    with db.engine.connect() as con:
+        for table in ("flight_feature", "climatology"):
+            assert con.exec_driver_sql(f"SELECT COUNT(*) FROM {table}").scalar() == 0
@@ -0,0 +1,130 @@
+import csv
+from datetime import date
+from types import SimpleNamespace
+
+from startleiter.database import Database, Flight, Prediction
+
+
+def make_prediction(leadtime_days, flying_probability):
+    return {
+        "source_id": 1,
+        "site_id": 1,
+        "reftime": date(2023, 6, 1),
+        "validtime": date(2023, 6, 1 + leadtime_days),
+        "leadtime_days": leadtime_days,
+        "flying_probability": flying_probability,
+        "max_altitude_masl": 2000.0,
+        "max_distance_km": 50.0,
+    }
+
+
+def test_upsert_skips_duplicates(tmp_path):
+    db = Database(f"sqlite:///{tmp_path}/test.db")
+    db.migrate()
+    flights = [{"source_id": 1, "site_id": 1, "flid": i, "flno": i} for i in range(5)]
+    assert db.upsert(Flight, flights[:3], batch_size=2) == (3, 0)
+    assert db.upsert(Flight, flights, batch_size=2) == (2, 0)
+    assert db.session.query(Flight).count() == 5
+
+
+def test_upsert_keeps_entries_with_null_keys(tmp_path):
+    db = Database(f"sqlite:///{tmp_path}/test.db")
+    db.migrate()
+    flights = [
+        {"source_id": 1, "site_id": 1, "flid": None, "flno": i} for i in range(3)
+    ]
+    flights += [{"source_id": 1, "site_id": 1, "flid": 7, "flno": i} for i in range(2)]
+    assert db.upsert(Flight, flights) == (4, 0)
+    assert db.session.query(Flight).count() == 4
+
+
+def test_upsert_updates_existing(tmp_path):
+    db = Database(f"sqlite:///{tmp_path}/test.db")
+    db.migrate()
+    db.upsert(Prediction, [make_prediction(0, 0.1), make_prediction(1, 0.2)])
+    inserted, updated = db.upsert(
+        Prediction, [make_prediction(1, 0.9), make_prediction(2, 0.3)], update=True
+    )
+    assert (inserted, updated) == (1, 1)
+    probs = [p.flying_probability for p in db.session.query(Prediction)]
+    assert sorted(probs) == [0.1, 0.3, 0.9]
+
+
+def test_bulk_load_falls_back_to_upsert(tmp_path):
+    db = Database(f"sqlite:///{tmp_path}/test.db")
+    db.migrate()
+    entries = [{"flid": 1}, None, {"flid": 2}]
+    inserted, _ = db.bulk_load(
+        Flight,
+        entries,
+        preprocess_fn=lambda e, **kw: e and dict(e, **kw),
+        preprocess_kwargs={"source_id": 1, "site_id": 1},
+    )
+    assert inserted == 2
+
+
+class FakeCursor:
+    def __init__(self, log):
+        self.log = log
+
+    def execute(self, sql):
+        self.log["sql"].append(sql)
+
+    def copy_expert(self, sql, buffer):
+        self.log["rows"] = list(csv.reader(buffer))
+
+    def fetchall(self):
+        return [(True,)] * len(self.log["rows"])
+
+
+class FakeConnection:
+    def __init__(self, log):
+        self.log = log
+
+    def cursor(self):
+        return FakeCursor(self.log)
+
+    def commit(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def test_bulk_load_dedupes_as_upsert(tmp_path):
+    flights = [
+        {"source_id": 1, "site_id": 1, "flid": 7, "flno": 1},
+        {"source_id": 1, "site_id": 1, "flid": None, "flno": 2},
+        {"source_id": 1, "site_id": 1, "flid": None, "flno": 3},
+        {"source_id": 1, "site_id": 1, "flid": 7, "flno": 4},
+    ]
+    db = Database(f"sqlite:///{tmp_path}/test.db")
+    db.migrate()
+    assert db.bulk_load(Flight, flights) == (3, 0)
+    rows = {(f.flid, f.flno) for f in db.session.query(Flight)}
+    assert rows == {(7, 4), (None, 2), (None, 3)}
+
+    # PostgreSQL: the rows copied into the temporary table are deduped alike
+    log = {"sql": [], "rows": []}
+    db.engine = SimpleNamespace(
+        dialect=SimpleNamespace(name="postgresql"),
+        raw_connection=lambda: FakeConnection(log),
+    )
+    assert db.bulk_load(Flight, flights) == (3, 0)
+    assert sorted(log["rows"]) == [
+        ["1", "1", "7", "4"],
+        ["1", "1", r"\N", "2"],
+        ["1", "1", r"\N", "3"],
+    ]
+    assert not any("DISTINCT" in sql for sql in log["sql"])
+
+
+def test_update_by_unique_key(tmp_path):
+    db = Database(f"sqlite:///{tmp_path}/test.db")
+    db.migrate()
+    flights = [{"source_id": 1, "site_id": 1, "flid": i, "flno": i} for i in range(3)]
+    db.upsert(Flight, flights)
+    updated = db.update(Flight, [{"flid": 1, "points": 12.5}, {"flid": 9, "points": 1}])
+    assert updated == 1
+    points = {f.flid: f.points for f in db.session.query(Flight)}
+    assert points == {0: None, 1: 12.5, 2: None}
@@ -0,0 +1,115 @@
+from datetime import date, datetime, timedelta, timezone
+
+import numpy as np
+import pandas as pd
+import xarray as xr
+
+from startleiter import dataset, hindcast
+from startleiter.database import Database, Flight
+from test_hindcast import fake_scrape_archive, make_archive
+
+SITES = [
+    {"name": "A", "site_id": 1, "model_id": 3, "elevation": 1500},
+    {"name": "B", "site_id": 2, "model_id": 5, "elevation": 1000},
+]
+BINS = {
+    "alt_bins": [10, 500, 1000, 1500, 2000, 2500],
+    "dist_bins": [10, 50, 100, 150, 200],
+    "positive_label": 0,
+    "min_pressure": 400,
+    "fill_value": -5,
+}
+
+
+def make_flight(i, site_id, day, max_altitude_m, length_km):
+    return {
+        "source_id": 1,
+        "site_id": site_id,
+        "flid": i,
+        "flno": i,
+        "datetime": datetime(2022, 1, day, 12, tzinfo=timezone.utc),
+        "length_km": length_km,
+        "max_altitude_m": max_altitude_m,
+        "airtime": timedelta(hours=1),
+        "glider_cat": "FAI-3 PG",
+    }
+
+
+def build(tmp_path, monkeypatch, end=date(2022, 2, 28), name="dataset"):
+    monkeypatch.setattr(hindcast.openmeteo, "scrape_archive", fake_scrape_archive)
+    make_archive(tmp_path, ["2022-01", "2022-02"])
+    db = Database(f"sqlite:///{tmp_path}/test.db")
+    db.migrate()
+    db.upsert(
+        Flight,
+        [
+            make_flight(1, 1, 3, 2100, 30.0),
+            make_flight(2, 1, 3, 3600, 120.0),
+            make_flight(3, 1, 20, 1800, 5.0),
+            make_flight(4, 2, 10, 1700, 60.0),
+            # excluded: too short
+            make_flight(5, 2, 11, 1700, 1.0),
+        ],
+    )
+    manifest = dataset.build(
+        tmp_path / name,
+        db.engine,
+        SITES,
+        1,
+        2,
+        **BINS,
+        start=date(2022, 1, 1),
+        end=end,
+        chunk_days=31,
+        directory=tmp_path,
+    )
+    return manifest
+
+
+def test_build_labels(tmp_path, monkeypatch):
+    manifest = build(tmp_path, monkeypatch)
+    assert [shard["size"] for shard in manifest["shards"]] == [31, 28]
+    assert len(manifest["variables"]) == 7
+
+    data = dataset.TrainingDataset(tmp_path / "dataset")
+    assert len(data) == 59
+    assert data.inputs[0].shape == (31, len(manifest["levels"]), 7)
+    assert isinstance(data.inputs[0], np.memmap)
+    labels = pd.DataFrame(data.labels[:, 0], index=data.validtime)
+    assert list(labels.loc["2022-01-03"]) == [0, 4, 2, 2, 2100, 120]
+    assert list(labels.loc["2022-01-20", ["flyability", "max_alt_class"]]) == [0, 0]
+    assert labels.loc["2022-01-04", "flyability"] == 1
+    assert labels.loc["2022-01-04", "max_alt_class"] == -1
+    # outside of the flights of the site
+    assert labels.loc["2022-01-02", "flyability"] == -1
+    assert labels.loc["2022-01-21", "flyability"] == -1
+    site_b = pd.DataFrame(data.labels[:, 1], index=data.validtime)
+    assert (site_b.loc["2022-01-10":"2022-01-11", "flyability"] == [0, 1]).all()
+
+    samples = data.samples("flyability")
+    assert len(samples) == 18 + 2
+    assert sorted(map(tuple, data.samples("fly_max_alt"))) == [
+        (2, 0, 4),
+        (9, 1, 1),
+        (19, 0, 0),
+    ]
+
+
+def test_to_tf(tmp_path, monkeypatch):
+    build(tmp_path, monkeypatch)
+    data = dataset.TrainingDataset(tmp_path / "dataset")
+    moments = xr.Dataset(
+        {"mu": ("variable", [10.0, 2.0]), "sigma": ("variable", [2.0, 4.0])},
+        coords={"variable": ["TEMP", "KLO-LUG"]},
+    )
+    batches = list(data.to_tf("flyability", moments, batch_size=8, seed=0))
+    assert [len(labels) for _, labels in batches] == [8, 8, 4]
+    inputs = np.concatenate([inputs.numpy() for inputs, _ in batches])
+    labels = np.concatenate([labels.numpy() for _, labels in batches])
+    assert inputs.shape == (20, len(data.levels), 3)
+    assert sorted(labels) == sorted(data.samples("flyability")[:, 2])
+    np.testing.assert_allclose(inputs[..., 0], 0)
+    # 24 hourly pressure differences, then filled
+    np.testing.assert_allclose(inputs[:, :24, 1], 0.75)
+    np.testing.assert_allclose(inputs[:, 24:, 1], -5)
+    assert set(inputs[:, 0, 2]) == {3, 5}
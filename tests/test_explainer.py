@@ -0,0 +1,47 @@
+import subprocess
+import sys
+import textwrap
+from pathlib import Path
+
+import pytest
+
+# the explainer switches TensorFlow to graph mode for good at import, which
+# would break the eager code of the other tests: run it in its own process
+COMPLETENESS = textwrap.dedent("""
+    import numpy as np
+    import tensorflow as tf
+
+    from startleiter import explainer
+
+    tf.compat.v1.set_random_seed(0)
+    model = tf.keras.Sequential(
+        [
+            tf.keras.layers.Flatten(input_shape=(3, 2)),
+            tf.keras.layers.Dense(8, activation="tanh"),
+            tf.keras.layers.Dense(2, activation="softmax"),
+        ]
+    )
+    rng = np.random.default_rng(0)
+    baselines = rng.normal(size=(5, 3, 2)).astype("float32")
+    inputs = rng.normal(size=(2, 3, 2)).astype("float32")
+
+    attributions = explainer.integrated_gradients(baselines, model, inputs, steps=64)
+    assert len(attributions) == 2
+    assert attributions[0].shape == inputs.shape
+    # the attributions sum to f(x) - E[f(baseline)], for each output unit
+    expected = model.predict(inputs) - model.predict(baselines).mean(axis=0)
+    actual = np.stack([a.sum(axis=(1, 2)) for a in attributions], axis=-1)
+    np.testing.assert_allclose(actual, expected, atol=1e-3)
+    """)
+
+
+def test_integrated_gradients_completeness():
+    pytest.importorskip("tensorflow")
+    pytest.importorskip("shap")
+    result = subprocess.run(
+        [sys.executable, "-c", COMPLETENESS],
+        capture_output=True,
+        text=True,
+        cwd=Path(__file__).parents[1],
+    )
+    assert result.returncode == 0, result.stderr
@@ -0,0 +1,71 @@
+from datetime import timedelta
+
+import pandas as pd
+from sqlalchemy import text
+
+from startleiter import features, utils
+from startleiter.database import Database, Flight
+
+COLUMNS = ["length_km", "max_altitude_m", "airtime_hours", "occurrences_last_24h"]
+
+
+def assert_same_as_prepare_flights(engine):
+    expected = utils.prepare_flights(utils.read_flights(engine, 1))
+    actual = features.read_features(engine, 1)
+    assert actual.index.equals(expected.index)
+    pd.testing.assert_frame_equal(
+        actual[COLUMNS].astype(float), expected[COLUMNS].astype(float)
+    )
+    for col in ["dayofweek", "month", "season"]:
+        assert actual[col].astype(str).equals(expected[col])
+    assert actual["date"].equals(expected["date"])
+
+
+def test_count_last_24h():
+    times = pd.to_datetime(["2023-06-01 10:00", "2023-06-01 12:00", "2023-06-02 11:00"])
+    assert features.count_last_24h(times.to_numpy()).tolist() == [1, 2, 2]
+
+
+def test_refresh_matches_prepare_flights(tmp_path, make_flights):
+    db = Database(f"sqlite:///{tmp_path}/test.db")
+    db.migrate()
+    flights = make_flights(2000)
+    db.upsert(Flight, flights[:1500])
+    assert features.refresh(db.engine, 1) == 1500
+    assert features.refresh(db.engine, 1) == 0
+    assert_same_as_prepare_flights(db.engine)
+
+    # new flights, details of older flights (one of them now filtered out)
+    db.upsert(Flight, flights[1500:])
+    details = [
+        {"flid": i, "max_altitude_m": 1500 + 1000 * i, "airtime": timedelta(hours=1)}
+        for i in [5, 10, 1495]
+    ]
+    db.update(Flight, details)
+    assert features.refresh(db.engine, 1) == 503
+    assert_same_as_prepare_flights(db.engine)
+
+    # edited and deleted flights
+    edits = [
+        {"flid": 20, "length_km": 1.0},
+        {"flid": 21, "glider_cat": "HGFAI-1 HG"},
+        {"flid": 22, "datetime": flights[600]["datetime"] + timedelta(minutes=1)},
+    ]
+    for edit in edits:
+        db.update(Flight, [edit])
+    with db.engine.begin() as con:
+        con.execute(text("DELETE FROM flight WHERE flid IN (30, 601)"))
+    assert features.refresh(db.engine, 1) == 5
+    assert features.refresh(db.engine, 1) == 0
+    assert_same_as_prepare_flights(db.engine)
+
+
+def test_get_flights(tmp_path, make_flights):
+    db = Database(f"sqlite:///{tmp_path}/test.db")
+    db.migrate()
+    db.upsert(Flight, make_flights(100))
+    features.refresh(db.engine, 1)
+    df = utils.get_flights(db.engine, 1, start="2022-06-01")
+    assert (df["datetime"] >= "2022-06-01").all()
+    assert df["month"].dtype == "category"
+    assert list(df["month"].cat.categories) == features.MONTHS
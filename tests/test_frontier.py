@@ -0,0 +1,50 @@
+from datetime import timedelta
+
+from startleiter.database import Database, Flight
+from startleiter.frontier import DONE, FAILED, MAX_ATTEMPTS, CrawlFrontier
+
+
+def make_frontier(tmp_path):
+    db = Database(f"sqlite:///{tmp_path}/test.db")
+    db.migrate()
+    return db, CrawlFrontier(db, site_id=1)
+
+
+def test_offset_defaults_to_last_flight(tmp_path):
+    db, frontier = make_frontier(tmp_path)
+    assert frontier.offset() == 0
+    db.upsert(Flight, [{"source_id": 1, "site_id": 1, "flid": 7, "flno": 42}])
+    assert frontier.offset() == 42
+    frontier.advance(100)
+    frontier.advance(200)
+    assert frontier.offset() == 200
+
+
+def test_add_is_idempotent(tmp_path):
+    _, frontier = make_frontier(tmp_path)
+    assert frontier.add({1: "url1", 2: "url2"}) == 2
+    frontier.done([1])
+    assert frontier.add({1: "url1", 3: "url3"}) == 1
+    assert frontier.pending() == {2: "url2", 3: "url3"}
+    assert frontier.pending(limit=1) == {2: "url2"}
+    assert frontier.stats() == {"pending": 2, DONE: 1}
+
+
+def test_failed_gives_up_after_max_attempts(tmp_path):
+    _, frontier = make_frontier(tmp_path)
+    frontier.add({1: "url1", 2: "url2"})
+    for _ in range(MAX_ATTEMPTS):
+        frontier.failed({1: TimeoutError("slow")})
+    assert frontier.pending() == {2: "url2"}
+    assert frontier.stats() == {"pending": 1, FAILED: 1}
+
+
+def test_missing_details(tmp_path):
+    db, frontier = make_frontier(tmp_path)
+    flights = [
+        {"source_id": 1, "site_id": 1, "flid": 10 + i, "flno": i} for i in range(4)
+    ]
+    db.upsert(Flight, flights)
+    db.update(Flight, [{"flid": 12, "airtime": timedelta(hours=1)}])
+    frontier.add({13: "url13"})
+    assert frontier.missing_details() == [(0, 10), (1, 11)]
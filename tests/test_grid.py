@@ -0,0 +1,177 @@
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+import pytest
+import xarray as xr
+
+from startleiter import grid, openmeteo
+
+SITES = {
+    "A": {"latitude": 46.2, "longitude": 8.8},
+    "B": {"latitude": 46.5, "longitude": 8.8},
+}
+
+
+def make_response(seed, elevation=500.0):
+    """DWD-ICON response with the hourly sounding variables of one location."""
+    rng = np.random.default_rng(seed)
+    time = pd.date_range("2022-06-01", periods=48, freq="1H")
+    hourly = {"time": [f"{t:%Y-%m-%dT%H:%M}" for t in time]}
+    for name in openmeteo.SOUNDING_HOURLY.split(","):
+        if name.startswith("temperature"):
+            values = rng.normal(0, 10, len(time))
+        elif name.startswith("relative_humidity"):
+            values = rng.uniform(0, 100, len(time))
+        elif name.startswith("wind_speed"):
+            values = rng.uniform(0, 50, len(time))
+        else:
+            values = rng.uniform(0, 360, len(time))
+        hourly[name] = np.round(values, 1).tolist()
+    return {"elevation": elevation, "hourly": hourly}
+
+
+class FakeResponse:
+    def __init__(self, data):
+        self.data = data
+
+    def json(self):
+        return self.data
+
+
+def test_bbox_points():
+    lat, lon = grid.bbox_points(8.0, 46.0, 8.2, 46.1, 0.05)
+    assert lat.shape == lon.shape == (3 * 5,)
+    np.testing.assert_allclose([lat.min(), lat.max()], [46.0, 46.1])
+    np.testing.assert_allclose([lon.min(), lon.max()], [8.0, 8.2])
+    with pytest.raises(ValueError):
+        grid.bbox_points(8.2, 46.0, 8.0, 46.1, 0.05)
+    with pytest.raises(ValueError):
+        grid.parse_bbox("8,46,8.2")
+
+
+def test_parse_points():
+    lat, lon = grid.parse_points("46.2,8.8;46.5,8.81")
+    np.testing.assert_allclose(lat, [46.2, 46.5])
+    np.testing.assert_allclose(lon, [8.8, 8.81])
+    for points in ("46.2,8.8;46.5", "46.2;8.8", "a,b", "95,8.8"):
+        with pytest.raises(ValueError):
+            grid.parse_points(points)
+
+
+def test_request_points():
+    lat, lon = grid.request_points(None, 0.05, "46.2,8.8;46.5,8.81", 10)
+    np.testing.assert_allclose(lat, [46.2, 46.5])
+    lat, lon = grid.request_points("8.0,46.0,8.2,46.1", 0.05, None, 15)
+    assert lat.size == 15
+    with pytest.raises(ValueError, match="exactly one"):
+        grid.request_points("8.0,46.0,8.2,46.1", 0.05, "46.2,8.8", 15)
+    with pytest.raises(ValueError, match="exactly one"):
+        grid.request_points(None, 0.05, None, 15)
+    with pytest.raises(ValueError, match="Too many points"):
+        grid.request_points("8.0,46.0,8.2,46.1", 0.05, None, 14)
+
+
+def test_check_cycle():
+    now = datetime(2022, 6, 1, 13, 30)
+    grid.check_cycle(datetime(2022, 6, 1), now)
+    for time in (datetime(2022, 5, 31), datetime(2021, 6, 1)):
+        with pytest.raises(ValueError, match="current forecast cycle"):
+            grid.check_cycle(time, now)
+
+
+def test_nearest_sites():
+    names, distance = grid.nearest_sites([46.21, 46.45, 46.5], [8.8, 8.8, 9.0], SITES)
+    assert list(names) == ["A", "B", "B"]
+    np.testing.assert_allclose(distance[0], 1.11, atol=0.01)
+    np.testing.assert_allclose(grid.haversine(46, 8, 47, 8), 111.2, atol=0.1)
+
+
+def test_predict_points():
+    lat = np.array([46.21, 46.45, 46.5, 46.2, 46.49])
+    lon = np.full(lat.size, 8.8)
+    elevation = np.array([250.0, 1049.0, 1050.0, np.nan, 0.0])[[0, 1, 2, 4, 4]]
+    inputs = xr.DataArray(
+        np.arange(lat.size * 2 * 3, dtype="float32").reshape(lat.size, 2, 3),
+        dims=("point", "level", "variable"),
+    )
+    chunks = []
+
+    def run(inputs, site_ids):
+        chunks.append((inputs.sizes["point"], list(site_ids)))
+        # identify the points by their first input
+        first = inputs.isel(level=0, variable=0).values
+        return first / 100, np.full(first.size, 500), first.astype(int)
+
+    result = grid.predict_points(
+        run, inputs, lat, lon, elevation, SITES, {"A": 1, "B": 2}, chunk_size=2
+    )
+    assert chunks == [(2, [1, 2]), (2, [2, 1]), (1, [2])]
+    assert list(result["site"]) == ["A", "B", "B", "A", "B"]
+    np.testing.assert_allclose(
+        result["flying_probability"], [0, 0.06, 0.12, 0.18, 0.24]
+    )
+    np.testing.assert_array_equal(result["max_distance_km"], [0, 6, 12, 18, 24])
+    # the altitude gain is added to the elevation of each grid cell
+    np.testing.assert_array_equal(
+        result["max_altitude_masl"], [700, 1500, 1500, 500, 500]
+    )
+    np.testing.assert_allclose(result["site_distance_km"], [1.1, 5.6, 0, 0, 1.1])
+
+
+def test_to_geojson():
+    collection = grid.to_geojson(
+        np.array([46.2, 46.5]),
+        np.array([8.8, 8.9]),
+        {"site": np.array(["A", "B"]), "flying_probability": np.array([0.5, 0.1])},
+    )
+    assert collection["type"] == "FeatureCollection"
+    feature = collection["features"][1]
+    assert feature["geometry"] == {"type": "Point", "coordinates": [8.9, 46.5]}
+    assert feature["properties"] == {"site": "B", "flying_probability": 0.1}
+
+
+def test_parse_soundings_matches_scrape_sounding(monkeypatch):
+    responses = [make_response(seed, 100.0 * seed) for seed in range(3)]
+    leadtime = timedelta(hours=24)
+    expected = []
+    for response in responses:
+        monkeypatch.setattr(
+            openmeteo.httpclient, "get", lambda url, **kwargs: FakeResponse(response)
+        )
+        expected.append(openmeteo.scrape_sounding(46.2, 8.8, leadtime))
+
+    validtime, ds = openmeteo.parse_soundings(responses, leadtime)
+    assert validtime == expected[0][0] == pd.Timestamp("2022-06-02")
+    assert ds.TEMP.dims == ("point", "PRES")
+    for i, (_, sounding) in enumerate(expected):
+        for name in ("TEMP", "DWPT", "SKNT", "DRCT"):
+            np.testing.assert_allclose(
+                ds[name].isel(point=i), sounding[name], rtol=1e-5, atol=1e-4
+            )
+
+
+def test_scrape_soundings_batches(monkeypatch):
+    urls = []
+    served = {}
+
+    def fake_get(url, **kwargs):
+        urls.append(url)
+        lats = url.split("latitude=")[1].split("&")[0].split(",")
+        lons = url.split("longitude=")[1].split("&")[0].split(",")
+        responses = [make_response(len(served) + i, 1000.0) for i in range(len(lats))]
+        served.update(zip(zip(lats, lons), responses))
+        return FakeResponse(responses if len(lats) > 1 else responses[0])
+
+    monkeypatch.setattr(openmeteo.httpclient, "get", fake_get)
+    lat, lon = grid.bbox_points(8.0, 46.0, 8.2, 46.1, 0.05)
+    _, ds = openmeteo.scrape_soundings(lat, lon, timedelta(0), batch_size=7, workers=2)
+    assert len(urls) == 3
+    assert ds.sizes["point"] == lat.size
+    np.testing.assert_allclose(ds["elevation"], 1000.0)
+    # the batches are parsed independently and concatenated in order
+    _, expected = openmeteo.parse_soundings(
+        [served[f"{y:.4f}", f"{x:.4f}"] for y, x in zip(lat, lon)], timedelta(0)
+    )
+    for name in ("TEMP", "DWPT", "SKNT", "DRCT"):
+        np.testing.assert_allclose(ds[name], expected[name])
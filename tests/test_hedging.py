@@ -0,0 +1,123 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from startleiter import hedging, metrics, resilience
+
+
+def source(result, delay=0.0, error=None, calls=None):
+    def call():
+        if calls is not None:
+            calls.append(result)
+        time.sleep(delay)
+        if error is not None:
+            raise error
+        return result
+
+    return call
+
+
+def test_fast_primary_is_not_hedged():
+    calls = []
+    with ThreadPoolExecutor(2) as pool:
+        result = hedging.hedge(
+            "test_fast",
+            source("obs", calls=calls),
+            source("fc", calls=calls),
+            pool,
+            hedge_after=0.5,
+            budget=1,
+        )
+    assert result == ("obs", "primary")
+    assert calls == ["obs"]
+    assert metrics.get("test_fast.hedged") == 0
+
+
+def test_primary_within_budget_wins():
+    with ThreadPoolExecutor(2) as pool:
+        result = hedging.hedge(
+            "test_budget",
+            source("obs", delay=0.1),
+            source("fc"),
+            pool,
+            hedge_after=0.02,
+            budget=1,
+        )
+    assert result == ("obs", "primary")
+    assert metrics.get("test_budget.hedged") == 1
+
+
+def test_slow_primary_falls_back_and_is_bounded():
+    budgets = []
+
+    def slow():
+        budgets.append(resilience.remaining_time())
+        time.sleep(0.3)
+        return "obs"
+
+    with ThreadPoolExecutor(2) as pool:
+        t0 = time.monotonic()
+        result = hedging.hedge(
+            "test_slow", slow, source("fc"), pool, hedge_after=0.02, budget=0.1
+        )
+        assert time.monotonic() - t0 < 0.25
+    assert result == ("fc", "backup")
+    # the requests of the abandoned call time out at the end of the budget
+    assert 0 < budgets[0] <= 0.1
+
+
+def test_primary_errors():
+    with ThreadPoolExecutor(2) as pool:
+        result = hedging.hedge(
+            "test_errors",
+            source("obs", error=IndexError("no sounding")),
+            source("fc"),
+            pool,
+            hedge_after=0.5,
+            budget=1,
+            errors=(IndexError,),
+        )
+        assert result == ("fc", "backup")
+        with pytest.raises(KeyError):
+            hedging.hedge(
+                "test_errors",
+                source("obs", error=KeyError("bug")),
+                source("fc"),
+                pool,
+                hedge_after=0.5,
+                budget=1,
+                errors=(IndexError,),
+            )
+
+
+def test_queued_primary_is_cancelled():
+    release = threading.Event()
+    calls = []
+    with ThreadPoolExecutor(1) as pool:
+        pool.submit(release.wait)
+        pool.submit(lambda: None)
+        # the single worker is busy: the primary call cannot start in time
+        with ThreadPoolExecutor(1) as other:
+            result = hedging.hedge(
+                "test_queued",
+                source("obs", calls=calls),
+                source("fc"),
+                HedgeExecutor(pool, other),
+                hedge_after=0.01,
+                budget=0.05,
+            )
+        release.set()
+    assert result == ("fc", "backup")
+    assert calls == []
+
+
+class HedgeExecutor:
+    """Submit the primary call to a busy pool and the backup to another."""
+
+    def __init__(self, busy, free):
+        self.pools = [busy, free]
+
+    def submit(self, *args, **kwargs):
+        return self.pools.pop(0).submit(*args, **kwargs)
@@ -0,0 +1,104 @@
+import numpy as np
+import pandas as pd
+import xarray as xr
+
+from startleiter import hindcast
+from startleiter.database import Database, Hindcast, Prediction
+
+PRES = np.logspace(np.log10(200), 3, 64, base=10)[::-1] // 1
+
+
+def make_archive(directory, months):
+    for month in months:
+        validtimes = pd.date_range(
+            month, periods=pd.Period(month).days_in_month * 2, freq="12H"
+        )
+        shape = (validtimes.size, PRES.size)
+        ds = xr.Dataset(
+            {
+                "TEMP": (("validtime", "PRES"), np.full(shape, 10, "float32")),
+                "DWPT": (("validtime", "PRES"), np.full(shape, 5, "float32")),
+                "SKNT": (("validtime", "PRES"), np.full(shape, 10, "float32")),
+                "DRCT": (("validtime", "PRES"), np.full(shape, 270, "float32")),
+            },
+            coords={"validtime": validtimes, "PRES": PRES},
+        )
+        ds.to_netcdf(directory / f"sounding-1-2-{validtimes[0]:%Y%m}.nc")
+
+
+def fake_scrape_archive(station_name, hourly_parameter, start_date, end_date):
+    index = pd.date_range(
+        start_date, pd.Timestamp(end_date) + pd.Timedelta("23H"), freq="1H"
+    )
+    value = {"Kloten": 1010, "Lugano": 1005, "Geneva": 1012}[station_name]
+    return pd.DataFrame({hourly_parameter: np.float32(value)}, index=index)
+
+
+def test_archive_files_and_chunks(tmp_path):
+    make_archive(tmp_path, ["2022-01", "2022-02", "2022-03", "2022-04"])
+    files = hindcast.archive_files(
+        1, 2, pd.Timestamp("2022-02-15").date(), directory=tmp_path
+    )
+    assert [f.name[-9:-3] for f in files] == ["202202", "202203", "202204"]
+    chunks = hindcast.chunk_files(files, chunk_days=62)
+    assert [len(chunk) for chunk in chunks] == [2, 1]
+
+
+def test_load_inputs(tmp_path, monkeypatch):
+    monkeypatch.setattr(hindcast.openmeteo, "scrape_archive", fake_scrape_archive)
+    make_archive(tmp_path, ["2022-01", "2022-02"])
+    files = hindcast.archive_files(1, 2, directory=tmp_path)
+    inputs = hindcast.load_inputs(
+        files, pd.Timestamp("2022-01-30"), pd.Timestamp("2022-02-02 23:00"), 400
+    )
+    assert inputs.dims == ("validtime", "level", "variable")
+    assert list(inputs["validtime"].dt.day) == [30, 31, 1, 2]
+    assert set(inputs["variable"].values) == {
+        "TEMP",
+        "DWPD",
+        "U",
+        "V",
+        "WOY",
+        "KLO-GVE",
+        "KLO-LUG",
+    }
+    assert float(inputs["level"].min()) >= 400
+    np.testing.assert_allclose(inputs.sel(variable="DWPD"), 5)
+    # westerly wind
+    np.testing.assert_allclose(inputs.sel(variable="U"), 10, rtol=1e-5)
+    # 24 hourly pressure differences, then padding
+    klo_lug = inputs.sel(variable="KLO-LUG").values
+    np.testing.assert_allclose(klo_lug[:, :24], 5)
+    assert np.isnan(klo_lug[:, 24:]).all()
+
+
+def test_hindcast_rows_per_model(tmp_path):
+    db = Database(f"sqlite:///{tmp_path}/test.db")
+    db.migrate()
+    dims = ("site", "validtime")
+    ds = xr.Dataset(
+        {
+            "flying_probability": (dims, np.full((2, 3), 0.5, "float32")),
+            "max_altitude_masl": (dims, np.full((2, 3), 2000, "float32")),
+            "max_distance_km": (dims, np.full((2, 3), 50, "float32")),
+        },
+        coords={
+            "site": ["A", "B"],
+            "validtime": pd.date_range("2022-06-01", periods=3),
+        },
+        attrs={"model_hash": "old"},
+    )
+    site_ids = {"A": 1, "B": 2}
+    assert db.upsert(Hindcast, hindcast.to_rows(ds, site_ids)) == (6, 0)
+    # the rows of a retrained model are added next to the old ones
+    ds.attrs["model_hash"] = "new"
+    assert db.upsert(Hindcast, hindcast.to_rows(ds, site_ids)) == (6, 0)
+    ds["flying_probability"][:] = 0.9
+    rows = hindcast.to_rows(ds, site_ids)
+    assert db.upsert(Hindcast, rows, update=True) == (0, 6)
+    probs = {
+        (row.model_hash, round(row.flying_probability, 1))
+        for row in db.session.query(Hindcast)
+    }
+    assert probs == {("old", 0.5), ("new", 0.9)}
+    assert db.session.query(Prediction).count() == 0
@@ -0,0 +1,111 @@
+import pytest
+import requests
+from requests.structures import CaseInsensitiveDict
+
+from startleiter import httpclient, resilience
+
+
+class FakeSession:
+    """Serve canned responses and keep track of the request headers."""
+
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.calls = []
+
+    def get(self, url, params=None, headers=None, timeout=None):
+        self.calls.append(headers)
+        status_code, resp_headers, body = self.responses.pop(0)
+        resp = requests.Response()
+        resp.url = url
+        resp.status_code = status_code
+        resp.headers = CaseInsensitiveDict(resp_headers)
+        resp._content = body
+        return resp
+
+
+def setup_client(monkeypatch, tmp_path, responses, max_bytes=2**20):
+    session = FakeSession(responses)
+    monkeypatch.setattr(httpclient, "_SESSION", session)
+    monkeypatch.setattr(
+        httpclient, "_CACHE", httpclient.ResponseCache(tmp_path / "cache", max_bytes)
+    )
+    monkeypatch.setenv("STARTLEITER_HTTP_FIXTURES", str(tmp_path / "fixtures"))
+    monkeypatch.delenv("STARTLEITER_HTTP_MODE", raising=False)
+    return session
+
+
+def test_freshness_lifetime():
+    assert httpclient.freshness_lifetime({"Cache-Control": "max-age=60"}) == 60
+    assert httpclient.freshness_lifetime({"Cache-Control": "no-cache"}) == 0
+    assert httpclient.freshness_lifetime({"Cache-Control": "no-store"}) is None
+    assert httpclient.freshness_lifetime({}) == 0
+
+
+def test_get_fresh_entry_is_served_from_cache(monkeypatch, tmp_path):
+    session = setup_client(
+        monkeypatch, tmp_path, [(200, {"Cache-Control": "max-age=60"}, b"data")]
+    )
+    assert httpclient.get("http://example.com/a").content == b"data"
+    assert httpclient.get("http://example.com/a").content == b"data"
+    assert len(session.calls) == 1
+
+
+def test_get_stale_entry_is_revalidated(monkeypatch, tmp_path):
+    session = setup_client(
+        monkeypatch,
+        tmp_path,
+        [(200, {"ETag": '"v1"'}, b"data"), (304, {}, b"")],
+    )
+    httpclient.get("http://example.com/a")
+    resp = httpclient.get("http://example.com/a")
+    assert resp.status_code == 200
+    assert resp.content == b"data"
+    assert session.calls[1]["If-None-Match"] == '"v1"'
+
+
+def test_cache_evicts_least_recently_used(monkeypatch, tmp_path):
+    responses = [
+        (200, {"Cache-Control": "max-age=60"}, bytes([i]) * 10) for i in range(3)
+    ]
+    session = setup_client(monkeypatch, tmp_path, responses, max_bytes=25)
+    for name in "abc":
+        httpclient.get(f"http://example.com/{name}")
+    cache = httpclient.get_cache()
+    assert cache.get(httpclient.request_key("http://example.com/a")) is None
+    assert cache.get(httpclient.request_key("http://example.com/c")) is not None
+    assert len(session.calls) == 3
+
+
+def test_record_and_replay(monkeypatch, tmp_path):
+    setup_client(monkeypatch, tmp_path, [(200, {}, b'{"a": 1}')])
+    monkeypatch.setenv("STARTLEITER_HTTP_MODE", "record")
+    httpclient.get("http://example.com/a", use_cache=False)
+    monkeypatch.setenv("STARTLEITER_HTTP_MODE", "replay")
+    monkeypatch.setattr(httpclient, "_SESSION", None)
+    assert httpclient.get("http://example.com/a").json() == {"a": 1}
+
+
+def test_timeout_is_bounded_by_retry_deadline(monkeypatch, tmp_path):
+    timeouts = []
+    session = setup_client(monkeypatch, tmp_path, [(200, {}, b"ok")])
+    get = session.get
+
+    def fake_get(url, timeout=None, **kwargs):
+        timeouts.append(timeout)
+        return get(url, timeout=timeout, **kwargs)
+
+    monkeypatch.setattr(session, "get", fake_get)
+
+    @resilience.retry(maxattempts=1, deadline=2)
+    def fetch():
+        return httpclient.get("https://example.com/a", use_cache=False)
+
+    fetch()
+    assert 1 < timeouts[0] <= 2
+
+    @resilience.retry(maxattempts=1, deadline=0)
+    def late():
+        return httpclient.get("https://example.com/a", use_cache=False)
+
+    with pytest.raises(requests.Timeout):
+        late()
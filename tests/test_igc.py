@@ -0,0 +1,76 @@
+import io
+from datetime import date, timedelta
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from startleiter import igc
+
+FIXTURES = Path(__file__).parent / "fixtures" / "igc"
+
+
+def make_igc(times, alts, lat=46.2, lon=8.8, speed_ms=10.0):
+    """IGC file of a flight heading north at ``speed_ms``."""
+    lines = [b"HFDTE150623", b"I013638FXA"]
+    for time, alt in zip(times, alts):
+        time = int(time) % 86400
+        lat_min = round((lat + speed_ms * (time - times[0]) / 111195) * 60000)
+        lon_min = round(lon * 60000)
+        lines.append(
+            f"B{time // 3600:02d}{time // 60 % 60:02d}{time % 60:02d}"
+            f"{lat_min // 60000:02d}{lat_min % 60000:05d}N"
+            f"{lon_min // 60000:03d}{lon_min % 60000:05d}E"
+            f"A{int(alt):05d}{int(alt):05d}123".encode()
+        )
+    return io.BytesIO(b"\r\n".join(lines) + b"\r\n")
+
+
+def test_parse_igc():
+    flight_date, fixes = igc.parse_igc(FIXTURES / "short.igc")
+    assert flight_date == date(2023, 6, 12)
+    assert fixes.dtype == igc.FIX_DTYPE
+    assert len(fixes) == 5
+    assert fixes["time"][0] == 8 * 3600 + 37 * 60
+    assert fixes["lat"][0] == 46 * 60000 + 11976
+    assert fixes["lon"][-1] == 8 * 60000 + 47360
+    assert fixes["alt_baro"].tolist() == [1500, 1504, 1510, 1518, -1]
+    assert fixes["alt_gps"].tolist() == [1612, 1616, 1623, 1631, 1640]
+
+
+def test_parse_igc_in_chunks_through_midnight():
+    times = np.arange(23 * 3600 + 3500, 24 * 3600 + 200, 2)
+    _, fixes = igc.parse_igc(make_igc(times, np.full(len(times), 1000)), 7)
+    assert np.array_equal(fixes["time"], times)
+
+
+def test_track_metrics():
+    # 10 min glide, 5 min climb at 2 m/s, 10 min glide at -1 m/s
+    times = np.arange(10 * 3600, 10 * 3600 + 25 * 60, 2)
+    t = times - times[0]
+    alts = np.select(
+        [t < 600, t < 900], [1600 - t // 10, 1540 + 2 * (t - 600)], 2140 - (t - 900)
+    )
+    metrics = igc.track_metrics(igc.parse_igc(make_igc(times, alts))[1])
+    assert metrics["airtime"] == timedelta(seconds=int(t[-1]))
+    assert metrics["max_altitude_m"] == 2140
+    assert metrics["max_alt_gain_m"] == 600
+    assert metrics["max_climb_ms"] == 2.0
+    assert metrics["max_sink_ms"] == -1.0
+    assert metrics["thermal_count"] == 1
+    assert metrics["tracklog_length_km"] == pytest.approx(10 * t[-1] / 1000, abs=0.1)
+
+
+def test_track_store(tmp_path):
+    store = igc.TrackStore(tmp_path)
+    _, fixes = igc.parse_igc(FIXTURES / "short.igc")
+    assert 3901234 not in store
+    store.save(3901234, fixes)
+    assert 3901234 in store
+    loaded = store.load(3901234)
+    assert isinstance(loaded, np.memmap)
+    assert np.array_equal(loaded, fixes)
+    assert store.flids() == [3901234]
+    metrics = igc.ingest(FIXTURES / "short.igc", store, flid=12)
+    assert metrics["n_fixes"] == 5
+    assert store.flids() == [12, 3901234]
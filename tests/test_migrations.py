@@ -0,0 +1,61 @@
+from sqlalchemy import create_engine, inspect, text
+
+from startleiter.database import Base
+from startleiter.migrations import MIGRATIONS, migrate
+
+
+def test_migrate_legacy_database(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path}/legacy.db")
+    # a database created before migrations: no indexes, duplicated flights
+    with engine.begin() as con:
+        con.execute(
+            text(
+                "CREATE TABLE flight (id INTEGER PRIMARY KEY, site_id INTEGER, "
+                "flid INTEGER, flno INTEGER, datetime TIMESTAMP)"
+            )
+        )
+        con.execute(
+            text("INSERT INTO flight (site_id, flid) VALUES (1, 10), (1, 10), (1, 11)")
+        )
+    assert migrate(engine) == MIGRATIONS[-1][0]
+
+    with engine.connect() as con:
+        flids = con.execute(text("SELECT flid FROM flight ORDER BY flid")).fetchall()
+    assert [flid for (flid,) in flids] == [10, 11]
+    indexes = {index["name"] for index in inspect(engine).get_indexes("flight")}
+    assert {
+        "flight_flid_key",
+        "ix_flight_site_flno",
+        "ix_flight_site_datetime",
+    } <= indexes
+    assert "prediction" in inspect(engine).get_table_names()
+
+
+def test_migrate_is_idempotent(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path}/test.db")
+    assert migrate(engine, target=1) == 1
+    # version 1 is the original schema, whatever the current models
+    tables = set(inspect(engine).get_table_names()) - {"schema_version"}
+    assert tables == {"source", "site", "station", "flight", "prediction"}
+    assert inspect(engine).get_indexes("flight") == []
+    assert migrate(engine) == MIGRATIONS[-1][0]
+    assert migrate(engine) == MIGRATIONS[-1][0]
+    with engine.connect() as con:
+        assert con.execute(text("SELECT COUNT(*) FROM schema_version")).scalar() == len(
+            MIGRATIONS
+        )
+
+
+def test_migrated_schema_matches_models(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path}/test.db")
+    migrate(engine)
+    # a change to the models needs a migration
+    for table in Base.metadata.sorted_tables:
+        columns = {
+            col["name"]: str(col["type"])
+            for col in inspect(engine).get_columns(table.name)
+        }
+        expected = {col.name: str(col.type) for col in table.columns}
+        assert columns == expected, table.name
+        indexes = {index["name"] for index in inspect(engine).get_indexes(table.name)}
+        assert indexes == {index.name for index in table.indexes}, table.name
@@ -0,0 +1,92 @@
+from datetime import date
+
+import numpy as np
+import pytest
+
+from startleiter import moments
+from startleiter.dataset import TrainingDataset
+from test_dataset import build
+
+
+def randomize(path):
+    """Inputs that only depend on the day, with missing values."""
+    data = TrainingDataset(path)
+    for shard, inputs in enumerate(data.inputs):
+        inputs = np.load(path / f"{shard:05d}.inputs.npy", mmap_mode="r+")
+        days = data.validtime[data.offsets[shard] : data.offsets[shard + 1]]
+        for row, day in enumerate(days.astype("i8")):
+            rng = np.random.default_rng(int(day))
+            values = rng.normal(day % 7, 3, inputs.shape[1:])
+            values[rng.random(values.shape) < 0.1] = np.nan
+            inputs[row] = values
+        inputs.flush()
+
+
+def expected_moments(path, model):
+    data = TrainingDataset(path)
+    samples = data.samples(model)
+    x = np.concatenate([np.asarray(inputs) for inputs in data.inputs])[samples[:, 0]]
+    x = x.reshape(-1, x.shape[-1])
+    return np.nanmean(x, axis=0), np.nanstd(x, axis=0)
+
+
+def test_merge_matches_direct_computation():
+    rng = np.random.default_rng(0)
+    x = rng.normal(5, 2, (1000, 3, 4))
+    x[rng.random(x.shape) < 0.2] = np.nan
+    weights = rng.integers(0, 4, 1000)
+    stats = moments.accumulate(x[:10], weights[:10])
+    for start in range(10, 1000, 97):
+        chunk = moments.accumulate(x[start : start + 97], weights[start : start + 97])
+        stats = moments.merge(stats, chunk)
+    repeated = np.repeat(x, weights, axis=0)
+    np.testing.assert_allclose(stats.count, np.sum(~np.isnan(repeated), axis=0))
+    np.testing.assert_allclose(stats.mean, np.nanmean(repeated, axis=0))
+    np.testing.assert_allclose(stats.m2 / stats.count, np.nanvar(repeated, axis=0))
+
+    total = moments.reduce_levels(stats)
+    np.testing.assert_allclose(
+        total.m2 / total.count, np.nanvar(repeated.reshape(-1, 4), axis=0)
+    )
+
+
+def test_incremental_update(tmp_path, monkeypatch):
+    build(tmp_path, monkeypatch, end=date(2022, 1, 10), name="start")
+    build(tmp_path, monkeypatch)
+    randomize(tmp_path / "start")
+    randomize(tmp_path / "dataset")
+
+    state = moments.MomentsState("flyability", tmp_path / "state")
+    assert state.update(tmp_path / "start", size=10) == 8
+    state.save()
+    state = moments.MomentsState("flyability", tmp_path / "state")
+    # only the new days are read
+    assert state.update(tmp_path / "dataset", size=10) == 10
+    full = moments.MomentsState("flyability", tmp_path / "full")
+    assert full.update(tmp_path / "dataset", size=10, workers=2) == 18
+
+    mu, sigma = expected_moments(tmp_path / "dataset", "flyability")
+    for result in (state.moments(), full.moments()):
+        np.testing.assert_allclose(result["mu"], mu, rtol=1e-5)
+        np.testing.assert_allclose(result["sigma"], sigma, rtol=1e-5)
+    assert list(state.moments(["TEMP", "U"])["variable"].values) == ["TEMP", "U"]
+    per_level = full.moments(per_level=True)
+    assert per_level["mu"].dims == ("level", "variable")
+
+
+def test_background(tmp_path, monkeypatch):
+    build(tmp_path, monkeypatch)
+    randomize(tmp_path / "dataset")
+    state = moments.MomentsState("flyability", tmp_path / "state")
+    state.update(tmp_path / "dataset", size=10)
+    # site A: 2 flying days out of 18, site B: 1 out of 2
+    assert state.strata == {0: 2, 1: 16, 256: 1, 257: 1}
+
+    moments_ = state.moments(["TEMP", "DWPD", "KLO-LUG"])
+    background = state.background(10, moments_, -5)
+    assert background.shape == (10, len(state.levels), 4)
+    assert background.dtype == "float64"
+    assert sorted(np.unique(background[:, 0, -1], return_counts=True)[1]) == [1, 9]
+    assert not np.isnan(background).any()
+    with pytest.raises(ValueError):
+        state.moments(["TEMP", "W"])
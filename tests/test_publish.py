@@ -0,0 +1,89 @@
+import sys
+from datetime import date, datetime, timedelta, timezone
+
+import pandas as pd
+import pytest
+
+from startleiter import climatology, publish, utils
+from startleiter.database import Database, Flight, Prediction
+
+TODAY = date(2023, 6, 30)
+
+
+def test_snapshot_matches_database(tmp_path, monkeypatch, make_flights):
+    db = Database(f"sqlite:///{tmp_path}/test.db")
+    db.migrate()
+    flights = make_flights(
+        3000, start=datetime(2016, 1, 1, tzinfo=timezone.utc), years=7, valid=True
+    )
+    for flight in flights[1::2]:
+        flight["site_id"] = 2
+    db.upsert(Flight, flights)
+    db.upsert(
+        Prediction,
+        [
+            {
+                "source_id": 1,
+                "site_id": site_id,
+                "reftime": TODAY - timedelta(days=day),
+                "validtime": TODAY - timedelta(days=day - leadtime),
+                "leadtime_days": leadtime,
+                "flying_probability": 0.5,
+            }
+            for site_id in (1, 2)
+            for day in range(100)
+            for leadtime in range(3)
+        ],
+    )
+
+    path = publish.snapshot(db.engine, [1, 2], tmp_path / "snapshot", today=TODAY)
+    start = pd.Timestamp("2022-01-01", tz="UTC")
+    expected = {
+        site_id: (
+            utils.get_flights(db.engine, site_id, start=start),
+            utils.get_predictions(db.engine, site_id, start=TODAY - timedelta(days=90))
+            .sort_values("id")
+            .reset_index(drop=True),
+            climatology.query(db.engine, site_id, days=90, end=TODAY),
+        )
+        for site_id in (1, 2)
+    }
+    monkeypatch.setenv(publish.SNAPSHOT_ENV, str(path))
+    for site_id, (df_flight, df_pred, clim) in expected.items():
+        # sqlite returns naive datetimes, the snapshot is in UTC
+        df_flight["datetime"] = df_flight["datetime"].dt.tz_localize("UTC")
+        pd.testing.assert_frame_equal(
+            publish.load_flights(site_id, start=start), df_flight
+        )
+        pd.testing.assert_frame_equal(
+            publish.load_predictions(site_id, start=TODAY - timedelta(days=90)),
+            df_pred,
+            check_like=True,
+        )
+        pd.testing.assert_frame_equal(
+            publish.load_climatology(site_id, days=90), clim, check_freq=False
+        )
+    assert len(publish.load_flights(1)) + len(publish.load_flights(2)) == len(
+        utils.get_flights(db.engine, 1)
+    ) + len(utils.get_flights(db.engine, 2))
+
+
+def test_render_reports_failed_pages(tmp_path):
+    for name in ["monitoring_a.qmd", "statistics_a.qmd", "statistics_b.qmd"]:
+        (tmp_path / name).write_text("")
+    (tmp_path / "index.qmd").write_text("")
+    pages = publish.find_pages(tmp_path)
+    assert [page.name for page in pages] == [
+        "monitoring_a.qmd",
+        "statistics_a.qmd",
+        "statistics_b.qmd",
+    ]
+
+    script = "import os, sys; sys.exit(os.environ['STARTLEITER_SNAPSHOT'] == '')"
+    timings = publish.render(pages, 2, tmp_path, [sys.executable, "-c", script])
+    assert [timing.page for timing in timings] == [page.name for page in pages]
+    assert all(timing.returncode == 0 for timing in timings)
+
+    script = "import sys; sys.exit('statistics_b' in sys.argv[-1])"
+    with pytest.raises(RuntimeError, match="1 pages failed"):
+        publish.render(pages, 2, tmp_path, [sys.executable, "-c", script])
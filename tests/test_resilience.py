@@ -0,0 +1,89 @@
+import asyncio
+
+import pytest
+
+from startleiter import metrics, resilience
+
+
+def test_retry_succeeds_after_failures():
+    calls = []
+
+    @resilience.retry(maxattempts=3, base_delay=0.001, max_delay=0.001)
+    def flaky():
+        calls.append(1)
+        if len(calls) < 3:
+            raise ValueError("boom")
+        return "ok"
+
+    assert flaky() == "ok"
+    assert len(calls) == 3
+    assert metrics.get("retry.flaky.attempts") >= 3
+
+
+def test_retry_respects_deadline():
+    calls = []
+
+    @resilience.retry(maxattempts=10, deadline=0.05, base_delay=1, jitter=False)
+    def failing():
+        calls.append(1)
+        raise ValueError("boom")
+
+    with pytest.raises(ValueError):
+        failing()
+    assert len(calls) == 1
+
+
+def test_retry_async():
+    calls = []
+
+    @resilience.retry(maxattempts=2, base_delay=0.001, max_delay=0.001)
+    async def flaky():
+        calls.append(1)
+        if len(calls) < 2:
+            raise ValueError("boom")
+        return "ok"
+
+    assert asyncio.run(flaky()) == "ok"
+    assert len(calls) == 2
+
+
+def test_circuit_breaker_opens_and_recovers():
+    breaker = resilience.CircuitBreaker("test", failure_threshold=2, reset_timeout=0)
+    breaker.record_failure()
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open"
+    # reset_timeout=0: the next call is the half-open trial
+    assert breaker.allow()
+    assert not breaker.allow()
+    breaker.record_success()
+    assert breaker.state == "closed"
+
+
+def test_retry_fails_fast_on_open_circuit():
+    breaker = resilience.get_breaker("test-upstream")
+    breaker.reset_timeout = 60
+    for _ in range(breaker.failure_threshold):
+        breaker.record_failure()
+    calls = []
+
+    @resilience.retry(maxattempts=3, upstream="test-upstream")
+    def call():
+        calls.append(1)
+
+    with pytest.raises(resilience.CircuitOpenError):
+        call()
+    assert not calls
+
+
+def test_retry_bounds_request_timeouts_by_deadline():
+    budgets = []
+
+    @resilience.retry(maxattempts=1, deadline=5)
+    def fetch():
+        budgets.append(resilience.remaining_time())
+
+    assert resilience.remaining_time() is None
+    fetch()
+    assert 4 < budgets[0] <= 5
+    assert resilience.remaining_time() is None
@@ -0,0 +1,56 @@
+from datetime import datetime
+
+from startleiter.resultcache import ResultCache, persistent
+
+
+def test_result_cache_survives_restart(tmp_path):
+    ResultCache(tmp_path / "cache.sqlite", 2**20).set("a", b"value")
+    assert ResultCache(tmp_path / "cache.sqlite", 2**20).get("a") == b"value"
+
+
+def test_result_cache_evicts_least_recently_used(tmp_path):
+    cache = ResultCache(tmp_path / "cache.sqlite", 25)
+    cache.set("a", b"x" * 10)
+    cache.set("b", b"x" * 10)
+    cache.get("a")
+    cache.set("c", b"x" * 10)
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
+    assert cache.get("c") is not None
+
+
+def test_persistent_decorator(tmp_path):
+    cache = ResultCache(tmp_path / "cache.sqlite", 2**20)
+    calls = []
+
+    def predict(site, time):
+        calls.append(site)
+        return {"site": site, "time": time}
+
+    cached = persistent(cache, "predict", "v1")(predict)
+    time = datetime(2023, 6, 1)
+    assert cached("Cimetta", time) == {"site": "Cimetta", "time": time}
+    assert cached("Cimetta", time) == {"site": "Cimetta", "time": time}
+    assert calls == ["Cimetta"]
+    persistent(cache, "predict", "v2")(predict)("Cimetta", time)
+    assert len(calls) == 2
+
+
+def test_persistent_skips_provisional_results(tmp_path):
+    cache = ResultCache(tmp_path / "cache.sqlite", 2**20)
+    calls = []
+    final = {"Cimetta": False}
+
+    def predict(site, time):
+        calls.append(site)
+        return site
+
+    cached = persistent(cache, "predict", "v1", lambda site, time: final[site])(predict)
+    time = datetime(2023, 6, 1)
+    cached("Cimetta", time)
+    cached("Cimetta", time)
+    assert len(calls) == 2
+    final["Cimetta"] = True
+    cached("Cimetta", time)
+    cached("Cimetta", time)
+    assert len(calls) == 3
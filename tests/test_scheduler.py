@@ -0,0 +1,60 @@
+import math
+from datetime import datetime, timedelta, timezone
+
+from startleiter import scheduler
+from startleiter.database import CrawlSchedule, Database, Flight
+from startleiter.frontier import CrawlFrontier
+
+NOW = datetime(2024, 6, 1, tzinfo=timezone.utc)
+
+
+def add_flights(db, site_id, times):
+    flights = [
+        {"source_id": 1, "site_id": site_id, "flid": site_id * 1000 + i, "datetime": t}
+        for i, t in enumerate(times)
+    ]
+    db.upsert(Flight, flights)
+
+
+def test_allocate():
+    assert scheduler.allocate([10, 0, 2.5], 60) == [10, 0, 3]
+    assert scheduler.allocate([30, 10, 0.4], 10) == [7, 3, 0]
+    assert sum(scheduler.allocate([1.5, 1.5, 1.5, 100], 7)) == 7
+
+
+def test_eta_days():
+    assert scheduler.eta_days(10, 20, 1.0) == 0
+    # 2 days between runs: 20 - 2 * 5 = 10 flights caught up per run
+    assert scheduler.eta_days(120, 20, 5.0) == 20
+    assert math.isinf(scheduler.eta_days(120, 0, 5.0))
+
+
+def test_estimate_backlog_seasonal(tmp_path):
+    db = Database(f"sqlite:///{tmp_path}/test.db")
+    db.migrate()
+    # 2 years of history, one flight per day, scraped until 10 days ago
+    add_flights(db, 1, [NOW - timedelta(days=d) for d in range(730, 9, -1)])
+    CrawlFrontier(db, 1).add({5: "url5"})
+    site = scheduler.estimate_backlog(db, 1, "Cimetta", NOW)
+    assert site.flights_per_day == 1
+    # the flights of the same 10 days one year earlier, plus the pending one
+    assert site.backlog == 11
+
+
+def test_plan_prioritizes_busy_and_stale_sites(tmp_path):
+    db = Database(f"sqlite:///{tmp_path}/test.db")
+    db.migrate()
+    add_flights(
+        db, 1, [NOW - timedelta(days=90, hours=h) for h in range(0, 24 * 90, 12)]
+    )
+    add_flights(db, 2, [NOW - timedelta(days=90 + d) for d in range(0, 100, 10)])
+    add_flights(db, 3, [NOW - timedelta(days=d) for d in range(0, 100, 10)])
+    scheduler.mark_caught_up(db, 3, now=NOW)
+    sites = scheduler.plan(db, {"busy": 1, "quiet": 2, "fresh": 3}, 20, now=NOW)
+    budgets = {site.name: site.budget for site in sites}
+    assert sites[0].name == "busy"
+    assert budgets["busy"] > budgets["quiet"] > budgets["fresh"] == 0
+    assert sum(budgets.values()) == 20
+    schedule = db.session.get(CrawlSchedule, 3)
+    assert schedule.budget == 0
+    assert schedule.caught_up_at is not None
@@ -0,0 +1,64 @@
+import threading
+
+from selenium.common.exceptions import WebDriverException
+
+from startleiter import scraping
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+def test_rate_limiter_spaces_requests():
+    clock = FakeClock()
+    limiter = scraping.RateLimiter(pace=3600, burst=2, clock=clock, sleep=clock.sleep)
+    waits = [limiter.acquire() for _ in range(4)]
+    assert waits == [0, 0, 1, 1]
+    clock.now += 10
+    assert limiter.acquire() == 0
+
+
+class FakeBrowser:
+    launched = 0
+
+    def __init__(self):
+        FakeBrowser.launched += 1
+        self.closed = False
+
+    def quit(self):
+        self.closed = True
+
+
+def test_browser_pool_restarts_crashed_browsers():
+    FakeBrowser.launched = 0
+    threads = set()
+
+    def fetch(item, browser):
+        threads.add(threading.current_thread().name)
+        if item == 3:
+            raise WebDriverException("crash")
+        return item * 2
+
+    with scraping.BrowserPool(2, launch=FakeBrowser) as pool:
+        results = {
+            item: (result, error) for item, result, error in pool.map(fetch, range(6))
+        }
+
+    assert {item: result for item, (result, _) in results.items() if item != 3} == {
+        0: 0,
+        1: 2,
+        2: 4,
+        4: 8,
+        5: 10,
+    }
+    assert isinstance(results[3][1], WebDriverException)
+    # one browser per worker, plus the replacement of the crashed one
+    assert FakeBrowser.launched <= 3
+    assert len(threads) <= 2
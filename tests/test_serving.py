@@ -0,0 +1,65 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+from starlette.background import BackgroundTasks
+
+from startleiter import serving
+
+DAY1 = datetime(2023, 6, 1)
+DAY2 = datetime(2023, 6, 2)
+
+
+def test_serve_stale_and_refresh():
+    cache = serving.LastGoodCache("test", timedelta(hours=48))
+    cache.put("key", DAY1, "old")
+    tasks = BackgroundTasks()
+    value, stale = asyncio.run(
+        serving.serve(cache, "key", DAY2, lambda: "new", (), True, tasks)
+    )
+    assert (value, stale) == ("old", True)
+    asyncio.run(tasks())
+    assert cache.get("key", DAY2) == serving.Entry(DAY2, "new")
+
+
+def test_serve_fresh_without_stale_ok():
+    cache = serving.LastGoodCache("test", timedelta(hours=48))
+    cache.put("key", DAY1, "old")
+    value, stale = asyncio.run(
+        serving.serve(cache, "key", DAY2, lambda: "new", (), False, BackgroundTasks())
+    )
+    assert (value, stale) == ("new", False)
+
+
+def test_serve_fallback_on_error():
+    def failing():
+        raise RuntimeError("upstream down")
+
+    cache = serving.LastGoodCache("test", timedelta(hours=48))
+    tasks = BackgroundTasks()
+    with pytest.raises(RuntimeError):
+        asyncio.run(serving.serve(cache, "key", DAY2, failing, (), False, tasks))
+    cache.put("key", DAY1, "old")
+    value, stale = asyncio.run(
+        serving.serve(cache, "key", DAY2, failing, (), False, tasks)
+    )
+    assert (value, stale) == ("old", True)
+
+
+def test_max_staleness():
+    cache = serving.LastGoodCache("test", timedelta(hours=12))
+    cache.put("key", DAY1, "old")
+    assert cache.get("key", DAY2) is None
+
+
+def test_newer_basis_is_not_served_for_older_request():
+    def failing():
+        raise RuntimeError("upstream down")
+
+    cache = serving.LastGoodCache("test", timedelta(hours=48))
+    cache.put("key", DAY2, "new")
+    assert cache.get("key", DAY1) is None
+    with pytest.raises(RuntimeError):
+        asyncio.run(
+            serving.serve(cache, "key", DAY1, failing, (), True, BackgroundTasks())
+        )
@@ -0,0 +1,59 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from startleiter import metrics
+from startleiter.singleflight import coalesce
+
+
+def test_coalesce_threads():
+    calls = []
+
+    @coalesce("test_threads")
+    def slow(x):
+        calls.append(x)
+        time.sleep(0.1)
+        return x * 2
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        results = list(pool.map(slow, [1, 1, 1, 1]))
+    assert results == [2, 2, 2, 2]
+    assert calls == [1]
+    assert metrics.get("singleflight.test_threads.coalesced") == 3
+
+
+def test_coalesce_propagates_errors():
+    barrier = threading.Barrier(2)
+
+    @coalesce("test_errors")
+    def failing():
+        time.sleep(0.1)
+        raise ValueError("boom")
+
+    def call():
+        barrier.wait()
+        with pytest.raises(ValueError):
+            failing()
+
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        for future in [pool.submit(call) for _ in range(2)]:
+            future.result()
+
+
+def test_coalesce_asyncio():
+    calls = []
+
+    @coalesce("test_async")
+    async def slow(x):
+        calls.append(x)
+        await asyncio.sleep(0.05)
+        return x * 2
+
+    async def main():
+        return await asyncio.gather(slow(1), slow(1), slow(2))
+
+    assert asyncio.run(main()) == [2, 2, 4]
+    assert calls == [1, 2]
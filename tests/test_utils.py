@@ -1,6 +1,10 @@
+from datetime import date, datetime, timedelta, timezone
+
 import numpy as np
+import pandas as pd
 import xarray as xr
 from startleiter import utils
+from startleiter.database import Database, Flight, Prediction
 
 
 def test_to_wind_components():
@@ -16,3 +20,68 @@ def test_to_wind_components():
     uv = utils.to_wind_components(ds1)
     ds2 = utils.to_wind_components(uv, True)
     xr.testing.assert_allclose(ds1, ds2)
+
+
+def make_flights():
+    start = datetime(2023, 6, 1, 12, tzinfo=timezone.utc)
+    return [
+        {
+            "source_id": 1,
+            "site_id": 1 + i % 2,
+            "flid": i,
+            "flno": i,
+            "datetime": start + timedelta(days=i),
+            "length_km": 10.0 + i,
+            "max_altitude_m": 2000 + i,
+            "airtime": timedelta(hours=1),
+            "glider_cat": "FAI-3 PG",
+        }
+        for i in range(10)
+    ]
+
+
+def test_read_flights(tmp_path):
+    db = Database(f"sqlite:///{tmp_path}/test.db")
+    db.migrate()
+    db.upsert(Flight, make_flights())
+    df = utils.read_flights(db.engine, 1)
+    assert list(df.index) == [1, 3, 5, 7, 9]
+    assert df.glider_cat.dtype == "category"
+    assert df.length_km.dtype == "float32"
+    assert "site_id" not in df
+
+    df = utils.read_flights(db.engine, 1, start="2023-06-04", end="2023-06-08")
+    assert list(df.index) == [5, 7]
+
+    chunks = utils.read_flights(db.engine, 2, columns=["length_km"], chunksize=2)
+    df = pd.concat(list(chunks))
+    assert list(df.columns) == ["length_km"]
+    assert list(df.index) == [2, 4, 6, 8, 10]
+
+
+def test_read_predictions(tmp_path):
+    db = Database(f"sqlite:///{tmp_path}/test.db")
+    db.migrate()
+    rows = [
+        {
+            "source_id": 1,
+            "site_id": site_id,
+            "reftime": date(2023, 6, day),
+            "validtime": date(2023, 6, day + leadtime),
+            "leadtime_days": leadtime,
+            "flying_probability": 0.5,
+        }
+        for site_id in (1, 2)
+        for day in (1, 2)
+        for leadtime in range(3)
+    ]
+    db.upsert(Prediction, rows)
+    df = utils.read_predictions(db.engine, 1, date="2023-06-02")
+    assert len(df) == 3
+    assert "reftime" not in df and "site_id" not in df
+    assert df.flying_probability.dtype == "float32"
+    assert df.validtime.dtype == "datetime64[ns]"
+
+    df = utils.read_predictions(db.engine, 2, start="2023-06-03")
+    assert sorted(df.leadtime_days) == [1, 2, 2]
+    assert (df.reftime == pd.Timestamp("2023-06-02")).sum() == 2
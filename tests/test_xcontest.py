@@ -0,0 +1,193 @@
+from pathlib import Path
+
+import pandas as pd
+import pytest
+import requests
+from bs4 import BeautifulSoup
+from requests.structures import CaseInsensitiveDict
+
+from startleiter import metrics, xcontest
+from startleiter.database import Database, Flight
+from startleiter.frontier import FAILED, CrawlFrontier
+
+FIXTURES = Path(__file__).parent / "fixtures" / "xcontest"
+URL = "https://www.xcontest.org/world/en/flights/detail:pilot/1.6.2023/09:05"
+DETAILS = [
+    "2:15:00",
+    "2874 m",
+    "1530 m",
+    "4.6 m/s",
+    "-5.2 m/s",
+    "96.3 km",
+    "41.2 km / 38.7 km",
+]
+
+
+class FakeSession:
+    def __init__(self, body, status_code=200):
+        self.body = body
+        self.status_code = status_code
+        self.cookies = requests.cookies.RequestsCookieJar()
+
+    def get(self, url, params=None, headers=None, timeout=None):
+        resp = requests.Response()
+        resp.url = url
+        resp.status_code = self.status_code
+        resp.headers = CaseInsensitiveDict({"Content-Type": "text/html"})
+        resp._content = self.body.encode()
+        resp.encoding = "utf-8"
+        return resp
+
+
+class FakeElement:
+    def __init__(self, browser):
+        self.browser = browser
+
+    def is_displayed(self):
+        return True
+
+    def is_enabled(self):
+        return True
+
+    def click(self):
+        self.browser.page_source = self.browser.pages["flight"]
+
+
+class FakeBrowser:
+    """Render the detail page like the browser, once the Flight tab is clicked."""
+
+    def __init__(self):
+        self.pages = {
+            "loading": (FIXTURES / "detail_js.html").read_text(),
+            "flight": (FIXTURES / "detail.html").read_text(),
+        }
+        self.page_source = ""
+        self.current_url = ""
+
+    def get(self, url):
+        self.current_url = url
+        self.page_source = self.pages["loading"]
+
+    def get_cookies(self):
+        return [{"name": "PHPSESSID", "value": "abc", "domain": ".xcontest.org"}]
+
+    def find_element(self, by, value):
+        return FakeElement(self)
+
+
+@pytest.fixture
+def fresh_metrics():
+    metrics.reset()
+    yield
+    metrics.reset()
+
+
+def test_parse_details():
+    assert xcontest.parse_details((FIXTURES / "detail.html").read_text()) == DETAILS
+    with pytest.raises(ValueError):
+        xcontest.parse_details((FIXTURES / "detail_js.html").read_text())
+
+
+def test_fetch_flight_details_over_http(monkeypatch, fresh_metrics):
+    browser = FakeBrowser()
+    session = FakeSession((FIXTURES / "detail.html").read_text())
+    monkeypatch.setattr(xcontest.httpclient, "new_session", lambda: session)
+    assert xcontest.fetch_flight_details(URL, browser) == DETAILS
+    assert session.cookies.get("PHPSESSID") == "abc"
+    assert browser.current_url == ""
+    assert metrics.snapshot("xcontest.details") == {"xcontest.details.http": 1}
+
+
+def test_fetch_flight_details_falls_back_to_browser(monkeypatch, fresh_metrics):
+    browser = FakeBrowser()
+    session = FakeSession((FIXTURES / "detail_js.html").read_text())
+    monkeypatch.setattr(xcontest.httpclient, "new_session", lambda: session)
+    assert xcontest.fetch_flight_details(URL, browser) == DETAILS
+    assert browser.current_url.startswith(URL)
+    assert metrics.snapshot("xcontest.details") == {"xcontest.details.selenium": 1}
+
+
+def legacy_listing(page_source):
+    """Flight rows as parsed one by one with BeautifulSoup."""
+    soup = BeautifulSoup(page_source, "html.parser")
+    rows = soup.find("table", attrs={"class": "flights"}).find("tbody")
+    flights = []
+    for row in rows.find_all("tr"):
+        try:
+            summary = xcontest.flight_summary(row)
+        except (AttributeError, IndexError):
+            continue
+        flight = xcontest.preprocess_xcontest(summary + [None] * 7, 1, 2)
+        href = xcontest._flight_details_href(row)
+        flights.append((flight, xcontest.BASE_URL + href if href else None))
+    return flights
+
+
+def test_listing_parity():
+    page_source = (FIXTURES / "listing.html").read_text()
+    listing = xcontest.convert_listing(xcontest.parse_listing_html(page_source))
+    records = xcontest.listing_records(listing, 1, 2)
+    expected = legacy_listing(page_source)
+    assert len(records) == len(expected) == 5
+    assert listing["url"].tolist() == [url for _, url in expected]
+    for record, (flight, _) in zip(records, expected):
+        flight = {key: value for key, value in flight.items() if value is not None}
+        flight["flid"], flight["flno"] = int(flight["flid"]), int(flight["flno"])
+        assert {key: value for key, value in record.items() if value is not None} == (
+            flight
+        )
+
+
+def test_convert_listing_drops_invalid_rows():
+    page_source = (FIXTURES / "listing.html").read_text()
+    raw = xcontest.parse_listing_html(page_source, max_flights=3)
+    raw.loc[1, "length_km"] = "n/a km"
+    listing = xcontest.convert_listing(raw)
+    assert listing["flid"].tolist() == [3901234, 3901301]
+    assert listing["datetime"].dt.hour.tolist() == [8, 9]
+
+
+def test_parse_listing_skips_recent_flights(monkeypatch):
+    browser = FakeBrowser()
+    browser.page_source = (FIXTURES / "listing.html").read_text()
+    age = pd.Timestamp.now(tz="UTC") - pd.Timestamp("2023-06-14", tz="UTC")
+    monkeypatch.setattr(xcontest, "BUFFER_DAYS", age.days)
+    listing = xcontest.parse_listing(browser)
+    assert listing["flno"].tolist() == [1, 2, 3, 4]
+
+
+def test_read_listing_dumps(tmp_path):
+    page_source = (FIXTURES / "listing.html").read_text()
+    paths = [tmp_path / "a.html", tmp_path / "b.html"]
+    for path in paths:
+        path.write_text(page_source)
+    listing = xcontest.read_listing_dumps(paths)
+    assert listing["flno"].tolist() == [1, 2, 3, 4, 5]
+    assert xcontest.read_listing_dumps([]).empty
+
+
+def test_discover_missing_details(tmp_path, monkeypatch):
+    db = Database(f"sqlite:///{tmp_path}/test.db")
+    db.migrate()
+    frontier = CrawlFrontier(db, site_id=2)
+    page_source = (FIXTURES / "listing.html").read_text()
+    # the 4th flight of the listing has no detail URL
+    listing = xcontest.convert_listing(xcontest.parse_listing_html(page_source))
+    records = xcontest.listing_records(listing, 1, 2)
+    # a flight shifted off its listing page
+    records.append(dict(records[2], flid=999))
+    db.upsert(Flight, records)
+    pages = []
+    monkeypatch.setattr(
+        xcontest, "load_listing", lambda *args: pages.append(args[2]) or listing
+    )
+
+    args = (None, {}, frontier, db, 1, 2, None)
+    assert xcontest.discover_missing_details(*args, budget=10) == 1
+    assert pages == [0]
+    assert list(frontier.pending()) == [3901234, 3901240, 3901301, 3901400]
+    # the flights not found are given up instead of being searched again
+    assert frontier.stats() == {"pending": 4, FAILED: 2}
+    assert frontier.missing_details() == []
+    assert xcontest.discover_missing_details(*args, budget=10) == 0
+    assert pages == [0]